@@ -3,6 +3,10 @@ from flask_cors import CORS
 from config import Config
 from extensions import db, migrate
 from services.ticket_fetcher import start_scheduler
+from services.outbox import start_dispatcher
+from commands import register_commands
+from services import metrics, read_replica
+from services.log_config import configure_logging
 
 # blueprints
 from routes.ticket_routes import bp as tickets_bp
@@ -10,20 +14,46 @@ from routes.tag_routes import bp as tags_bp
 from routes.agent_routes import bp as agents_bp
 from routes.faq_routes import bp as faq_bp
 from routes.canned_response_routes import bp as canned_bp
+from routes.sync_routes import bp as sync_bp
+from routes.event_routes import bp as events_bp
+from routes.bootstrap_routes import bp as bootstrap_bp
+from routes.outbox_routes import bp as outbox_bp
+from routes.archive_routes import bp as archive_bp
+from routes.metrics_routes import bp as metrics_bp
+from routes.attachment_routes import bp as attachments_bp
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    configure_logging(app.config)
     
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            key: value for key, value in app.config['SQLALCHEMY_ENGINE_OPTIONS'].items()
+            if key not in app.config['POOL_SIZING_OPTIONS']
+        }
     db.init_app(app)
+    read_replica.init_app(app)
+    metrics.init_app(app)
     migrate.init_app(app, db)
-    CORS(app)
+    # Credentials so the read-your-writes session cookie reaches the API from the frontend's origin
+    CORS(app, supports_credentials=True)
     
     app.register_blueprint(tickets_bp, url_prefix='/api')
     app.register_blueprint(tags_bp, url_prefix='/api')
     app.register_blueprint(agents_bp, url_prefix='/api')
     app.register_blueprint(faq_bp, url_prefix='/api')
     app.register_blueprint(canned_bp, url_prefix='/api')
+    app.register_blueprint(sync_bp, url_prefix='/api')
+    app.register_blueprint(events_bp, url_prefix='/api')
+    app.register_blueprint(bootstrap_bp, url_prefix='/api')
+    app.register_blueprint(outbox_bp, url_prefix='/api')
+    app.register_blueprint(archive_bp, url_prefix='/api')
+    app.register_blueprint(attachments_bp, url_prefix='/api')
+    # Where Prometheus expects it, outside /api
+    app.register_blueprint(metrics_bp)
+    
+    register_commands(app)
     
     return app
 
@@ -36,4 +66,7 @@ if __name__ == '__main__':
     # Start background scheduler for ticket fetching
     start_scheduler(app)
     
+    # Start the dispatcher that sends queued replies to the marketplaces
+    start_dispatcher(app)
+    
     app.run(debug=True, host='0.0.0.0', port=5000)
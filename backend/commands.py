@@ -0,0 +1,187 @@
+"""
+Flask CLI commands (run with `flask --app app <command>`)
+"""
+import json
+import time
+import click
+from flask import current_app
+from services.archive import archive_tickets
+from services.bulk_import import BulkImportError, FORMATS as IMPORT_FORMATS, import_file
+from services.connectors import CONNECTORS
+from services.connectors.mock_server import check_reply_batching
+from services.benchmark import run_benchmark, compare_reports, load_report
+from services.faq_matcher import benchmark_matcher
+from services.query_counts import check_query_counts
+from services.query_plans import check_ticket_filter_plans
+from services.seed import seed_tickets
+from services.ticket_stats import rebuild_ticket_stats
+
+
+def register_commands(app):
+    
+    @app.cli.command('check-query-plans')
+    def check_query_plans():
+        """Fail if any ticket filter combination falls back to a sequential scan"""
+        try:
+            results = check_ticket_filter_plans()
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        failures = {name: tables for name, tables in results.items() if tables}
+        
+        for name, tables in results.items():
+            status = 'SEQ SCAN on ' + ', '.join(tables) if tables else 'ok'
+            click.echo(f'{name}: {status}')
+        
+        if failures:
+            raise click.ClickException(f'{len(failures)} filter combination(s) use a sequential scan')
+    
+    @app.cli.command('check-query-counts')
+    def check_query_counts_command():
+        """Fail if a read endpoint's SQL statements grow with the rows it returns or exceed its budget"""
+        try:
+            results = check_query_counts(current_app._get_current_object())
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        
+        for name, result in results.items():
+            small, large = result['statements']
+            status = '; '.join(result['problems']) or 'ok'
+            note = f" ({result['note']})" if result['note'] else ''
+            click.echo(f"{name}: {small}/{large} statements for {result['rows'][0]}/{result['rows'][1]} rows: {status}{note}")
+        
+        failures = [name for name, result in results.items() if result['problems']]
+        if failures:
+            raise click.ClickException(f"{len(failures)} endpoint(s) issue too many statements: {', '.join(failures)}")
+    
+    @app.cli.command('check-reply-batching')
+    @click.option('--replies', type=int, default=5, show_default=True, help='Replies per batch')
+    def check_reply_batching_command(replies):
+        """Send batched replies through the connectors with a bulk endpoint, against the mock marketplace server"""
+        results = check_reply_batching(CONNECTORS.values(), replies)
+        if not results:
+            raise click.ClickException('No connector has a bulk send endpoint')
+        
+        for marketplace, problems in results.items():
+            click.echo(f"{marketplace}: {'; '.join(problems) or 'ok'}")
+        
+        failures = [marketplace for marketplace, problems in results.items() if problems]
+        if failures:
+            raise click.ClickException(f"Batched replies failed for {', '.join(failures)}")
+    
+    @app.cli.command('rebuild-ticket-stats')
+    def rebuild_ticket_stats_command():
+        """Recompute the ticket_stats rollup behind GET /api/tickets/stats"""
+        rows = rebuild_ticket_stats()
+        click.echo(f'Rebuilt ticket stats ({rows} rows)')
+    
+    @app.cli.command('archive-tickets')
+    @click.option('--older-than-days', type=int, default=None, help='Default: ARCHIVE_AFTER_DAYS')
+    def archive_tickets_command(older_than_days):
+        """Move tickets Completed for longer than the given age into the archive tables"""
+        archived = archive_tickets(older_than_days)
+        click.echo(f'Archived {archived} tickets')
+    
+    @app.cli.command('seed-data')
+    @click.option('--tickets', type=int, default=10000, show_default=True)
+    @click.option('--days', type=int, default=365, show_default=True, help='Spread conversations over this many days')
+    @click.option('--batch-size', type=int, default=1000, show_default=True)
+    @click.option('--seed', type=int, default=None, help='Random seed, for repeatable distributions')
+    def seed_data(tickets, days, batch_size, seed):
+        """Insert synthetic tickets, messages, tags and agents for load testing"""
+        started = time.perf_counter()
+        
+        def progress(done):
+            click.echo(f'{done}/{tickets} tickets ({done / (time.perf_counter() - started):.0f}/s)')
+        
+        totals = seed_tickets(tickets, days=days, batch_size=batch_size, seed=seed, progress=progress)
+        click.echo(
+            f"Inserted {totals['tickets']} tickets, {totals['messages']} messages and {totals['tags']} tag links "
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+    
+    @app.cli.command('bench-routes')
+    @click.option('--requests', type=int, default=200, show_default=True, help='Requests per route')
+    @click.option('--concurrency', type=int, default=8, show_default=True)
+    @click.option('--writes', is_flag=True, help='Also run the scenarios that change data')
+    @click.option('--only', default=None, help='Only scenarios whose name contains this')
+    @click.option('--output', type=click.Path(dir_okay=False), default=None, help='Write the JSON report here')
+    @click.option('--baseline', type=click.Path(exists=True, dir_okay=False), default=None,
+                  help='Previous report to compare against; exits non-zero on regressions')
+    @click.option('--threshold', type=float, default=0.2, show_default=True, help='p95 growth counted as a regression')
+    def bench_routes(requests, concurrency, writes, only, output, baseline, threshold):
+        """Load-test the API routes and report latency percentiles, throughput and SQL query counts"""
+        def progress(name, result):
+            click.echo(
+                f"{name}: p50 {result['p50']}ms p95 {result['p95']}ms p99 {result['p99']}ms, "
+                f"{result['throughput']}/s, {result['queriesPerRequest']} queries"
+                + (f", {result['errors']} errors" if result['errors'] else ''),
+                err=True
+            )
+        
+        try:
+            report = run_benchmark(current_app._get_current_object(), requests, concurrency, writes, only, progress)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        
+        regressions = []
+        if baseline:
+            report['comparison'], regressions = compare_reports(load_report(baseline), report, threshold)
+            report['regressions'] = regressions
+        
+        text = json.dumps(report, indent=2)
+        if output:
+            with open(output, 'w') as f:
+                f.write(text + '\n')
+        else:
+            click.echo(text)
+        
+        if regressions:
+            raise click.ClickException(f"Slower than the baseline: {', '.join(regressions)}")
+    
+    @app.cli.command('bench-faq-matcher')
+    @click.option('--messages', type=int, default=100000, show_default=True, help='Synthetic customer messages to match')
+    @click.option('--entries', type=int, default=200, show_default=True, help='Synthetic FAQ entries')
+    @click.option('--phrases', type=int, default=5, show_default=True, help='Trigger phrases per entry')
+    @click.option('--seed', type=int, default=None, help='Random seed, for repeatable corpora')
+    def bench_faq_matcher(messages, entries, phrases, seed):
+        """Time the compiled FAQ trigger phrase matcher over a synthetic message corpus"""
+        report = benchmark_matcher(messages, entries, phrases, seed)
+        click.echo(
+            f"{report['messages']} messages against {report['phrases']} phrases of {report['entries']} entries: "
+            f"{report['messagesPerSecond']}/s, {report['usPerMessage']['mean']}us per message "
+            f"(p99 {report['usPerMessage']['p99']}us; one regex per phrase: {report['naiveUsPerMessage']}us), "
+            f"{report['matched']} matched",
+            err=True
+        )
+        click.echo(json.dumps(report, indent=2))
+    
+    @app.cli.command('import-conversations')
+    @click.argument('files', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'file_format', type=click.Choice(IMPORT_FORMATS), default=None,
+                  help='Default: csv for .csv files, ndjson otherwise')
+    @click.option('--batch-size', type=int, default=None, help='Records merged per transaction (default: IMPORT_BATCH_SIZE)')
+    @click.option('--status', 'default_status', default='Completed', show_default=True,
+                  help='Status of imported tickets that have none in the file')
+    @click.option('--restart', is_flag=True, help='Ignore checkpoints and import from the start (already imported messages are skipped)')
+    def import_conversations(files, file_format, batch_size, default_status, restart):
+        """Bulk load conversations from NDJSON or CSV exports through COPY, resuming interrupted imports"""
+        batch_size = batch_size or current_app.config.get('IMPORT_BATCH_SIZE', 10000)
+        
+        def progress(stats):
+            seconds = max(stats['seconds'], 1e-9)
+            click.echo(
+                f"{stats['records']} records ({stats['records'] / seconds:.0f}/s), {stats['tickets']} new tickets, "
+                f"{stats['messages']} new messages ({stats['messages'] / seconds:.0f}/s), {stats['skipped']} skipped",
+                err=True
+            )
+        
+        for path in files:
+            try:
+                stats = import_file(path, file_format, batch_size, default_status, restart, progress)
+            except BulkImportError as e:
+                raise click.ClickException(str(e))
+            resumed = f" (resumed at byte {stats['resumedFrom']})" if stats['resumedFrom'] else ''
+            click.echo(
+                f"{path}{resumed}: {stats['records']} records, {stats['tickets']} new tickets, {stats['messages']} new messages, "
+                f"{stats['skipped']} skipped in {stats['seconds']:.1f}s"
+            )
@@ -4,6 +4,8 @@ Prevents circular imports by defining extensions in a separate module
 """
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from services.read_replica import RoutingSession
 
-db = SQLAlchemy()
+# GET requests read from the replica bind when one is configured (services/read_replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
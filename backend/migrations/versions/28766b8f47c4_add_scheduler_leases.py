@@ -0,0 +1,30 @@
+"""Add scheduler leases for single-leader scheduling
+
+Revision ID: 28766b8f47c4
+Revises: 9ef1c8b1a3ac
+Create Date: 2026-10-18 20:03:11.804519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '28766b8f47c4'
+down_revision = '9ef1c8b1a3ac'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('scheduler_leases',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('holder', sa.String(length=200), nullable=False),
+    sa.Column('acquired_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('scheduler_leases')
@@ -0,0 +1,29 @@
+"""Add full-text search indexes
+
+Revision ID: 2a3ddbf3e5b1
+Revises: d21836e5d1ce
+Create Date: 2026-10-18 11:03:27.918406
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2a3ddbf3e5b1'
+down_revision = 'd21836e5d1ce'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Expressions must match services/search.py exactly for the planner to use them
+    op.execute("CREATE INDEX ix_messages_message_fts ON messages USING gin (to_tsvector('english', message))")
+    op.execute(
+        "CREATE INDEX ix_tickets_search_fts ON tickets USING gin "
+        "(to_tsvector('simple', customer_name || ' ' || marketplace_conversation_id))"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_tickets_search_fts', table_name='tickets')
+    op.drop_index('ix_messages_message_fts', table_name='messages')
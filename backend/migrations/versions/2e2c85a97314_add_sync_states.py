@@ -0,0 +1,34 @@
+"""Add per-marketplace sync cursors
+
+Revision ID: 2e2c85a97314
+Revises: e80587c51a2c
+Create Date: 2026-10-18 15:20:52.730194
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e2c85a97314'
+down_revision = 'e80587c51a2c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_states',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('marketplace', sa.String(length=50), nullable=False),
+    sa.Column('account', sa.String(length=100), nullable=False),
+    sa.Column('since', sa.DateTime(), nullable=True),
+    sa.Column('page_token', sa.String(length=500), nullable=True),
+    sa.Column('etag', sa.String(length=200), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('marketplace', 'account', name='uq_sync_states_marketplace_account')
+    )
+
+
+def downgrade():
+    op.drop_table('sync_states')
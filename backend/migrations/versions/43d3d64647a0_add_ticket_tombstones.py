@@ -0,0 +1,30 @@
+"""Add ticket tombstones for the change feed
+
+Revision ID: 43d3d64647a0
+Revises: 2e2c85a97314
+Create Date: 2026-10-18 16:48:13.604851
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '43d3d64647a0'
+down_revision = '2e2c85a97314'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ticket_tombstones',
+    sa.Column('ticket_id', sa.String(length=36), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('ticket_id')
+    )
+    op.create_index(op.f('ix_ticket_tombstones_deleted_at'), 'ticket_tombstones', ['deleted_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ticket_tombstones_deleted_at'), table_name='ticket_tombstones')
+    op.drop_table('ticket_tombstones')
@@ -0,0 +1,66 @@
+"""Add table version counters maintained by triggers for ETags
+
+Revision ID: 5b7d2c9e4f10
+Revises: abb5fa154ebe
+Create Date: 2026-10-18 08:02:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7d2c9e4f10'
+down_revision = 'abb5fa154ebe'
+branch_labels = None
+depends_on = None
+
+
+TABLE_VERSION_SHARDS = 16
+VERSIONED_TABLES = ('tickets', 'tags', 'agents', 'canned_responses', 'faq_auto_responses', 'faq_entries')
+TABLE_VERSION_FUNCTION = """
+    CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+    BEGIN
+        -- Statement triggers also fire for statements that matched no rows
+        IF TG_OP <> 'TRUNCATE' THEN
+            IF NOT EXISTS (SELECT FROM changed_rows) THEN
+                RETURN NULL;
+            END IF;
+        END IF;
+        INSERT INTO table_versions (table_name, shard, version)
+        VALUES (TG_TABLE_NAME, pg_backend_pid() % """ + str(TABLE_VERSION_SHARDS) + """, 1)
+        ON CONFLICT (table_name, shard) DO UPDATE SET version = table_versions.version + 1;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+TRIGGER_EVENTS = {
+    'insert': 'AFTER INSERT ON {table} REFERENCING NEW TABLE AS changed_rows',
+    'update': 'AFTER UPDATE ON {table} REFERENCING NEW TABLE AS changed_rows',
+    'delete': 'AFTER DELETE ON {table} REFERENCING OLD TABLE AS changed_rows',
+    'truncate': 'AFTER TRUNCATE ON {table}',
+}
+
+
+def upgrade():
+    op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=63), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name', 'shard')
+    )
+    op.execute(TABLE_VERSION_FUNCTION)
+    for table in VERSIONED_TABLES:
+        for event, clause in TRIGGER_EVENTS.items():
+            op.execute(
+                f'CREATE TRIGGER table_version_{table}_{event} {clause.format(table=table)} '
+                'FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()'
+            )
+
+
+def downgrade():
+    for table in VERSIONED_TABLES:
+        for event in TRIGGER_EVENTS:
+            op.execute(f'DROP TRIGGER table_version_{table}_{event} ON {table}')
+    op.execute('DROP FUNCTION bump_table_version()')
+    op.drop_table('table_versions')
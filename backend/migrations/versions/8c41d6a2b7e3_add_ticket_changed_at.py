@@ -0,0 +1,29 @@
+"""Add tickets.changed_at for the change feed and ETags
+
+Revision ID: 8c41d6a2b7e3
+Revises: 5b7d2c9e4f10
+Create Date: 2026-10-18 09:12:05.274931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d6a2b7e3'
+down_revision = '5b7d2c9e4f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('tickets', sa.Column('changed_at', sa.DateTime(), nullable=True))
+    # Until now the last update was the last change
+    op.execute('UPDATE tickets SET changed_at = last_updated_date')
+    op.alter_column('tickets', 'changed_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index('ix_tickets_changed_at', 'tickets', ['changed_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tickets_changed_at', table_name='tickets')
+    op.drop_column('tickets', 'changed_at')
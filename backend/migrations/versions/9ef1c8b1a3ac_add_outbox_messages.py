@@ -0,0 +1,49 @@
+"""Add the outbound reply outbox and message delivery status
+
+Revision ID: 9ef1c8b1a3ac
+Revises: c34f86c14269
+Create Date: 2026-10-18 19:12:40.528113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9ef1c8b1a3ac'
+down_revision = 'c34f86c14269'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox_messages',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('ticket_id', sa.String(length=36), nullable=False),
+    sa.Column('marketplace', sa.String(length=50), nullable=False),
+    sa.Column('marketplace_conversation_id', sa.String(length=200), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('external_id', sa.String(length=200), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('message_id')
+    )
+    op.create_index('ix_outbox_messages_status_next_attempt', 'outbox_messages', ['status', 'next_attempt_at'], unique=False)
+    op.create_index(op.f('ix_outbox_messages_ticket_id'), 'outbox_messages', ['ticket_id'], unique=False)
+    op.add_column('messages', sa.Column('delivery_status', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    op.drop_column('messages', 'delivery_status')
+    op.drop_index(op.f('ix_outbox_messages_ticket_id'), table_name='outbox_messages')
+    op.drop_index('ix_outbox_messages_status_next_attempt', table_name='outbox_messages')
+    op.drop_table('outbox_messages')
@@ -0,0 +1,35 @@
+"""Add FAQ entries for automatic replies on ingest
+
+Revision ID: abb5fa154ebe
+Revises: e3e25354fb1a
+Create Date: 2026-10-18 07:17:31.406158
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'abb5fa154ebe'
+down_revision = 'e3e25354fb1a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('faq_entries',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('trigger_phrases', postgresql.JSON(astext_type=sa.Text()), nullable=False),
+    sa.Column('response', sa.Text(), nullable=False),
+    sa.Column('min_phrase_matches', sa.Integer(), nullable=False),
+    sa.Column('enabled', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('faq_entries')
@@ -0,0 +1,27 @@
+"""Add updated_at to tags, agents and canned responses
+
+Revision ID: c34f86c14269
+Revises: 43d3d64647a0
+Create Date: 2026-10-18 18:05:36.147720
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c34f86c14269'
+down_revision = '43d3d64647a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('tags', 'agents', 'canned_responses'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f'UPDATE {table} SET updated_at = created_at')
+
+
+def downgrade():
+    for table in ('canned_responses', 'agents', 'tags'):
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,38 @@
+"""Add attachment store tables
+
+Revision ID: cc9dd73dd91e
+Revises: e7e7c61df0e1
+Create Date: 2026-10-18 06:58:37.439605
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cc9dd73dd91e'
+down_revision = 'e7e7c61df0e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attachments',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    op.create_table('attachment_sources',
+    sa.Column('url_sha256', sa.String(length=64), nullable=False),
+    sa.Column('url', sa.Text(), nullable=False),
+    sa.Column('attachment_sha256', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['attachment_sha256'], ['attachments.sha256'], ),
+    sa.PrimaryKeyConstraint('url_sha256')
+    )
+
+
+def downgrade():
+    op.drop_table('attachment_sources')
+    op.drop_table('attachments')
@@ -0,0 +1,39 @@
+"""Add indexes for the ticket filters
+
+Revision ID: d21836e5d1ce
+Revises: de4124fb507c
+Create Date: 2026-10-18 09:12:44.301572
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd21836e5d1ce'
+down_revision = 'de4124fb507c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_tickets_last_updated', 'tickets', ['last_updated_date', 'ticket_id'], unique=False)
+    op.create_index('ix_tickets_status_last_updated', 'tickets', ['ticket_status', 'last_updated_date', 'ticket_id'], unique=False)
+    op.create_index('ix_tickets_priority_last_updated', 'tickets', ['priority', 'last_updated_date', 'ticket_id'], unique=False)
+    op.create_index('ix_tickets_assigned_last_updated', 'tickets', ['assigned_to', 'last_updated_date', 'ticket_id'], unique=False)
+    op.create_index('ix_tickets_conversation_start', 'tickets', ['conversation_start_date'], unique=False)
+    op.create_index('ix_tickets_open_by_agent', 'tickets', ['assigned_to', 'last_updated_date'], unique=False,
+                    postgresql_where=sa.text("ticket_status <> 'Completed'"))
+    op.create_index('ix_messages_ticket_id_date', 'messages', ['ticket_id', 'date', 'id'], unique=False)
+    op.create_index('ix_ticket_tags_tag_id', 'ticket_tags', ['tag_id', 'ticket_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ticket_tags_tag_id', table_name='ticket_tags')
+    op.drop_index('ix_messages_ticket_id_date', table_name='messages')
+    op.drop_index('ix_tickets_open_by_agent', table_name='tickets')
+    op.drop_index('ix_tickets_conversation_start', table_name='tickets')
+    op.drop_index('ix_tickets_assigned_last_updated', table_name='tickets')
+    op.drop_index('ix_tickets_priority_last_updated', table_name='tickets')
+    op.drop_index('ix_tickets_status_last_updated', table_name='tickets')
+    op.drop_index('ix_tickets_last_updated', table_name='tickets')
@@ -0,0 +1,38 @@
+"""Add agent capacity and assignment rules for auto-assignment
+
+Revision ID: e3e25354fb1a
+Revises: 06196551ad52
+Create Date: 2026-10-18 07:11:17.191331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3e25354fb1a'
+down_revision = '06196551ad52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('agents', sa.Column('auto_assign', sa.Boolean(), nullable=False, server_default=sa.true()))
+    op.add_column('agents', sa.Column('max_open_tickets', sa.Integer(), nullable=True))
+    op.create_table('assignment_rules',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('agent_id', sa.String(length=36), nullable=False),
+    sa.Column('marketplace', sa.String(length=50), nullable=True),
+    sa.Column('tag_id', sa.String(length=36), nullable=True),
+    sa.ForeignKeyConstraint(['agent_id'], ['agents.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_assignment_rules_agent_id', 'assignment_rules', ['agent_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_assignment_rules_agent_id', table_name='assignment_rules')
+    op.drop_table('assignment_rules')
+    op.drop_column('agents', 'max_open_tickets')
+    op.drop_column('agents', 'auto_assign')
@@ -0,0 +1,71 @@
+"""Add archive tables for completed tickets
+
+Revision ID: e7e7c61df0e1
+Revises: f35177f26cfe
+Create Date: 2026-10-18 21:52:06.418310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7e7c61df0e1'
+down_revision = 'f35177f26cfe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archived_tickets',
+    sa.Column('ticket_id', sa.String(length=36), nullable=False),
+    sa.Column('marketplace', sa.String(length=50), nullable=False),
+    sa.Column('marketplace_conversation_id', sa.String(length=200), nullable=False),
+    sa.Column('customer_name', sa.String(length=200), nullable=False),
+    sa.Column('priority', sa.String(length=20), nullable=False),
+    sa.Column('ticket_status', sa.String(length=20), nullable=False),
+    sa.Column('assigned_to', sa.String(length=36), nullable=True),
+    sa.Column('conversation_start_date', sa.DateTime(), nullable=False),
+    sa.Column('last_updated_date', sa.DateTime(), nullable=False),
+    sa.Column('order_history', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+    sa.Column('related_listing_url', sa.String(length=500), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('ticket_id'),
+    sa.UniqueConstraint('marketplace_conversation_id')
+    )
+    op.create_index('ix_archived_tickets_last_updated', 'archived_tickets', ['last_updated_date', 'ticket_id'], unique=False)
+
+    op.create_table('archived_messages',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('ticket_id', sa.String(length=36), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('authored', sa.Boolean(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('image_attachments', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+    sa.Column('external_id', sa.String(length=200), nullable=True),
+    sa.Column('delivery_status', sa.String(length=20), nullable=True),
+    sa.ForeignKeyConstraint(['ticket_id'], ['archived_tickets.ticket_id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_archived_messages_ticket_id_date', 'archived_messages', ['ticket_id', 'date', 'id'], unique=False)
+
+    op.create_table('archived_ticket_tags',
+    sa.Column('ticket_id', sa.String(length=36), nullable=False),
+    sa.Column('tag_id', sa.String(length=36), nullable=False),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['ticket_id'], ['archived_tickets.ticket_id'], ),
+    sa.PrimaryKeyConstraint('ticket_id', 'tag_id')
+    )
+
+    op.execute("CREATE INDEX ix_archived_messages_message_fts ON archived_messages USING gin (to_tsvector('english', message))")
+    op.execute(
+        "CREATE INDEX ix_archived_tickets_search_fts ON archived_tickets USING gin "
+        "(to_tsvector('simple', customer_name || ' ' || marketplace_conversation_id))"
+    )
+
+
+def downgrade():
+    op.drop_table('archived_ticket_tags')
+    op.drop_table('archived_messages')
+    op.drop_table('archived_tickets')
@@ -0,0 +1,26 @@
+"""Add external message ID for deduplicated ingestion
+
+Revision ID: e80587c51a2c
+Revises: 2a3ddbf3e5b1
+Create Date: 2026-10-18 13:41:09.552170
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e80587c51a2c'
+down_revision = '2a3ddbf3e5b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('messages', sa.Column('external_id', sa.String(length=200), nullable=True))
+    op.create_unique_constraint('uq_messages_ticket_external_id', 'messages', ['ticket_id', 'external_id'])
+
+
+def downgrade():
+    op.drop_constraint('uq_messages_ticket_external_id', 'messages', type_='unique')
+    op.drop_column('messages', 'external_id')
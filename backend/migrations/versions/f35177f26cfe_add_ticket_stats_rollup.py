@@ -0,0 +1,121 @@
+"""Add ticket stats rollup maintained by triggers
+
+Revision ID: f35177f26cfe
+Revises: 28766b8f47c4
+Create Date: 2026-10-18 21:14:37.226081
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f35177f26cfe'
+down_revision = '28766b8f47c4'
+branch_labels = None
+depends_on = None
+
+
+TICKET_STATS_UPSERT = """
+    ON CONFLICT (dimension, value) DO UPDATE SET ticket_count = ticket_stats.ticket_count + EXCLUDED.ticket_count
+"""
+TICKET_STATS_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION ticket_stats_dimensions(status text, priority text, marketplace text, assigned_to text)
+    RETURNS TABLE (dimension text, value text) AS $$
+        VALUES ('status', status), ('priority', priority), ('marketplace', marketplace), ('agent', coalesce(assigned_to, ''))
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION ticket_stats_on_tickets() RETURNS trigger AS $$
+    BEGIN
+        -- Rows are upserted in key order so concurrent statements lock them in the same order
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO ticket_stats (dimension, value, ticket_count)
+            SELECT d.dimension, d.value, count(*)
+            FROM new_rows n, ticket_stats_dimensions(n.ticket_status, n.priority, n.marketplace, n.assigned_to) d
+            GROUP BY 1, 2 ORDER BY 1, 2
+    """ + TICKET_STATS_UPSERT + """;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO ticket_stats (dimension, value, ticket_count)
+            SELECT d.dimension, d.value, -count(*)
+            FROM old_rows o, ticket_stats_dimensions(o.ticket_status, o.priority, o.marketplace, o.assigned_to) d
+            GROUP BY 1, 2 ORDER BY 1, 2
+    """ + TICKET_STATS_UPSERT + """;
+        ELSE
+            INSERT INTO ticket_stats (dimension, value, ticket_count)
+            SELECT dimension, value, sum(delta)
+            FROM (
+                SELECT d.dimension, d.value, -1 AS delta
+                FROM old_rows o, ticket_stats_dimensions(o.ticket_status, o.priority, o.marketplace, o.assigned_to) d
+                UNION ALL
+                SELECT d.dimension, d.value, 1
+                FROM new_rows n, ticket_stats_dimensions(n.ticket_status, n.priority, n.marketplace, n.assigned_to) d
+            ) changes
+            GROUP BY 1, 2 HAVING sum(delta) <> 0 ORDER BY 1, 2
+    """ + TICKET_STATS_UPSERT + """;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION ticket_stats_on_ticket_tags() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO ticket_stats (dimension, value, ticket_count)
+            SELECT 'tag', tag_id, count(*) FROM new_rows GROUP BY 1, 2 ORDER BY 1, 2
+    """ + TICKET_STATS_UPSERT + """;
+        ELSE
+            INSERT INTO ticket_stats (dimension, value, ticket_count)
+            SELECT 'tag', tag_id, -count(*) FROM old_rows GROUP BY 1, 2 ORDER BY 1, 2
+    """ + TICKET_STATS_UPSERT + """;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "CREATE TRIGGER ticket_stats_tickets_insert AFTER INSERT ON tickets "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE ticket_stats_on_tickets()",
+    "CREATE TRIGGER ticket_stats_tickets_update AFTER UPDATE ON tickets "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE ticket_stats_on_tickets()",
+    "CREATE TRIGGER ticket_stats_tickets_delete AFTER DELETE ON tickets "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE ticket_stats_on_tickets()",
+    "CREATE TRIGGER ticket_stats_ticket_tags_insert AFTER INSERT ON ticket_tags "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE ticket_stats_on_ticket_tags()",
+    "CREATE TRIGGER ticket_stats_ticket_tags_delete AFTER DELETE ON ticket_tags "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE ticket_stats_on_ticket_tags()",
+]
+
+
+def upgrade():
+    op.create_table('ticket_stats',
+    sa.Column('dimension', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.String(length=200), nullable=False),
+    sa.Column('ticket_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dimension', 'value')
+    )
+    # Backfill and create the triggers together, so no change slips in between
+    op.execute('LOCK TABLE tickets, ticket_tags IN SHARE MODE')
+    op.execute("""
+        INSERT INTO ticket_stats (dimension, value, ticket_count)
+        SELECT 'status', ticket_status, count(*) FROM tickets GROUP BY 2
+        UNION ALL SELECT 'priority', priority, count(*) FROM tickets GROUP BY 2
+        UNION ALL SELECT 'marketplace', marketplace, count(*) FROM tickets GROUP BY 2
+        UNION ALL SELECT 'agent', coalesce(assigned_to, ''), count(*) FROM tickets GROUP BY 2
+        UNION ALL SELECT 'tag', tag_id, count(*) FROM ticket_tags GROUP BY 2
+    """)
+    for statement in TICKET_STATS_DDL:
+        op.execute(statement)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER ticket_stats_ticket_tags_delete ON ticket_tags')
+    op.execute('DROP TRIGGER ticket_stats_ticket_tags_insert ON ticket_tags')
+    op.execute('DROP TRIGGER ticket_stats_tickets_delete ON tickets')
+    op.execute('DROP TRIGGER ticket_stats_tickets_update ON tickets')
+    op.execute('DROP TRIGGER ticket_stats_tickets_insert ON tickets')
+    op.execute('DROP FUNCTION ticket_stats_on_ticket_tags()')
+    op.execute('DROP FUNCTION ticket_stats_on_tickets()')
+    op.execute('DROP FUNCTION ticket_stats_dimensions(text, text, text, text)')
+    op.drop_table('ticket_stats')
@@ -1,5 +1,6 @@
 from extensions import db
 from datetime import datetime
+from sqlalchemy import DDL, event
 from sqlalchemy.dialects.postgresql import JSON
 import uuid
 
@@ -7,7 +8,9 @@ import uuid
 # Association table for ticket-tag many-to-many relationship
 ticket_tags = db.Table('ticket_tags',
     db.Column('ticket_id', db.String(36), db.ForeignKey('tickets.ticket_id'), primary_key=True),
-    db.Column('tag_id', db.String(36), db.ForeignKey('tags.id'), primary_key=True)
+    db.Column('tag_id', db.String(36), db.ForeignKey('tags.id'), primary_key=True),
+    # The primary key covers lookups by ticket; this covers the tag filter
+    db.Index('ix_ticket_tags_tag_id', 'tag_id', 'ticket_id')
 )
 
 
@@ -18,6 +21,7 @@ class Tag(db.Model):
     name = db.Column(db.String(100), nullable=False, unique=True)
     color = db.Column(db.String(20), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
         return {
@@ -33,13 +37,44 @@ class Agent(db.Model):
     id = db.Column('id', db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(100), nullable=False, unique=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Auto-assignment (services/assignment.py): whether the agent takes new tickets, and how many open ones at most
+    auto_assign = db.Column(db.Boolean, nullable=False, default=True)
+    max_open_tickets = db.Column(db.Integer, nullable=True)  # None for no limit
     
     tickets = db.relationship('Ticket', backref='agent', lazy=True)
+    assignment_rules = db.relationship('AssignmentRule', lazy='selectin', cascade='all, delete-orphan',
+                                       order_by='AssignmentRule.id')
     
     def to_dict(self):
         return {
             'ID': self.id,
-            'name': self.name
+            'name': self.name,
+            'autoAssign': self.auto_assign,
+            'maxOpenTickets': self.max_open_tickets,
+            'assignmentRules': [rule.to_dict() for rule in self.assignment_rules]
+        }
+
+
+class AssignmentRule(db.Model):
+    # Narrows which tickets an agent is auto-assigned: one matching rule is enough, and an agent without
+    # rules takes any ticket. A rule with a marketplace and a tag needs both; either left empty matches all.
+    __tablename__ = 'assignment_rules'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    agent_id = db.Column(db.String(36), db.ForeignKey('agents.id', ondelete='CASCADE'), nullable=False, index=True)
+    marketplace = db.Column(db.String(50), nullable=True)
+    tag_id = db.Column(db.String(36), db.ForeignKey('tags.id', ondelete='CASCADE'), nullable=True)
+    
+    def matches(self, marketplace, tag_ids):
+        return (self.marketplace is None or self.marketplace == marketplace) and \
+            (self.tag_id is None or self.tag_id in tag_ids)
+    
+    def to_dict(self):
+        return {
+            'marketplace': self.marketplace,
+            'tagID': self.tag_id
         }
 
 
@@ -57,12 +92,39 @@ class FAQAutoResponse(db.Model):
         }
 
 
+class FAQEntry(db.Model):
+    # A question answered automatically on ingest when a customer message contains its trigger
+    # phrases (services/faq_matcher.py)
+    __tablename__ = 'faq_entries'
+    
+    id = db.Column('id', db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = db.Column(db.String(100), nullable=False)
+    trigger_phrases = db.Column(JSON, nullable=False, default=list)
+    response = db.Column(db.Text, nullable=False)
+    # Distinct trigger phrases a message must contain before it's answered
+    min_phrase_matches = db.Column(db.Integer, nullable=False, default=1)
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'ID': self.id,
+            'name': self.name,
+            'triggerPhrases': self.trigger_phrases or [],
+            'response': self.response,
+            'minPhraseMatches': self.min_phrase_matches,
+            'enabled': self.enabled
+        }
+
+
 class CannedResponse(db.Model):
     __tablename__ = 'canned_responses'
     
     id = db.Column('id', db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     response = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
         return {
@@ -71,8 +133,80 @@ class CannedResponse(db.Model):
         }
 
 
+class SyncState(db.Model):
+    __tablename__ = 'sync_states'
+    __table_args__ = (
+        db.UniqueConstraint('marketplace', 'account', name='uq_sync_states_marketplace_account'),
+    )
+    
+    id = db.Column('id', db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    marketplace = db.Column(db.String(50), nullable=False)
+    account = db.Column(db.String(100), nullable=False, default='default')
+    since = db.Column(db.DateTime, nullable=True)  # High-water mark of fetched message dates
+    page_token = db.Column(db.String(500), nullable=True)  # Delta/sync token from the marketplace
+    etag = db.Column(db.String(200), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_cursor(self):
+        return {'since': self.since, 'page_token': self.page_token, 'etag': self.etag}
+    
+    def to_dict(self):
+        return {
+            'marketplace': self.marketplace,
+            'account': self.account,
+            'since': self.since.isoformat() if self.since else None,
+            'pageToken': self.page_token,
+            'etag': self.etag,
+            'updatedAt': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class SchedulerLease(db.Model):
+    # Held by the one process that runs a scheduled job; others take over once expires_at passes
+    __tablename__ = 'scheduler_leases'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    holder = db.Column(db.String(200), nullable=False)
+    acquired_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'holder': self.holder,
+            'acquiredAt': self.acquired_at.isoformat(),
+            'expiresAt': self.expires_at.isoformat()
+        }
+
+
+def serialize_attachments(image_attachments):
+    # Entries are the marketplace URL, or once downloaded into the attachment store (services/attachments.py)
+    # a {'sha256', 'contentType', 'size'} reference served from /api/attachments/<sha256>
+    entries = image_attachments or []
+    return {
+        'imageAttachments': [entry for entry in entries if isinstance(entry, str)],
+        'attachments': [
+            {'ID': entry['sha256'], 'contentType': entry['contentType'], 'size': entry['size']}
+            for entry in entries if isinstance(entry, dict)
+        ]
+    }
+
+
+# Written the way PostgreSQL prints it back, so migration autogenerate sees the index unchanged
+TICKET_SEARCH_FTS = db.text("to_tsvector('simple', (customer_name || ' ') || marketplace_conversation_id)")
+
+
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Conversation loading, message counts and last-message previews per ticket
+        db.Index('ix_messages_ticket_id_date', 'ticket_id', 'date', 'id'),
+        # Marketplace message ID, so re-fetched messages are only stored once
+        db.UniqueConstraint('ticket_id', 'external_id', name='uq_messages_ticket_external_id'),
+        # Full-text search (PostgreSQL only; see services/search.py for the matching expression)
+        db.Index('ix_messages_message_fts', db.text("to_tsvector('english', message)"),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     ticket_id = db.Column(db.String(36), db.ForeignKey('tickets.ticket_id'), nullable=False)
@@ -80,18 +214,40 @@ class Message(db.Model):
     authored = db.Column(db.Boolean, nullable=False, default=False)  # True if sent by agent
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     image_attachments = db.Column(JSON, default=list)
+    external_id = db.Column(db.String(200), nullable=True)  # ID on the marketplace, None for local replies
+    # Replies sent from the dashboard: pending, sent or failed (mirrors the outbox row); None for fetched messages
+    delivery_status = db.Column(db.String(20), nullable=True)
     
     def to_dict(self):
         return {
             'message': self.message,
             'authored': self.authored,
             'date': self.date.isoformat(),
-            'imageAttachments': self.image_attachments or []
+            **serialize_attachments(self.image_attachments),
+            'deliveryStatus': self.delivery_status
         }
 
 
 class Ticket(db.Model):
     __tablename__ = 'tickets'
+    __table_args__ = (
+        # Indexes matched to the filter combinations the FilterBar sends,
+        # each ending in the (last_updated_date, ticket_id) list ordering
+        db.Index('ix_tickets_last_updated', 'last_updated_date', 'ticket_id'),
+        db.Index('ix_tickets_status_last_updated', 'ticket_status', 'last_updated_date', 'ticket_id'),
+        db.Index('ix_tickets_priority_last_updated', 'priority', 'last_updated_date', 'ticket_id'),
+        db.Index('ix_tickets_assigned_last_updated', 'assigned_to', 'last_updated_date', 'ticket_id'),
+        db.Index('ix_tickets_conversation_start', 'conversation_start_date'),
+        # Change feed
+        db.Index('ix_tickets_changed_at', 'changed_at'),
+        # Open tickets per agent
+        db.Index('ix_tickets_open_by_agent', 'assigned_to', 'last_updated_date',
+                 postgresql_where=db.text("ticket_status <> 'Completed'"),
+                 sqlite_where=db.text("ticket_status <> 'Completed'")),
+        # Full-text search on customer name and conversation ID (PostgreSQL only)
+        db.Index('ix_tickets_search_fts', TICKET_SEARCH_FTS,
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
     
     ticket_id = db.Column('ticket_id', db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     marketplace = db.Column(db.String(50), nullable=False)  # Reverb, eBay, Amazon, Etsy
@@ -102,12 +258,17 @@ class Ticket(db.Model):
     assigned_to = db.Column(db.String(36), db.ForeignKey('agents.id'), nullable=True)
     conversation_start_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     last_updated_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Last change of anything in the ticket's payload, for the change feed and ETags; unlike
+    # last_updated_date, which orders the list and ages tickets for the archive, it also moves for
+    # delivery statuses, deleted tags and imported history
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     order_history = db.Column(JSON, default=list)
     related_listing_url = db.Column(db.String(500), nullable=True)
     
     # Relationships
     messages = db.relationship('Message', backref='ticket', lazy=True, cascade='all, delete-orphan', order_by='Message.date')
-    tags = db.relationship('Tag', secondary=ticket_tags, lazy='subquery',
+    # Loaded per endpoint through services/query_loading.py profiles
+    tags = db.relationship('Tag', secondary=ticket_tags, lazy='select',
                           backref=db.backref('tickets', lazy=True))
     
     def to_dict(self):
@@ -122,7 +283,326 @@ class Ticket(db.Model):
             'tags': [tag.to_dict() for tag in self.tags],
             'conversationStartDate': self.conversation_start_date.isoformat(),
             'lastUpdatedDate': self.last_updated_date.isoformat(),
-            'messages': [msg.to_dict() for msg in sorted(self.messages, key=lambda m: m.date)],
+            'messages': [msg.to_dict() for msg in self.messages],  # already ordered by Message.date
             'orderHistory': self.order_history or [],
             'relatedListingURL': self.related_listing_url
         }
+
+    def to_summary_dict(self, message_count, last_message=None):
+        # Lightweight projection for the ticket list (no message bodies or order history)
+        return {
+            'ticketID': self.ticket_id,
+            'marketplace': self.marketplace,
+            'marketplaceConversationID': self.marketplace_conversation_id,
+            'customerName': self.customer_name,
+            'priority': self.priority,
+            'ticketStatus': self.ticket_status,
+            'assignedTo': self.agent.name if self.agent else '',
+            'tags': [tag.to_dict() for tag in self.tags],
+            'conversationStartDate': self.conversation_start_date.isoformat(),
+            'lastUpdatedDate': self.last_updated_date.isoformat(),
+            'messageCount': message_count,
+            'lastMessage': last_message,
+            'relatedListingURL': self.related_listing_url
+        }
+
+
+# Cold storage for tickets that have been Completed for a while (services/archive.py). The rows
+# are moved here unchanged, message IDs included, so a restore puts them back exactly as they were.
+archived_ticket_tags = db.Table('archived_ticket_tags',
+    db.Column('ticket_id', db.String(36), db.ForeignKey('archived_tickets.ticket_id'), primary_key=True),
+    db.Column('tag_id', db.String(36), db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True)
+)
+
+
+class ArchivedTicket(db.Model):
+    __tablename__ = 'archived_tickets'
+    __table_args__ = (
+        # Archive listing, most recently updated first
+        db.Index('ix_archived_tickets_last_updated', 'last_updated_date', 'ticket_id'),
+        # Archive search, the same expressions as the live tables (PostgreSQL only)
+        db.Index('ix_archived_tickets_search_fts', TICKET_SEARCH_FTS,
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+    
+    ticket_id = db.Column('ticket_id', db.String(36), primary_key=True)
+    marketplace = db.Column(db.String(50), nullable=False)
+    # Indexed so ingest can tell when a fetched conversation continues an archived ticket
+    marketplace_conversation_id = db.Column(db.String(200), nullable=False, unique=True)
+    customer_name = db.Column(db.String(200), nullable=False)
+    priority = db.Column(db.String(20), nullable=False)
+    ticket_status = db.Column(db.String(20), nullable=False)
+    # No foreign key, so archived tickets never get in the way of deleting an agent
+    assigned_to = db.Column(db.String(36), nullable=True)
+    conversation_start_date = db.Column(db.DateTime, nullable=False)
+    last_updated_date = db.Column(db.DateTime, nullable=False)
+    order_history = db.Column(JSON, default=list)
+    related_listing_url = db.Column(db.String(500), nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    tags = db.relationship('Tag', secondary=archived_ticket_tags, lazy='select')
+    
+    def to_summary_dict(self, agent_names, message_count):
+        return {
+            'ticketID': self.ticket_id,
+            'marketplace': self.marketplace,
+            'marketplaceConversationID': self.marketplace_conversation_id,
+            'customerName': self.customer_name,
+            'priority': self.priority,
+            'ticketStatus': self.ticket_status,
+            'assignedTo': agent_names.get(self.assigned_to, ''),
+            'tags': [tag.to_dict() for tag in self.tags],
+            'conversationStartDate': self.conversation_start_date.isoformat(),
+            'lastUpdatedDate': self.last_updated_date.isoformat(),
+            'messageCount': message_count,
+            'relatedListingURL': self.related_listing_url,
+            'archivedAt': self.archived_at.isoformat()
+        }
+
+
+class ArchivedMessage(db.Model):
+    __tablename__ = 'archived_messages'
+    __table_args__ = (
+        db.Index('ix_archived_messages_ticket_id_date', 'ticket_id', 'date', 'id'),
+        db.Index('ix_archived_messages_message_fts', db.text("to_tsvector('english', message)"),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    ticket_id = db.Column(db.String(36), db.ForeignKey('archived_tickets.ticket_id'), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    authored = db.Column(db.Boolean, nullable=False, default=False)
+    date = db.Column(db.DateTime, nullable=False)
+    image_attachments = db.Column(JSON, default=list)
+    external_id = db.Column(db.String(200), nullable=True)
+    delivery_status = db.Column(db.String(20), nullable=True)
+    
+    def to_dict(self):
+        return {
+            'message': self.message,
+            'authored': self.authored,
+            'date': self.date.isoformat(),
+            **serialize_attachments(self.image_attachments),
+            'deliveryStatus': self.delivery_status
+        }
+
+
+class TicketStat(db.Model):
+    # Ticket counts per status, priority, marketplace, agent and tag, kept current by the
+    # PostgreSQL triggers below so unfiltered stats are a read of a few rows (services/ticket_stats.py)
+    __tablename__ = 'ticket_stats'
+    
+    dimension = db.Column(db.String(20), primary_key=True)  # status, priority, marketplace, agent, tag
+    value = db.Column(db.String(200), primary_key=True)  # agent/tag ID for those dimensions, '' for unassigned
+    ticket_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class TableVersion(db.Model):
+    # Write counters behind the ETags of the read endpoints (services/etags.py), kept by the PostgreSQL
+    # triggers below. Each table has TABLE_VERSION_SHARDS rows, picked by backend, so concurrent
+    # writers seldom wait on each other's row lock; a table's version is the sum of its rows.
+    __tablename__ = 'table_versions'
+    
+    table_name = db.Column(db.String(63), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class TicketTombstone(db.Model):
+    # Records tickets removed from the tickets table so the change feed can report them
+    __tablename__ = 'ticket_tombstones'
+    
+    ticket_id = db.Column(db.String(36), primary_key=True)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class OutboxMessage(db.Model):
+    # Replies waiting to be sent to their marketplace, written in the same commit as the Message
+    # and drained by services/outbox.py
+    __tablename__ = 'outbox_messages'
+    __table_args__ = (
+        # The dispatcher's claim query
+        db.Index('ix_outbox_messages_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    message_id = db.Column(db.Integer, db.ForeignKey('messages.id', ondelete='CASCADE'), nullable=False, unique=True)
+    ticket_id = db.Column(db.String(36), nullable=False, index=True)
+    marketplace = db.Column(db.String(50), nullable=False)
+    marketplace_conversation_id = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime, nullable=True)  # Lease held while a dispatcher is sending it
+    last_error = db.Column(db.Text, nullable=True)
+    external_id = db.Column(db.String(200), nullable=True)  # ID the marketplace gave the sent message
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    message = db.relationship('Message')
+    
+    def to_dict(self):
+        return {
+            'ID': self.id,
+            'ticketID': self.ticket_id,
+            'marketplace': self.marketplace,
+            'status': self.status,
+            'attempts': self.attempts,
+            'nextAttemptAt': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'lastError': self.last_error,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'sentAt': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+
+class Attachment(db.Model):
+    # A file in the content-addressed attachment store, stored once however many messages include it
+    __tablename__ = 'attachments'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    content_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def to_reference(self):
+        return {'sha256': self.sha256, 'contentType': self.content_type, 'size': self.size}
+
+
+class AttachmentSource(db.Model):
+    # Marketplace URLs already downloaded, so each one is fetched only once
+    __tablename__ = 'attachment_sources'
+    
+    url_sha256 = db.Column(db.String(64), primary_key=True)  # URLs can be longer than an index entry allows
+    url = db.Column(db.Text, nullable=False)
+    attachment_sha256 = db.Column(db.String(64), db.ForeignKey('attachments.sha256'), nullable=False)
+    
+    attachment = db.relationship('Attachment')
+
+
+class ImportCheckpoint(db.Model):
+    # How far `flask import-conversations` got through a file, committed with each batch it merges
+    __tablename__ = 'import_checkpoints'
+    
+    source = db.Column(db.String(500), primary_key=True)  # Absolute path of the file
+    file_size = db.Column(db.BigInteger, nullable=False)
+    byte_offset = db.Column(db.BigInteger, nullable=False, default=0)  # Start of the first record not yet imported
+    records = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+
+# Ticket stats rollup (PostgreSQL only). Statement-level triggers fold all of a statement's changed
+# rows into one upsert of per-value deltas, so a bulk update or ingest batch costs one extra statement.
+TICKET_STATS_UPSERT = """
+    ON CONFLICT (dimension, value) DO UPDATE SET ticket_count = ticket_stats.ticket_count + EXCLUDED.ticket_count
+"""
+TICKET_STATS_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION ticket_stats_dimensions(status text, priority text, marketplace text, assigned_to text)
+    RETURNS TABLE (dimension text, value text) AS $$
+        VALUES ('status', status), ('priority', priority), ('marketplace', marketplace), ('agent', coalesce(assigned_to, ''))
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION ticket_stats_on_tickets() RETURNS trigger AS $$
+    BEGIN
+        -- Rows are upserted in key order so concurrent statements lock them in the same order
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO ticket_stats (dimension, value, ticket_count)
+            SELECT d.dimension, d.value, count(*)
+            FROM new_rows n, ticket_stats_dimensions(n.ticket_status, n.priority, n.marketplace, n.assigned_to) d
+            GROUP BY 1, 2 ORDER BY 1, 2
+    """ + TICKET_STATS_UPSERT + """;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO ticket_stats (dimension, value, ticket_count)
+            SELECT d.dimension, d.value, -count(*)
+            FROM old_rows o, ticket_stats_dimensions(o.ticket_status, o.priority, o.marketplace, o.assigned_to) d
+            GROUP BY 1, 2 ORDER BY 1, 2
+    """ + TICKET_STATS_UPSERT + """;
+        ELSE
+            INSERT INTO ticket_stats (dimension, value, ticket_count)
+            SELECT dimension, value, sum(delta)
+            FROM (
+                SELECT d.dimension, d.value, -1 AS delta
+                FROM old_rows o, ticket_stats_dimensions(o.ticket_status, o.priority, o.marketplace, o.assigned_to) d
+                UNION ALL
+                SELECT d.dimension, d.value, 1
+                FROM new_rows n, ticket_stats_dimensions(n.ticket_status, n.priority, n.marketplace, n.assigned_to) d
+            ) changes
+            GROUP BY 1, 2 HAVING sum(delta) <> 0 ORDER BY 1, 2
+    """ + TICKET_STATS_UPSERT + """;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION ticket_stats_on_ticket_tags() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO ticket_stats (dimension, value, ticket_count)
+            SELECT 'tag', tag_id, count(*) FROM new_rows GROUP BY 1, 2 ORDER BY 1, 2
+    """ + TICKET_STATS_UPSERT + """;
+        ELSE
+            INSERT INTO ticket_stats (dimension, value, ticket_count)
+            SELECT 'tag', tag_id, -count(*) FROM old_rows GROUP BY 1, 2 ORDER BY 1, 2
+    """ + TICKET_STATS_UPSERT + """;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "CREATE TRIGGER ticket_stats_tickets_insert AFTER INSERT ON tickets "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE ticket_stats_on_tickets()",
+    "CREATE TRIGGER ticket_stats_tickets_update AFTER UPDATE ON tickets "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE ticket_stats_on_tickets()",
+    "CREATE TRIGGER ticket_stats_tickets_delete AFTER DELETE ON tickets "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE ticket_stats_on_tickets()",
+    "CREATE TRIGGER ticket_stats_ticket_tags_insert AFTER INSERT ON ticket_tags "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE ticket_stats_on_ticket_tags()",
+    "CREATE TRIGGER ticket_stats_ticket_tags_delete AFTER DELETE ON ticket_tags "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE ticket_stats_on_ticket_tags()",
+]
+# After every table exists, since the triggers span tickets, ticket_tags and ticket_stats
+for statement in TICKET_STATS_DDL:
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+
+# Table version counters (PostgreSQL only): one bump per statement that changed rows, in the
+# statement's transaction, so a version never runs ahead of the data readers can see
+TABLE_VERSION_SHARDS = 16
+VERSIONED_TABLES = ('tickets', 'tags', 'agents', 'canned_responses', 'faq_auto_responses', 'faq_entries')
+TABLE_VERSION_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+    BEGIN
+        -- Statement triggers also fire for statements that matched no rows
+        IF TG_OP <> 'TRUNCATE' THEN
+            IF NOT EXISTS (SELECT FROM changed_rows) THEN
+                RETURN NULL;
+            END IF;
+        END IF;
+        INSERT INTO table_versions (table_name, shard, version)
+        VALUES (TG_TABLE_NAME, pg_backend_pid() % """ + str(TABLE_VERSION_SHARDS) + """, 1)
+        ON CONFLICT (table_name, shard) DO UPDATE SET version = table_versions.version + 1;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+]
+for versioned_table in VERSIONED_TABLES:
+    TABLE_VERSION_DDL += [
+        f"CREATE TRIGGER table_version_{versioned_table}_insert AFTER INSERT ON {versioned_table} "
+        "REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()",
+        f"CREATE TRIGGER table_version_{versioned_table}_update AFTER UPDATE ON {versioned_table} "
+        "REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()",
+        f"CREATE TRIGGER table_version_{versioned_table}_delete AFTER DELETE ON {versioned_table} "
+        "REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()",
+        f"CREATE TRIGGER table_version_{versioned_table}_truncate AFTER TRUNCATE ON {versioned_table} "
+        "FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()",
+    ]
+for statement in TABLE_VERSION_DDL:
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
@@ -1,15 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from extensions import db
-from models import Agent
+from models import Agent, AssignmentRule, Tag, Ticket
+from services.etags import conditional, agents_etag
+from services import assignment, events, reference_cache
+from datetime import datetime
 
 bp = Blueprint('agents', __name__)
 
 
 @bp.route('/agents', methods=['GET'])
+@conditional(agents_etag)
 def get_all_agents():
     try:
-        agents = Agent.query.order_by(Agent.name).all()
-        return jsonify([agent.to_dict() for agent in agents]), 200
+        return jsonify(reference_cache.agents()), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -31,6 +34,7 @@ def create_agent():
         
         db.session.add(new_agent)
         db.session.commit()
+        reference_cache.invalidate(reference_cache.AGENTS)
         
         return jsonify(new_agent.to_dict()), 201
         
@@ -55,7 +59,27 @@ def update_agent(agent_id):
                 return jsonify({'error': 'Agent with this name already exists'}), 409
             agent.name = data['name']
         
+        if 'autoAssign' in data:
+            if not isinstance(data['autoAssign'], bool):
+                return jsonify({'error': 'autoAssign must be true or false'}), 400
+            agent.auto_assign = data['autoAssign']
+        
+        if 'maxOpenTickets' in data:
+            limit = data['maxOpenTickets']
+            if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 0):
+                return jsonify({'error': 'maxOpenTickets must be a non-negative integer or null'}), 400
+            agent.max_open_tickets = limit
+        
+        if 'assignmentRules' in data:
+            rules = parse_assignment_rules(data['assignmentRules'])
+            if isinstance(rules, str):
+                return jsonify({'error': rules}), 400
+            agent.assignment_rules = rules
+            # The agents row itself may not change, and its updated_at is the ETag of GET /agents
+            agent.updated_at = datetime.utcnow()
+        
         db.session.commit()
+        reference_cache.invalidate(reference_cache.AGENTS)
         return jsonify(agent.to_dict()), 200
         
     except Exception as e:
@@ -63,6 +87,37 @@ def update_agent(agent_id):
         return jsonify({'error': str(e)}), 500
 
 
+def parse_assignment_rules(rules):
+    """Returns the AssignmentRules for a list of {marketplace?, tagID?}, or an error message"""
+    if not isinstance(rules, list):
+        return 'assignmentRules must be a list'
+    
+    parsed = []
+    for rule in rules:
+        if not isinstance(rule, dict):
+            return 'Each assignment rule must be an object'
+        marketplace = rule.get('marketplace') or None
+        tag_id = rule.get('tagID') or None
+        if marketplace is not None and not isinstance(marketplace, str):
+            return 'marketplace must be a string'
+        if tag_id is not None and not Tag.query.get(tag_id):
+            return f'Tag not found: {tag_id}'
+        parsed.append(AssignmentRule(marketplace=marketplace, tag_id=tag_id))
+    return parsed
+
+
+@bp.route('/agents/rebalance', methods=['POST'])
+def rebalance_agents():
+    # Hands every open ticket without an agent to the least-loaded eligible one
+    try:
+        assigned, unassigned = assignment.rebalance()
+        return jsonify({'assigned': assigned, 'unassigned': unassigned}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 @bp.route('/agents/<agent_id>', methods=['DELETE'])
 def delete_agent(agent_id):
     try:
@@ -70,12 +125,25 @@ def delete_agent(agent_id):
         if not agent:
             return jsonify({'error': 'Agent not found'}), 404
         
-        # Unassign tickets from this agent
-        for ticket in agent.tickets:
-            ticket.assigned_to = None
+        # Unassign tickets from this agent in one statement instead of loading them
+        unassigned_ids = [
+            ticket_id for (ticket_id,) in db.session.query(Ticket.ticket_id).filter(Ticket.assigned_to == agent_id)
+        ]
+        Ticket.query.filter(Ticket.assigned_to == agent_id).update(
+            {Ticket.assigned_to: None, Ticket.last_updated_date: datetime.utcnow()}, synchronize_session=False
+        )
         
         db.session.delete(agent)
+        # The open ones go straight to the remaining agents (deleting the agent is flushed first, so it isn't one)
+        reassigned = assignment.assign_tickets(unassigned_ids) if current_app.config.get('AUTO_ASSIGN', True) else {}
         db.session.commit()
+        reference_cache.invalidate(reference_cache.AGENTS)
+        
+        reassigned_ids = {ticket_id for ticket_ids in reassigned.values() for ticket_id in ticket_ids}
+        events.publish_ticket_ids('ticket.assigned', [
+            ticket_id for ticket_id in unassigned_ids if ticket_id not in reassigned_ids
+        ], assignedTo='')
+        assignment.publish_assignments(reassigned)
         
         return '', 204
         
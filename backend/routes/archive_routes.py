@@ -0,0 +1,60 @@
+from flask import Blueprint, request, jsonify
+from extensions import db
+from models import Ticket
+from services.query_loading import with_profile, TICKET_FULL
+from services.ticket_queries import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
+from services.archive import get_archive_page, get_archived_ticket, restore_tickets
+from services import events
+
+bp = Blueprint('archive', __name__)
+
+
+@bp.route('/archive/tickets', methods=['GET'])
+def get_archived_tickets():
+    # Archived ticket summaries a page at a time, optionally matching ?search=
+    try:
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_LIMIT))
+            tickets, next_cursor = get_archive_page(
+                request.args.get('search', '').strip(),
+                max(1, min(limit, MAX_PAGE_LIMIT)),
+                request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'tickets': tickets, 'nextCursor': next_cursor}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/archive/tickets/<ticket_id>', methods=['GET'])
+def get_archived(ticket_id):
+    try:
+        ticket = get_archived_ticket(ticket_id)
+        if not ticket:
+            return jsonify({'error': 'Archived ticket not found'}), 404
+        
+        return jsonify(ticket), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/archive/tickets/<ticket_id>/restore', methods=['POST'])
+def restore_archived(ticket_id):
+    # Moves the ticket back into the live tables; it reappears at the top of the ticket list
+    try:
+        if not restore_tickets([ticket_id]):
+            return jsonify({'error': 'Archived ticket not found'}), 404
+        db.session.commit()
+        
+        events.publish('ticket.restored', {'ticketIDs': [ticket_id]})
+        
+        ticket = with_profile(Ticket.query, TICKET_FULL).get(ticket_id)
+        return jsonify(ticket.to_dict()), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
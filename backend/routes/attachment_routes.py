@@ -0,0 +1,39 @@
+from flask import Blueprint, jsonify
+from services.attachments import get_attachment, get_thumbnail_path, send_attachment
+
+bp = Blueprint('attachments', __name__)
+
+
+@bp.route('/attachments/<sha256>', methods=['GET'])
+def get_attachment_file(sha256):
+    # The stored file, with Range support; its URL is its hash, so it's cached for good
+    try:
+        found = get_attachment(sha256)
+        if not found:
+            return jsonify({'error': 'Attachment not found'}), 404
+        
+        attachment, path = found
+        return send_attachment(path, attachment.content_type, attachment.sha256)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/attachments/<sha256>/thumbnail', methods=['GET'])
+def get_attachment_thumbnail(sha256):
+    # What a ticket shows inline; falls back to the original when there can't be a thumbnail
+    try:
+        found = get_attachment(sha256)
+        if not found:
+            return jsonify({'error': 'Attachment not found'}), 404
+        
+        attachment, path = found
+        thumbnail = get_thumbnail_path(attachment)
+        if thumbnail is None:
+            # Not cached for good: a thumbnail may exist later (e.g. once Pillow is installed)
+            return send_attachment(path, attachment.content_type, attachment.sha256, immutable=False)
+        
+        return send_attachment(thumbnail, 'image/jpeg', f'{attachment.sha256}-thumbnail')
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
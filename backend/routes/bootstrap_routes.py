@@ -0,0 +1,31 @@
+from flask import Blueprint, request, jsonify
+from services import reference_cache
+from services.ticket_queries import get_ticket_page, current_change_token, DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
+
+bp = Blueprint('bootstrap', __name__)
+
+
+@bp.route('/bootstrap', methods=['GET'])
+def get_bootstrap():
+    # Everything the dashboard needs on load in one round trip: the reference data (from the
+    # per-worker cache) plus the first page of ticket summaries for the given filters
+    try:
+        token = current_change_token()
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_LIMIT))
+            tickets, next_cursor = get_ticket_page(request.args, max(1, min(limit, MAX_PAGE_LIMIT)), None)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'tickets': tickets,
+            'nextCursor': next_cursor,
+            'token': token,
+            'tags': reference_cache.tags(),
+            'agents': reference_cache.agents(),
+            'cannedResponses': reference_cache.canned_responses(),
+            'faqAutoResponse': reference_cache.faq_auto_response()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
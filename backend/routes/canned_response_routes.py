@@ -1,15 +1,17 @@
 from flask import Blueprint, request, jsonify
 from extensions import db
 from models import CannedResponse
+from services.etags import conditional, canned_responses_etag
+from services import reference_cache, response_suggestions
 
 bp = Blueprint('canned_responses', __name__)
 
 
 @bp.route('/cannedResponses', methods=['GET'])
+@conditional(canned_responses_etag)
 def get_canned_responses():
     try:
-        responses = CannedResponse.query.order_by(CannedResponse.created_at.desc()).all()
-        return jsonify([response.to_dict() for response in responses]), 200
+        return jsonify(reference_cache.canned_responses()), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -26,6 +28,8 @@ def create_canned_response():
         
         db.session.add(new_response)
         db.session.commit()
+        reference_cache.invalidate(reference_cache.CANNED_RESPONSES)
+        response_suggestions.changed(new_response.id)
         
         return jsonify(new_response.to_dict()), 201
         
@@ -47,6 +51,8 @@ def update_canned_response(response_id):
             canned_response.response = data['response']
         
         db.session.commit()
+        reference_cache.invalidate(reference_cache.CANNED_RESPONSES)
+        response_suggestions.changed(canned_response.id)
         return jsonify(canned_response.to_dict()), 200
         
     except Exception as e:
@@ -63,6 +69,8 @@ def delete_canned_response(response_id):
         
         db.session.delete(canned_response)
         db.session.commit()
+        reference_cache.invalidate(reference_cache.CANNED_RESPONSES)
+        response_suggestions.changed(response_id)
         
         return '', 204
         
@@ -0,0 +1,40 @@
+from flask import Blueprint, Response, stream_with_context
+import json
+import queue
+from extensions import db
+from services import events
+from services.ticket_queries import current_change_token
+
+bp = Blueprint('events', __name__)
+
+HEARTBEAT_SECONDS = 15
+
+
+@bp.route('/events', methods=['GET'])
+def stream_events():
+    # Server-sent events: ticket updates, new messages and assignment changes as they are committed
+    # Lets the client start its delta polling from the moment it connected. Read up front, so the
+    # stream doesn't keep a database connection checked out for as long as it stays open
+    token = current_change_token()
+    db.session.close()
+    subscriber = events.subscribe()
+    
+    def generate():
+        try:
+            yield f"event: connected\ndata: {json.dumps({'token': token})}\n\n"
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ': heartbeat\n\n'
+                    continue
+                yield f'event: {event}\ndata: {json.dumps(data)}\n\n'
+        finally:
+            events.unsubscribe(subscriber)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -1,18 +1,19 @@
 from flask import Blueprint, request, jsonify
 from extensions import db
-from models import FAQAutoResponse
+from models import FAQAutoResponse, FAQEntry
+from services.etags import conditional, faq_etag, faq_entries_etag
+from services.faq_matcher import MAX_PHRASE_LENGTH
+from services import reference_cache
 
 bp = Blueprint('faq', __name__)
 
 
 @bp.route('/faqAutoResponse', methods=['GET'])
+@conditional(faq_etag)
 def get_faq_auto_response():
     try:
-        # Get the first (and should be only) FAQ auto response
-        faq = FAQAutoResponse.query.first()
-
-        # Return just the string as per the service interface
-        return jsonify(faq.faq_auto_response), 200
+        # Just the text of the first (and should be only) FAQ auto response, as per the service interface
+        return jsonify(reference_cache.faq_auto_response()), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -31,8 +32,115 @@ def update_faq_auto_response(faq_id):
             faq.faq_auto_response = data['faqAutoResponse']
         
         db.session.commit()
+        reference_cache.invalidate(reference_cache.FAQ_AUTO_RESPONSE)
         return jsonify(faq.to_dict()), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+
+# FAQ entries, answered automatically on ingest (services/faq_matcher.py)
+
+def parse_faq_entry(data, entry=None):
+    """Applies the fields in data to entry (a new FAQEntry when None); returns it, or an error message"""
+    if not isinstance(data, dict):
+        return 'Request body must be an object'
+    entry = entry or FAQEntry()
+    
+    if 'name' in data or entry.name is None:
+        if not data.get('name') or not isinstance(data['name'], str):
+            return 'name is required'
+        entry.name = data['name']
+    
+    if 'triggerPhrases' in data or entry.trigger_phrases is None:
+        phrases = data.get('triggerPhrases')
+        if not isinstance(phrases, list) or not phrases or not all(isinstance(phrase, str) and phrase.strip() for phrase in phrases):
+            return 'triggerPhrases must be a non-empty list of phrases'
+        if any(len(phrase) > MAX_PHRASE_LENGTH for phrase in phrases):
+            return f'Trigger phrases are limited to {MAX_PHRASE_LENGTH} characters'
+        entry.trigger_phrases = [' '.join(phrase.split()) for phrase in phrases]
+    
+    if 'response' in data or entry.response is None:
+        if not data.get('response') or not isinstance(data['response'], str):
+            return 'response is required'
+        entry.response = data['response']
+    
+    if 'minPhraseMatches' in data:
+        count = data['minPhraseMatches']
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            return 'minPhraseMatches must be a positive integer'
+        entry.min_phrase_matches = count
+    
+    if 'enabled' in data:
+        if not isinstance(data['enabled'], bool):
+            return 'enabled must be true or false'
+        entry.enabled = data['enabled']
+    
+    return entry
+
+
+@bp.route('/faqEntries', methods=['GET'])
+@conditional(faq_entries_etag)
+def get_faq_entries():
+    try:
+        return jsonify(reference_cache.faq_entries()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/faqEntries', methods=['POST'])
+def create_faq_entry():
+    try:
+        entry = parse_faq_entry(request.get_json(silent=True))
+        if isinstance(entry, str):
+            return jsonify({'error': entry}), 400
+        
+        db.session.add(entry)
+        db.session.commit()
+        reference_cache.invalidate(reference_cache.FAQ_ENTRIES)
+        
+        return jsonify(entry.to_dict()), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/faqEntries/<entry_id>', methods=['PUT'])
+def update_faq_entry(entry_id):
+    try:
+        entry = FAQEntry.query.get(entry_id)
+        if not entry:
+            return jsonify({'error': 'FAQ entry not found'}), 404
+        
+        entry = parse_faq_entry(request.get_json(silent=True), entry)
+        if isinstance(entry, str):
+            db.session.rollback()
+            return jsonify({'error': entry}), 400
+        
+        db.session.commit()
+        reference_cache.invalidate(reference_cache.FAQ_ENTRIES)
+        return jsonify(entry.to_dict()), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/faqEntries/<entry_id>', methods=['DELETE'])
+def delete_faq_entry(entry_id):
+    try:
+        entry = FAQEntry.query.get(entry_id)
+        if not entry:
+            return jsonify({'error': 'FAQ entry not found'}), 404
+        
+        db.session.delete(entry)
+        db.session.commit()
+        reference_cache.invalidate(reference_cache.FAQ_ENTRIES)
+        
+        return '', 204
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,16 @@
+from flask import Blueprint, Response, jsonify
+from services import metrics
+
+bp = Blueprint('metrics', __name__)
+
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus text format, for this process only
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@bp.route('/metrics/slowQueries', methods=['GET'])
+def get_slow_queries():
+    # The most recent statements slower than SLOW_QUERY_MS, with their bind parameters, newest first
+    return jsonify(metrics.recent_slow_queries()), 200
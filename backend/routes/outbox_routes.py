@@ -0,0 +1,54 @@
+from flask import Blueprint, request, jsonify
+from extensions import db
+from models import Message, OutboxMessage
+from services import events, outbox
+from datetime import datetime
+
+bp = Blueprint('outbox', __name__)
+
+
+@bp.route('/outbox', methods=['GET'])
+def get_outbox():
+    # Queued and undeliverable replies, e.g. ?status=failed
+    try:
+        try:
+            limit = max(1, min(int(request.args.get('limit', 100)), 500))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        
+        query = OutboxMessage.query
+        if request.args.get('status'):
+            query = query.filter(OutboxMessage.status == request.args['status'])
+        
+        messages = query.order_by(OutboxMessage.id.desc()).limit(limit).all()
+        return jsonify([message.to_dict() for message in messages]), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/outbox/<int:outbox_id>/retry', methods=['POST'])
+def retry_outbox_message(outbox_id):
+    try:
+        outbox_message = OutboxMessage.query.get(outbox_id)
+        if not outbox_message:
+            return jsonify({'error': 'Outbox message not found'}), 404
+        if outbox_message.status != outbox.FAILED:
+            return jsonify({'error': 'Only failed messages can be retried'}), 409
+        
+        outbox_message.status = outbox.PENDING
+        outbox_message.attempts = 0
+        outbox_message.next_attempt_at = datetime.utcnow()
+        db.session.query(Message).filter(Message.id == outbox_message.message_id).update(
+            {Message.delivery_status: outbox.PENDING}, synchronize_session=False
+        )
+        db.session.commit()
+        
+        outbox.notify_pending()
+        events.publish('message.delivery', {'ticketIDs': [outbox_message.ticket_id]})
+        
+        return jsonify(outbox_message.to_dict()), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
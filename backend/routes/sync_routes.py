@@ -0,0 +1,64 @@
+from flask import Blueprint, request, jsonify
+from extensions import db
+from models import SyncState
+from services.connectors import CONNECTORS
+from datetime import datetime, timezone
+
+bp = Blueprint('sync', __name__)
+
+
+@bp.route('/syncStates', methods=['GET'])
+def get_sync_states():
+    try:
+        states = SyncState.query.order_by(SyncState.marketplace, SyncState.account).all()
+        return jsonify([state.to_dict() for state in states]), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/syncStates/<marketplace>', methods=['PUT'])
+def rewind_sync_state(marketplace):
+    # Rewind a marketplace cursor for a backfill; the next poll fetches everything after `since`
+    try:
+        # Cursors are stored under the connector's spelling of the marketplace
+        names = {name.lower(): name for name in CONNECTORS}
+        if marketplace.lower() not in names:
+            return jsonify({'error': f'No connector for marketplace {marketplace}'}), 404
+        marketplace = names[marketplace.lower()]
+        
+        data = request.get_json() or {}
+        account = data.get('account', 'default')
+        page_token = data.get('pageToken')
+        if not isinstance(account, str) or not account:
+            return jsonify({'error': 'account must be a non-empty string'}), 400
+        if page_token is not None and not isinstance(page_token, str):
+            return jsonify({'error': 'pageToken must be a string'}), 400
+        
+        since = None
+        if data.get('since'):
+            try:
+                if not isinstance(data['since'], str):
+                    raise ValueError
+                since = datetime.fromisoformat(data['since'].replace('Z', '+00:00'))
+            except ValueError:
+                return jsonify({'error': 'Invalid since timestamp'}), 400
+            # Stored dates are naive UTC
+            if since.tzinfo is not None:
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        
+        state = SyncState.query.filter_by(marketplace=marketplace, account=account).first()
+        if not state:
+            state = SyncState(marketplace=marketplace, account=account)
+            db.session.add(state)
+        
+        # Tokens and ETags describe the old position, so they can't survive a rewind
+        state.since = since
+        state.page_token = page_token
+        state.etag = None
+        
+        db.session.commit()
+        return jsonify(state.to_dict()), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
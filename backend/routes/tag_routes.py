@@ -1,15 +1,18 @@
 from flask import Blueprint, request, jsonify
 from extensions import db
-from models import Tag
+from models import Agent, AssignmentRule, Tag, Ticket, ticket_tags, archived_ticket_tags
+from services.etags import conditional, tags_etag
+from services import events, reference_cache
+from datetime import datetime
 
 bp = Blueprint('tags', __name__)
 
 
 @bp.route('/tags', methods=['GET'])
+@conditional(tags_etag)
 def get_all_tags():
     try:
-        tags = Tag.query.order_by(Tag.name).all()
-        return jsonify([tag.to_dict() for tag in tags]), 200
+        return jsonify(reference_cache.tags()), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -34,6 +37,7 @@ def create_tag():
         
         db.session.add(new_tag)
         db.session.commit()
+        reference_cache.invalidate(reference_cache.TAGS)
         
         return jsonify(new_tag.to_dict()), 201
         
@@ -62,6 +66,7 @@ def update_tag(tag_id):
             tag.color = data['color']
         
         db.session.commit()
+        reference_cache.invalidate(reference_cache.TAGS)
         return jsonify(tag.to_dict()), 200
         
     except Exception as e:
@@ -76,8 +81,28 @@ def delete_tag(tag_id):
         if not tag:
             return jsonify({'error': 'Tag not found'}), 404
         
+        # Tagged tickets lose the tag, so they count as changed for the change feed and ETags
+        # (their list position, last_updated_date, stays as it was)
+        tagged = db.select(ticket_tags.c.ticket_id).where(ticket_tags.c.tag_id == tag_id)
+        tagged_ids = [ticket_id for (ticket_id,) in db.session.execute(tagged)]
+        Ticket.query.filter(Ticket.ticket_id.in_(tagged)).update(
+            {Ticket.changed_at: datetime.utcnow(), Ticket.last_updated_date: Ticket.last_updated_date}, synchronize_session=False
+        )
+        # Remove the tag links directly rather than loading every tagged ticket
+        db.session.execute(ticket_tags.delete().where(ticket_tags.c.tag_id == tag_id))
+        db.session.execute(archived_ticket_tags.delete().where(archived_ticket_tags.c.tag_id == tag_id))
+        # Agents with assignment rules on the tag lose those rules, which changes what GET /agents returns
+        rule_agents = db.select(AssignmentRule.agent_id).where(AssignmentRule.tag_id == tag_id)
+        db.session.execute(
+            db.update(Agent).where(Agent.id.in_(rule_agents)).values(updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+        )
+        db.session.execute(db.delete(AssignmentRule).where(AssignmentRule.tag_id == tag_id))
         db.session.delete(tag)
         db.session.commit()
+        reference_cache.invalidate(reference_cache.TAGS)
+        reference_cache.invalidate(reference_cache.AGENTS)
+        events.publish_ticket_ids('ticket.updated', tagged_ids, fields=['tags'])
         
         return '', 204
         
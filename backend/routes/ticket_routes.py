@@ -1,71 +1,56 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from extensions import db
 from models import Ticket, Message, Tag, Agent
+from services.etags import conditional, tickets_etag, ticket_etag, messages_etag, suggested_responses_etag
+from services.query_loading import with_profile, TICKET_SUMMARY, TICKET_FULL
+from services.response_suggestions import suggest_responses, MAX_SUGGESTIONS
+from services.search import search_tickets
+from services.ticket_stats import get_ticket_stats
+from services.ticket_export import FORMATS, generate_export
+from services.ticket_bulk import BulkUpdateError, parse_bulk_update, bulk_update_tickets, tags_by_ticket
+from services.ticket_queries import (
+    apply_ticket_filters, get_ticket_page, get_ticket_changes, current_change_token, decode_change_token,
+    get_message_page, DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
+)
+from services import events, outbox
 from datetime import datetime
-import json
 
 bp = Blueprint('tickets', __name__)
 
 
 @bp.route('/tickets', methods=['GET'])
+@conditional(tickets_etag)
 def get_tickets():
     try:
-        # Start with base query
-        query = Ticket.query
-        
-        # Apply filters
-        search = request.args.get('search', '').strip()
-        if search:
-            # Search in customer name, marketplace conversation ID
-            query = query.filter(
-                db.or_(
-                    Ticket.customer_name.ilike(f'%{search}%'),
-                    Ticket.marketplace_conversation_id.ilike(f'%{search}%')
-                )
-            )
-        
-        ticket_status = request.args.get('ticketStatus')
-        if ticket_status:
-            query = query.filter(Ticket.ticket_status == ticket_status)
-        
-        priority = request.args.get('priority')
-        if priority:
-            query = query.filter(Ticket.priority == priority)
-        
-        assigned_to = request.args.get('assignedTo')
-        if assigned_to:
-            # get the agent id
-            agent = Agent.query.filter_by(name=assigned_to).first()
-            if agent:
-                query = query.filter(Ticket.assigned_to == agent.id)
-        
-        tags_param = request.args.get('tags')
-        if tags_param:
-            try:
-                tag_list = json.loads(tags_param)
-                if tag_list and len(tag_list) > 0:
-                    # Filter tickets that have ANY of the specified tags
-                    tag_ids = [tag.get('ID') for tag in tag_list if tag.get('ID')]
-                    if tag_ids:
-                        query = query.join(Ticket.tags).filter(Tag.id.in_(tag_ids))
-            except json.JSONDecodeError:
-                pass
-        
-        start_date = request.args.get('startDate')
-        if start_date:
+        # Delta mode: only tickets changed since the token from the previous response
+        if 'updatedSince' in request.args:
             try:
-                start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(Ticket.conversation_start_date >= start)
-            except ValueError:
-                pass
+                since = decode_change_token(request.args['updatedSince'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            token = current_change_token()
+            tickets, removed, resync = get_ticket_changes(request.args, since)
+            return jsonify({'tickets': tickets, 'removed': removed, 'resync': resync, 'token': token}), 200
         
-        end_date = request.args.get('endDate')
-        if end_date:
+        # Paginated summary mode: only used when the client asks for a page
+        if 'limit' in request.args or 'cursor' in request.args:
             try:
-                end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(Ticket.conversation_start_date <= end)
-            except ValueError:
-                pass
+                limit = int(request.args.get('limit', DEFAULT_PAGE_LIMIT))
+                token = current_change_token()
+                tickets, next_cursor = get_ticket_page(
+                    request.args,
+                    max(1, min(limit, MAX_PAGE_LIMIT)),
+                    request.args.get('cursor')
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'tickets': tickets,
+                'nextCursor': next_cursor,
+                'token': token
+            }), 200
+        
+        query = apply_ticket_filters(with_profile(Ticket.query, TICKET_FULL), request.args)
         
         # Execute query and return results
         tickets = query.order_by(Ticket.last_updated_date.desc()).all()
@@ -75,14 +60,136 @@ def get_tickets():
         return jsonify({'error': str(e)}), 500
 
 
+@bp.route('/tickets/search', methods=['GET'])
+@conditional(tickets_etag)
+def search_ticket_messages():
+    try:
+        term = request.args.get('q', '').strip()
+        if not term:
+            return jsonify({'error': 'Search query is required'}), 400
+        
+        try:
+            limit = max(1, min(int(request.args.get('limit', 20)), MAX_PAGE_LIMIT))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        
+        results = search_tickets(term, limit)
+        ticket_ids = [result['ticketID'] for result in results]
+        
+        tickets = {
+            ticket.ticket_id: ticket
+            for ticket in with_profile(Ticket.query, TICKET_SUMMARY).filter(Ticket.ticket_id.in_(ticket_ids))
+        } if ticket_ids else {}
+        message_counts = dict(
+            db.session.query(Message.ticket_id, db.func.count(Message.id))
+                .filter(Message.ticket_id.in_(ticket_ids))
+                .group_by(Message.ticket_id)
+        ) if ticket_ids else {}
+        
+        return jsonify([
+            {
+                'ticket': tickets[result['ticketID']].to_summary_dict(message_counts.get(result['ticketID'], 0)),
+                'rank': result['rank'],
+                'snippet': result['snippet']
+            }
+            for result in results if result['ticketID'] in tickets
+        ]), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/tickets/stats', methods=['GET'])
+def get_stats():
+    # Counts per status, priority, marketplace, agent and tag, under the same filters as get_tickets
+    try:
+        return jsonify(get_ticket_stats(request.args)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/tickets/export', methods=['GET'])
+def export_tickets():
+    # Every ticket matching the get_tickets filters with its conversation, streamed as it's read
+    export_format = request.args.get('format', 'csv')
+    if export_format not in FORMATS:
+        return jsonify({'error': f"Unknown format, expected one of: {', '.join(FORMATS)}"}), 400
+    
+    filename = f"tickets-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+    return Response(
+        stream_with_context(generate_export(export_format, request.args)),
+        content_type=FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@bp.route('/tickets/<ticket_id>', methods=['GET'])
+@conditional(ticket_etag)
+def get_ticket(ticket_id):
+    # Full ticket with its conversation, fetched when a ticket is opened
+    try:
+        ticket = with_profile(Ticket.query, TICKET_FULL).get(ticket_id)
+        if not ticket:
+            return jsonify({'error': 'Ticket not found'}), 404
+        
+        return jsonify(ticket.to_dict()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/tickets/<ticket_id>/messages', methods=['GET'])
+@conditional(messages_etag)
+def get_ticket_messages(ticket_id):
+    # The conversation a page at a time, newest page first; pass nextCursor as cursor for older messages
+    try:
+        if not db.session.query(Ticket.ticket_id).filter(Ticket.ticket_id == ticket_id).first():
+            return jsonify({'error': 'Ticket not found'}), 404
+        
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_LIMIT))
+            messages, next_cursor = get_message_page(
+                ticket_id,
+                max(1, min(limit, MAX_PAGE_LIMIT)),
+                request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'messages': messages, 'nextCursor': next_cursor}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/tickets/<ticket_id>/suggestedResponses', methods=['GET'])
+@conditional(suggested_responses_etag)
+def get_suggested_responses(ticket_id):
+    # Canned responses ranked against the customer's latest messages, best first
+    try:
+        if not db.session.query(Ticket.ticket_id).filter(Ticket.ticket_id == ticket_id).first():
+            return jsonify({'error': 'Ticket not found'}), 404
+        
+        try:
+            limit = max(1, min(int(request.args.get('limit', current_app.config.get('SUGGESTION_LIMIT', 5))), MAX_SUGGESTIONS))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        
+        return jsonify(suggest_responses(ticket_id, limit)), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @bp.route('/tickets/<ticket_id>', methods=['PUT'])
 def update_ticket(ticket_id):
     try:
-        ticket = Ticket.query.get(ticket_id)
+        ticket = with_profile(Ticket.query, TICKET_FULL).get(ticket_id)
         if not ticket:
             return jsonify({'error': 'Ticket not found'}), 404
         
         data = request.get_json()
+        previous_assignee = ticket.assigned_to
         
         # Update simple fields
         if 'priority' in data:
@@ -105,15 +212,19 @@ def update_ticket(ticket_id):
         
         # Update tags
         if 'tags' in data:
-            # Clear existing tags and add new ones
-            ticket.tags = []
-            for tag_data in data['tags']:
-                tag = Tag.query.get(tag_data['ID'])
-                if tag:
-                    ticket.tags.append(tag)
+            # Replace existing tags, loading all of the new ones in a single query
+            tag_ids = [tag_data['ID'] for tag_data in data['tags']]
+            ticket.tags = Tag.query.filter(Tag.id.in_(tag_ids)).all() if tag_ids else []
         
+        # Tag changes don't touch the tickets row, so bump it explicitly for the change feed
+        ticket.last_updated_date = datetime.utcnow()
         
         db.session.commit()
+        
+        events.publish('ticket.updated', {'ticketIDs': [ticket_id], 'fields': sorted(data.keys())})
+        if ticket.assigned_to != previous_assignee:
+            events.publish('ticket.assigned', {'ticketIDs': [ticket_id], 'assignedTo': ticket.agent.name if ticket.agent else ''})
+        
         return jsonify(ticket.to_dict()), 200
         
     except Exception as e:
@@ -121,10 +232,55 @@ def update_ticket(ticket_id):
         return jsonify({'error': str(e)}), 500
 
 
+@bp.route('/tickets/bulk', methods=['PATCH'])
+def bulk_update():
+    # Status, priority, assignee and tag changes for many tickets in a fixed number of statements
+    try:
+        data = request.get_json(silent=True)
+        try:
+            ticket_ids, values, add_tag_ids, remove_tag_ids = parse_bulk_update(data)
+        except BulkUpdateError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        updated_ids, failures, updated_at = bulk_update_tickets(ticket_ids, values, add_tag_ids, remove_tag_ids)
+        
+        # Only the fields that changed, not full tickets
+        changes = {}
+        for field in ('ticketStatus', 'priority', 'assignedTo'):
+            if field in data:
+                changes[field] = data[field]
+        tags = tags_by_ticket(updated_ids) if (add_tag_ids or remove_tag_ids) and updated_ids else {}
+        updated = [
+            {
+                'ticketID': ticket_id,
+                **changes,
+                **({'tags': tags[ticket_id]} if tags else {}),
+                'lastUpdatedDate': updated_at.isoformat()
+            }
+            for ticket_id in updated_ids
+        ]
+        
+        if updated_ids:
+            fields = sorted(changes) + (['tags'] if add_tag_ids or remove_tag_ids else [])
+            events.publish_ticket_ids('ticket.updated', updated_ids, fields=fields)
+            if 'assignedTo' in changes:
+                events.publish_ticket_ids('ticket.assigned', updated_ids, assignedTo=changes['assignedTo'])
+        
+        return jsonify({
+            'updated': updated,
+            'failed': [{'ticketID': ticket_id, 'error': error} for ticket_id, error in failures.items()]
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 @bp.route('/tickets/<ticket_id>/reply', methods=['PUT'])
 def reply_to_ticket(ticket_id):
-    # NOTE: this is what you'd connect to your external messaging API to send the reply
+    # Sending to the marketplace happens in the background (services/outbox.py), so this never waits on its API
     try:
+        # The conversation itself is never loaded, however long it is
         ticket = Ticket.query.get(ticket_id)
         if not ticket:
             return jsonify({'error': 'Ticket not found'}), 404
@@ -134,9 +290,6 @@ def reply_to_ticket(ticket_id):
         if not reply_text or not isinstance(reply_text, str):
             return jsonify({'error': 'Reply message is required'}), 400
         
-        # PLACEHOLDER: Here you would integrate with whatever API you're fetching customer info from
-        
-        # For now, we just add the message to our database
         new_message = Message(
             ticket_id=ticket_id,
             message=reply_text,
@@ -146,15 +299,30 @@ def reply_to_ticket(ticket_id):
         )
         
         db.session.add(new_message)
+        # Queued for the marketplace in the same commit as the message itself
+        outbox.enqueue_reply(new_message, ticket)
         ticket.last_updated_date = datetime.utcnow()
         
         # Optionally update ticket status to "In Progress" if it was "New"
         if ticket.ticket_status == 'New':
             ticket.ticket_status = 'In Progress'
         
+        # Just the new message and the ticket fields a reply can change, serialized
+        # before the commit expires them so nothing is reloaded
+        result = {
+            'message': new_message.to_dict(),
+            'ticket': {
+                'ticketID': ticket.ticket_id,
+                'ticketStatus': ticket.ticket_status,
+                'lastUpdatedDate': ticket.last_updated_date.isoformat()
+            }
+        }
+        
         db.session.commit()
+        outbox.notify_pending()
+        events.publish('message.created', {'ticketIDs': [ticket_id], 'authored': True})
         
-        return jsonify(ticket.to_dict()), 200
+        return jsonify(result), 200
         
     except Exception as e:
         db.session.rollback()
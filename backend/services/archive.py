@@ -0,0 +1,218 @@
+"""
+Hot/cold split: tickets that have been Completed for a while move to the archived_* tables.
+
+A job on the scheduler leader (or `flask --app app archive-tickets`) moves tickets whose last update
+is more than ARCHIVE_AFTER_DAYS old, with their messages and tag links, in batches of
+ARCHIVE_BATCH_SIZE, one transaction per batch. Every query over tickets and messages (the list,
+filters, search, stats) then only covers the working set, however old the shop is.
+
+Each move leaves a TicketTombstone so change feed clients drop the ticket from their lists.
+Archived tickets stay searchable through GET /api/archive/tickets and are moved back by
+restore_tickets, either on request or by ingest when a customer writes again in an archived
+conversation. Restoring bumps last_updated_date, which also keeps the ticket out of the next run.
+"""
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.orm import selectinload
+from extensions import db
+from models import (
+    Ticket, Message, Agent, TicketTombstone, OutboxMessage, ArchivedTicket, ArchivedMessage,
+    ticket_tags, archived_ticket_tags
+)
+from services import events, outbox, reference_cache
+from services.search import is_postgres, tokenize, to_tsquery
+from services.ticket_queries import encode_cursor, decode_cursor
+
+logger = logging.getLogger(__name__)
+
+tickets_table = Ticket.__table__
+messages_table = Message.__table__
+archived_tickets_table = ArchivedTicket.__table__
+archived_messages_table = ArchivedMessage.__table__
+
+
+def copy_rows(source, target, where, **overrides):
+    """INSERT INTO target SELECT the same columns FROM source WHERE ..., with some columns replaced by expressions"""
+    columns = [column.name for column in target.columns if column.name in overrides or column.name in source.columns]
+    rows = db.select(*[overrides[name] if name in overrides else source.c[name] for name in columns]).where(where)
+    db.session.execute(target.insert().from_select(columns, rows))
+
+
+# Archiving
+
+def archivable_ticket_ids(completed_before, limit):
+    # Tickets with replies still on their way to the marketplace wait for the next run
+    sending = db.select(OutboxMessage.ticket_id).where(OutboxMessage.status.in_((outbox.PENDING, outbox.SENDING)))
+    return [
+        ticket_id for (ticket_id,) in db.session.query(Ticket.ticket_id)
+            .filter(
+                Ticket.ticket_status == 'Completed',
+                Ticket.last_updated_date < completed_before,
+                Ticket.ticket_id.notin_(sending)
+            )
+            .order_by(Ticket.last_updated_date)
+            .limit(limit)
+            .with_for_update(of=Ticket, skip_locked=True)
+    ]
+
+
+def archive_batch(completed_before, batch_size):
+    """Move one batch of tickets into the archive and commit; returns the archived ticket IDs"""
+    ticket_ids = archivable_ticket_ids(completed_before, batch_size)
+    if not ticket_ids:
+        db.session.rollback()
+        return []
+
+    now = datetime.utcnow()
+    copy_rows(tickets_table, archived_tickets_table, tickets_table.c.ticket_id.in_(ticket_ids),
+              archived_at=db.literal(now, db.DateTime))
+    copy_rows(messages_table, archived_messages_table, messages_table.c.ticket_id.in_(ticket_ids))
+    copy_rows(ticket_tags, archived_ticket_tags, ticket_tags.c.ticket_id.in_(ticket_ids))
+
+    # Delivered and failed replies' outbox rows have nothing left to do
+    db.session.execute(db.delete(OutboxMessage).where(OutboxMessage.ticket_id.in_(ticket_ids)))
+    db.session.execute(ticket_tags.delete().where(ticket_tags.c.ticket_id.in_(ticket_ids)))
+    db.session.execute(messages_table.delete().where(messages_table.c.ticket_id.in_(ticket_ids)))
+    db.session.execute(tickets_table.delete().where(tickets_table.c.ticket_id.in_(ticket_ids)))
+    db.session.execute(db.insert(TicketTombstone), [
+        {'ticket_id': ticket_id, 'deleted_at': now} for ticket_id in ticket_ids
+    ])
+    db.session.commit()
+
+    events.publish_ticket_ids('ticket.archived', ticket_ids)
+    return ticket_ids
+
+
+def archive_tickets(older_than_days=None, batch_size=None):
+    """Archive every ticket Completed for longer than older_than_days (default ARCHIVE_AFTER_DAYS); returns how many"""
+    config = current_app.config
+    if older_than_days is None:
+        older_than_days = config.get('ARCHIVE_AFTER_DAYS', 90)
+    batch_size = batch_size or config.get('ARCHIVE_BATCH_SIZE', 500)
+    completed_before = datetime.utcnow() - timedelta(days=older_than_days)
+
+    total = 0
+    while True:
+        try:
+            archived = archive_batch(completed_before, batch_size)
+        except Exception:
+            db.session.rollback()
+            raise
+        total += len(archived)
+        if len(archived) < batch_size:
+            break
+
+    if total:
+        logger.info(f"Archived {total} tickets completed before {completed_before:%Y-%m-%d}")
+    return total
+
+
+# Restoring
+
+def restore_tickets(ticket_ids):
+    """
+    Move archived tickets back into the live tables as part of the caller's transaction (the
+    caller commits). Returns the IDs that were restored; IDs that aren't archived are ignored.
+    """
+    ticket_ids = [
+        ticket_id for (ticket_id,) in db.session.query(ArchivedTicket.ticket_id)
+            .filter(ArchivedTicket.ticket_id.in_(ticket_ids))
+            .with_for_update()
+    ] if ticket_ids else []
+    if not ticket_ids:
+        return []
+
+    now = datetime.utcnow()
+    # The assignee is dropped if the agent was deleted while the ticket was archived
+    agent_id = db.select(Agent.id).where(Agent.id == archived_tickets_table.c.assigned_to).scalar_subquery()
+    copy_rows(archived_tickets_table, tickets_table, archived_tickets_table.c.ticket_id.in_(ticket_ids),
+              assigned_to=agent_id, last_updated_date=db.literal(now, db.DateTime), changed_at=db.literal(now, db.DateTime))
+    copy_rows(archived_messages_table, messages_table, archived_messages_table.c.ticket_id.in_(ticket_ids))
+    copy_rows(archived_ticket_tags, ticket_tags, archived_ticket_tags.c.ticket_id.in_(ticket_ids))
+
+    db.session.execute(archived_ticket_tags.delete().where(archived_ticket_tags.c.ticket_id.in_(ticket_ids)))
+    db.session.execute(archived_messages_table.delete().where(archived_messages_table.c.ticket_id.in_(ticket_ids)))
+    db.session.execute(archived_tickets_table.delete().where(archived_tickets_table.c.ticket_id.in_(ticket_ids)))
+    db.session.execute(db.delete(TicketTombstone).where(TicketTombstone.ticket_id.in_(ticket_ids)))
+    return ticket_ids
+
+
+def restore_conversations(conversation_ids):
+    """Restore the archived tickets of these marketplace conversations (caller commits); returns their IDs"""
+    ticket_ids = [
+        ticket_id for (ticket_id,) in db.session.query(ArchivedTicket.ticket_id)
+            .filter(ArchivedTicket.marketplace_conversation_id.in_(conversation_ids))
+    ]
+    return restore_tickets(ticket_ids) if ticket_ids else []
+
+
+# Browsing the archive
+
+def archive_match_clause(term):
+    if is_postgres():
+        # Same expressions as the ix_archived_*_fts indexes
+        ticket_vector = db.func.to_tsvector(
+            db.literal_column("'simple'"),
+            ArchivedTicket.customer_name.op('||')(db.literal_column("' '")).op('||')(ArchivedTicket.marketplace_conversation_id)
+        )
+        message_vector = db.func.to_tsvector(db.literal_column("'english'"), ArchivedMessage.message)
+        hits = db.union(
+            db.select(ArchivedTicket.ticket_id).where(ticket_vector.op('@@')(to_tsquery('simple', term))),
+            db.select(ArchivedMessage.ticket_id).where(message_vector.op('@@')(to_tsquery('english', term)))
+        )
+        return ArchivedTicket.ticket_id.in_(hits)
+
+    # Elsewhere a scan, which is fine for a cold table: every word must appear somewhere
+    clauses = []
+    for word in tokenize(term):
+        pattern = f'%{word}%'
+        clauses.append(db.or_(
+            ArchivedTicket.customer_name.ilike(pattern),
+            ArchivedTicket.marketplace_conversation_id.ilike(pattern),
+            ArchivedTicket.ticket_id.in_(
+                db.select(ArchivedMessage.ticket_id).where(ArchivedMessage.message.ilike(pattern))
+            )
+        ))
+    return db.and_(*clauses)
+
+
+def get_archive_page(search, limit, cursor=None):
+    """Archived ticket summaries, most recently updated first; returns (tickets, next cursor or None)"""
+    message_count = db.select(db.func.count(ArchivedMessage.id)) \
+        .where(ArchivedMessage.ticket_id == ArchivedTicket.ticket_id) \
+        .correlate(ArchivedTicket) \
+        .scalar_subquery()
+    query = db.session.query(ArchivedTicket, message_count).options(selectinload(ArchivedTicket.tags))
+
+    if search and tokenize(search):
+        query = query.filter(archive_match_clause(search))
+    if cursor:
+        last_updated, ticket_id = decode_cursor(cursor)
+        query = query.filter(db.tuple_(ArchivedTicket.last_updated_date, ArchivedTicket.ticket_id) < (last_updated, ticket_id))
+
+    rows = query.order_by(ArchivedTicket.last_updated_date.desc(), ArchivedTicket.ticket_id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    agent_names = {agent['ID']: agent['name'] for agent in reference_cache.agents()}
+    tickets = [ticket.to_summary_dict(agent_names, count) for ticket, count in rows]
+    next_cursor = encode_cursor(rows[-1][0].last_updated_date, rows[-1][0].ticket_id) if has_more else None
+    return tickets, next_cursor
+
+
+def get_archived_ticket(ticket_id):
+    """An archived ticket with its whole conversation, or None"""
+    ticket = ArchivedTicket.query.get(ticket_id)
+    if ticket is None:
+        return None
+
+    messages = ArchivedMessage.query.filter(ArchivedMessage.ticket_id == ticket_id) \
+        .order_by(ArchivedMessage.date, ArchivedMessage.id) \
+        .all()
+    agent_names = {agent['ID']: agent['name'] for agent in reference_cache.agents()}
+    return {
+        **ticket.to_summary_dict(agent_names, len(messages)),
+        'messages': [message.to_dict() for message in messages],
+        'orderHistory': ticket.order_history or []
+    }
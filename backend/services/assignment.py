@@ -0,0 +1,151 @@
+"""
+Auto-assignment of open tickets to agents.
+
+With AUTO_ASSIGN on, ingest hands each batch's new tickets to assign_tickets in the batch's
+transaction, and deleting an agent hands that agent's open tickets over to the others.
+POST /api/agents/rebalance catches up on every open ticket still unassigned (e.g. after an agent
+was removed with AUTO_ASSIGN off, capacity was raised or an agent was added).
+
+Agents with auto_assign set take part. An agent with assignment rules is only eligible for tickets
+matching one of them; each ticket goes to the eligible agent with the fewest open (not Completed)
+tickets, skipping agents at their max_open_tickets. Open tickets are counted once per call, with one
+grouped query on ix_tickets_open_by_agent, and the counts are kept up to date in memory while the
+batch is handed out, so a batch costs the same few statements however many tickets it holds.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from extensions import db
+from models import Agent, Ticket, ticket_tags
+from services import events
+
+logger = logging.getLogger(__name__)
+
+OPEN = Ticket.ticket_status != 'Completed'
+
+
+def open_ticket_counts(agent_ids):
+    return defaultdict(int, db.session.query(Ticket.assigned_to, db.func.count())
+        .filter(Ticket.assigned_to.in_(agent_ids), OPEN)
+        .group_by(Ticket.assigned_to)
+        .all())
+
+
+def ticket_tag_ids(ticket_ids):
+    tag_ids = defaultdict(set)
+    rows = db.session.execute(
+        db.select(ticket_tags.c.ticket_id, ticket_tags.c.tag_id).where(ticket_tags.c.ticket_id.in_(ticket_ids))
+    )
+    for ticket_id, tag_id in rows:
+        tag_ids[ticket_id].add(tag_id)
+    return tag_ids
+
+
+def choose_agents(tickets, agents, open_counts):
+    """
+    tickets: [(ticket_id, marketplace, tag_ids)] in the order they should be handed out
+    Returns {agent: [ticket_id, ...]}, counting each assignment into open_counts
+    """
+    assignments = defaultdict(list)
+    # Tickets from the same marketplace with the same tags have the same eligible agents
+    eligible_by_key = {}
+    for ticket_id, marketplace, tag_ids in tickets:
+        key = (marketplace, frozenset(tag_ids))
+        eligible = eligible_by_key.get(key)
+        if eligible is None:
+            eligible = eligible_by_key[key] = [
+                agent for agent in agents
+                if not agent.assignment_rules or any(rule.matches(marketplace, tag_ids) for rule in agent.assignment_rules)
+            ]
+        available = [
+            agent for agent in eligible
+            if agent.max_open_tickets is None or open_counts[agent.id] < agent.max_open_tickets
+        ]
+        if not available:
+            continue
+        # Ties go to the agent first by name, as agents are loaded in that order
+        agent = min(available, key=lambda agent: open_counts[agent.id])
+        open_counts[agent.id] += 1
+        assignments[agent].append(ticket_id)
+    return assignments
+
+
+def assign_tickets(ticket_ids):
+    """
+    Assign the open, unassigned tickets among ticket_ids, oldest conversation first, within the
+    caller's transaction. Returns {agent name: [ticket IDs]}; publish it with publish_assignments
+    once the caller has committed.
+    """
+    if not ticket_ids:
+        return {}
+
+    agents = Agent.query.filter(Agent.auto_assign.is_(True)).order_by(Agent.name).all()
+    if not agents:
+        return {}
+
+    rows = db.session.query(Ticket.ticket_id, Ticket.marketplace) \
+        .filter(Ticket.ticket_id.in_(ticket_ids), Ticket.assigned_to.is_(None), OPEN) \
+        .order_by(Ticket.conversation_start_date, Ticket.ticket_id) \
+        .all()
+    if not rows:
+        return {}
+    # Tags are only looked up when some rule needs them
+    uses_tags = any(rule.tag_id for agent in agents for rule in agent.assignment_rules)
+    tag_ids = ticket_tag_ids([ticket_id for ticket_id, _ in rows]) if uses_tags else {}
+    tickets = [(ticket_id, marketplace, tag_ids.get(ticket_id, set())) for ticket_id, marketplace in rows]
+
+    assignments = choose_agents(tickets, agents, open_ticket_counts([agent.id for agent in agents]))
+
+    now = datetime.utcnow()
+    assigned = {}
+    for agent, agent_ticket_ids in assignments.items():
+        # Still unassigned: someone may have assigned one by hand since it was read
+        result = db.session.execute(
+            db.update(Ticket)
+                .where(Ticket.ticket_id.in_(agent_ticket_ids), Ticket.assigned_to.is_(None))
+                .values({Ticket.assigned_to: agent.id, Ticket.last_updated_date: now})
+                .returning(Ticket.ticket_id)
+                .execution_options(synchronize_session=False)
+        )
+        assigned[agent.name] = [ticket_id for (ticket_id,) in result]
+    return assigned
+
+
+def publish_assignments(assigned):
+    for agent_name, ticket_ids in assigned.items():
+        events.publish_ticket_ids('ticket.assigned', ticket_ids, assignedTo=agent_name)
+
+
+def rebalance(batch_size=None):
+    """
+    Assign every open ticket that has no agent, oldest conversation first, committing each batch.
+    Returns ({agent name: tickets assigned}, tickets left unassigned)
+    """
+    batch_size = batch_size or current_app.config.get('ASSIGN_BATCH_SIZE', 1000)
+    totals = defaultdict(int)
+    unassigned = 0
+    last_start, last_id = None, None
+    while True:
+        # Keyset pagination, so tickets no agent can take aren't read again
+        query = db.session.query(Ticket.ticket_id, Ticket.conversation_start_date) \
+            .filter(Ticket.assigned_to.is_(None), OPEN)
+        if last_id:
+            query = query.filter(db.tuple_(Ticket.conversation_start_date, Ticket.ticket_id) > (last_start, last_id))
+        rows = query.order_by(Ticket.conversation_start_date, Ticket.ticket_id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id, last_start = rows[-1]
+
+        assigned = assign_tickets([ticket_id for ticket_id, _ in rows])
+        db.session.commit()
+        publish_assignments(assigned)
+
+        assigned_count = 0
+        for agent_name, ticket_ids in assigned.items():
+            totals[agent_name] += len(ticket_ids)
+            assigned_count += len(ticket_ids)
+        unassigned += len(rows) - assigned_count
+
+    logger.info(f'Rebalance assigned {sum(totals.values())} tickets, {unassigned} left unassigned')
+    return dict(totals), unassigned
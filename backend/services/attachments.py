@@ -0,0 +1,337 @@
+"""
+Content-addressed attachment store.
+
+Ingest hands each batch's messages to store_message_attachments before its transaction starts.
+Every attachment URL not seen before is downloaded once, ATTACHMENT_DOWNLOAD_WORKERS at a time,
+into ATTACHMENT_DIR under the SHA-256 of its contents, so a photo sent in many messages (or from
+many URLs) is stored once. The message then keeps a {'sha256', 'contentType', 'size'} reference in
+place of the URL; URLs that fail to download are left as they were and hot-linked as before.
+
+The URLs come from customers' messages, so a download (and every redirect it follows) only goes to
+hosts that resolve to public addresses, and only to ATTACHMENT_HOSTS and their subdomains when
+that's set, never to the loopback, private or link-local addresses of the servers around this one.
+
+Images also get a JPEG thumbnail of at most ATTACHMENT_THUMBNAIL_SIZE pixels a side, made on a
+background thread pool right after the download, or on the first request if that hasn't finished.
+Thumbnails need Pillow; without it the thumbnail URL serves the original.
+
+Files are served by GET /api/attachments/<sha256> (and .../thumbnail) with send_file, which
+handles Range requests and hands the file to the server's sendfile where it has one. A hash never
+changes content, so responses are cacheable for a year without revalidation.
+"""
+import hashlib
+import ipaddress
+import logging
+import mimetypes
+import os
+import socket
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse
+import requests
+from flask import current_app, send_file
+from sqlalchemy.orm import joinedload
+from extensions import db
+from models import Attachment, AttachmentSource
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+CACHE_SECONDS = 365 * 24 * 3600
+MAX_REDIRECTS = 5
+# Image types browsers display and Pillow reads. Anything else, SVG included, is served as a
+# download so a customer's file can't run script on the API's origin.
+IMAGE_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp'}
+
+_thumbnail_pool = None
+_pool_lock = threading.Lock()
+
+
+class AttachmentError(Exception):
+    pass
+
+
+# Paths
+
+def original_path(root, sha256):
+    return os.path.join(root, 'originals', sha256[:2], sha256)
+
+
+def thumbnail_path(root, sha256):
+    return os.path.join(root, 'thumbnails', sha256[:2], f'{sha256}.jpg')
+
+
+def is_sha256(value):
+    return len(value) == 64 and all(char in '0123456789abcdef' for char in value)
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def write_atomically(directory, path, write):
+    """Call write(file) on a temporary file, then move it to path, so readers never see a partial file"""
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            write(file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+# Downloading
+
+def is_public_address(address):
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    # Not global: private, loopback, link-local, shared, reserved and documentation ranges
+    return ip.is_global and not ip.is_multicast
+
+
+def check_url(url, allowed_hosts=()):
+    """Raises AttachmentError unless url is http(s) on an allowed host that only resolves to public addresses"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise AttachmentError(f'not an http(s) URL: {url}')
+    host = parsed.hostname.lower().rstrip('.')
+    if allowed_hosts and not any(host == allowed or host.endswith(f'.{allowed}') for allowed in allowed_hosts):
+        raise AttachmentError(f'{host} is not in ATTACHMENT_HOSTS')
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    except ValueError as e:
+        raise AttachmentError(f'{e}: {url}')
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except socket.gaierror as e:
+        raise AttachmentError(f'cannot resolve {host}: {e}')
+    for address in addresses:
+        if not is_public_address(address):
+            raise AttachmentError(f'{host} resolves to {address}, which is not a public address')
+
+
+def open_url(session, url, timeout, allowed_hosts=()):
+    """GET url, following redirects by hand so every hop is checked; returns the streamed response"""
+    for _ in range(MAX_REDIRECTS + 1):
+        check_url(url, allowed_hosts)
+        response = session.get(url, stream=True, timeout=timeout, allow_redirects=False)
+        if not response.is_redirect:
+            return response
+        response.close()
+        url = urljoin(url, response.headers['Location'])
+    raise AttachmentError(f'more than {MAX_REDIRECTS} redirects')
+
+
+def download(session, url, root, max_bytes, timeout, allowed_hosts=()):
+    """Stream url into the store; returns its reference {'sha256', 'contentType', 'size'}"""
+    with open_url(session, url, timeout, allowed_hosts) as response:
+        if response.status_code != 200:
+            raise AttachmentError(f'HTTP {response.status_code}')
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+        digest = hashlib.sha256()
+        size = 0
+        # Written to a temporary file first: the name depends on the contents
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise AttachmentError(f'larger than {max_bytes} bytes')
+                    digest.update(chunk)
+                    file.write(chunk)
+            sha256 = digest.hexdigest()
+            path = original_path(root, sha256)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    return {'sha256': sha256, 'contentType': content_type or 'application/octet-stream', 'size': size}
+
+
+def download_all(urls, config):
+    """Download urls concurrently; returns {url: reference} for the ones that succeeded"""
+    root = config['ATTACHMENT_DIR']
+    workers = config.get('ATTACHMENT_DOWNLOAD_WORKERS', 4)
+    references = {}
+    with requests.Session() as session, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix='attachment-download') as executor:
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=workers))
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=workers))
+        futures = {
+            executor.submit(
+                download, session, url, root,
+                config.get('ATTACHMENT_MAX_BYTES', 20 * 1024 * 1024), config.get('ATTACHMENT_DOWNLOAD_TIMEOUT', 15),
+                config.get('ATTACHMENT_HOSTS', ())
+            ): url
+            for url in urls
+        }
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                references[url] = future.result()
+            except Exception as e:
+                logger.warning(f"Attachment {url} not downloaded, keeping the link: {e}")
+    return references
+
+
+def is_downloadable(entry):
+    return isinstance(entry, str) and urlparse(entry).scheme in ('http', 'https')
+
+
+def store_message_attachments(conversations):
+    """
+    Replace the attachment URLs of these (normalized) conversations' messages, in place, with
+    references to stored copies, downloading the URLs that haven't been before. Commits its own
+    short transaction; called before the ingest transaction so that never waits on a download.
+    Returns the number of files downloaded.
+    """
+    config = current_app.config
+    if not config.get('ATTACHMENT_DOWNLOADS', True):
+        return 0
+
+    messages = [message for conversation in conversations for message in conversation['messages']]
+    urls = {entry for message in messages for entry in message.get('image_attachments') or [] if is_downloadable(entry)}
+    if not urls:
+        return 0
+
+    keys = {url_key(url): url for url in urls}
+    references = {
+        keys[source.url_sha256]: source.attachment.to_reference()
+        for source in AttachmentSource.query
+            .options(joinedload(AttachmentSource.attachment))
+            .filter(AttachmentSource.url_sha256.in_(keys))
+    }
+    # Nothing is held open while downloading
+    db.session.commit()
+
+    downloaded = download_all(urls - references.keys(), config)
+    if downloaded:
+        # services.ingest imports this module
+        from services.ingest import dialect_insert
+        attachments = {reference['sha256']: reference for reference in downloaded.values()}
+        try:
+            db.session.execute(
+                dialect_insert(Attachment.__table__).on_conflict_do_nothing(index_elements=['sha256']),
+                [
+                    {'sha256': sha256, 'content_type': reference['contentType'], 'size': reference['size']}
+                    for sha256, reference in attachments.items()
+                ]
+            )
+            db.session.execute(
+                dialect_insert(AttachmentSource.__table__).on_conflict_do_nothing(index_elements=['url_sha256']),
+                [
+                    {'url_sha256': url_key(url), 'url': url, 'attachment_sha256': reference['sha256']}
+                    for url, reference in downloaded.items()
+                ]
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        queue_thumbnails(attachments.values())
+        references.update(downloaded)
+
+    for message in messages:
+        if message.get('image_attachments'):
+            message['image_attachments'] = [
+                references.get(entry, entry) if isinstance(entry, str) else entry
+                for entry in message['image_attachments']
+            ]
+    return len(downloaded)
+
+
+# Thumbnails
+
+def can_thumbnail(content_type):
+    return Image is not None and content_type in IMAGE_TYPES
+
+
+def make_thumbnail(root, sha256, size):
+    """Write a stored image's thumbnail unless it exists; returns its path, or None if the image can't be read"""
+    path = thumbnail_path(root, sha256)
+    if os.path.exists(path):
+        return path
+    try:
+        with Image.open(original_path(root, sha256)) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            write_atomically(os.path.dirname(path), path, lambda file: image.save(file, 'JPEG', quality=80, optimize=True))
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"No thumbnail for attachment {sha256}: {e}")
+        return None
+    return path
+
+
+def thumbnail_pool():
+    global _thumbnail_pool
+    with _pool_lock:
+        if _thumbnail_pool is None:
+            _thumbnail_pool = ThreadPoolExecutor(
+                max_workers=current_app.config.get('ATTACHMENT_THUMBNAIL_WORKERS', 2),
+                thread_name_prefix='attachment-thumbnail'
+            )
+        return _thumbnail_pool
+
+
+def queue_thumbnails(references):
+    root = current_app.config['ATTACHMENT_DIR']
+    size = current_app.config.get('ATTACHMENT_THUMBNAIL_SIZE', 320)
+    for reference in references:
+        if can_thumbnail(reference['contentType']):
+            thumbnail_pool().submit(make_thumbnail, root, reference['sha256'], size)
+
+
+# Serving
+
+def get_attachment(sha256):
+    """(Attachment, path of the original) or None if there's no such attachment"""
+    if not is_sha256(sha256):
+        return None
+    attachment = Attachment.query.get(sha256)
+    path = original_path(current_app.config['ATTACHMENT_DIR'], sha256) if attachment else None
+    if attachment is None or not os.path.exists(path):
+        return None
+    return attachment, path
+
+
+def get_thumbnail_path(attachment):
+    """The thumbnail's path, made now if the pool hasn't got to it; None if the attachment can't have one"""
+    if not can_thumbnail(attachment.content_type):
+        return None
+    return make_thumbnail(
+        current_app.config['ATTACHMENT_DIR'], attachment.sha256, current_app.config.get('ATTACHMENT_THUMBNAIL_SIZE', 320)
+    )
+
+
+def send_attachment(path, content_type, etag, immutable=True):
+    inline = content_type in IMAGE_TYPES
+    response = send_file(
+        path,
+        mimetype=content_type,
+        as_attachment=not inline,
+        download_name=os.path.basename(path) + ('' if inline else (mimetypes.guess_extension(content_type) or '')),
+        conditional=True,
+        etag=etag,
+        max_age=CACHE_SECONDS if immutable else 3600
+    )
+    response.cache_control.immutable = immutable
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
@@ -0,0 +1,341 @@
+"""
+Load benchmark for the API routes (`flask --app app bench-routes`).
+
+Every route gets a scenario with realistic arguments taken from the current database (seed it
+first with `flask --app app seed-data`). Each scenario is driven by `concurrency` threads through
+Flask's test client, so the numbers cover routing, queries and serialization but not the HTTP
+server. The report is JSON with per-route p50/p95/p99 latency (ms), throughput (requests/s) and
+SQL statements per request, plus the git commit, so runs can be compared between commits with
+compare_reports.
+
+Write scenarios change data (they update tickets, queue replies, ...), so they only run when asked.
+Routes without a scenario are listed in the report's "skipped" section with the reason.
+"""
+import json
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import count
+from sqlalchemy import event
+from extensions import db
+from models import Ticket, Message, Tag, Agent, CannedResponse, FAQAutoResponse, FAQEntry, ArchivedTicket, Attachment
+
+# Routes left out on purpose, as (method, rule): reason
+NOT_BENCHMARKED = {
+    ('GET', '/api/events'): 'streams until the client disconnects',
+    ('GET', '/static/<path:filename>'): 'static files',
+    ('POST', '/api/tags'): 'creates reference data on every request',
+    ('POST', '/api/agents'): 'creates reference data on every request',
+    ('POST', '/api/cannedResponses'): 'creates reference data on every request',
+    ('POST', '/api/faqEntries'): 'creates reference data on every request',
+    ('DELETE', '/api/tags/<tag_id>'): 'destructive',
+    ('DELETE', '/api/agents/<agent_id>'): 'destructive',
+    ('DELETE', '/api/cannedResponses/<response_id>'): 'destructive',
+    ('DELETE', '/api/faqEntries/<entry_id>'): 'destructive',
+    ('PUT', '/api/syncStates/<marketplace>'): 'rewinds marketplace sync cursors',
+    ('POST', '/api/outbox/<int:outbox_id>/retry'): 'needs failed outbox messages',
+    ('POST', '/api/archive/tickets/<ticket_id>/restore'): 'moves tickets out of the archive',
+}
+
+# Routes whose scenario needs a row the database may not have, as (method, rule): reason when it's missing
+NEEDS_DATA = {
+    ('GET', '/api/archive/tickets/<ticket_id>'): 'no archived tickets',
+    ('GET', '/api/attachments/<sha256>'): 'no attachments',
+    ('GET', '/api/attachments/<sha256>/thumbnail'): 'no attachments',
+    ('PUT', '/api/tags/<tag_id>'): 'no tags',
+    ('PUT', '/api/agents/<agent_id>'): 'no agents',
+    ('PUT', '/api/cannedResponses/<response_id>'): 'no canned responses',
+    ('PUT', '/api/faqAutoResponse/<faq_id>'): 'no FAQ auto responses',
+    ('PUT', '/api/faqEntries/<entry_id>'): 'no FAQ entries',
+}
+
+
+class Scenario:
+    """One route with the arguments to call it with; request(n) returns (path, JSON body) for the nth call"""
+
+    def __init__(self, name, method, rule, request, writes=False):
+        self.name = name
+        self.method = method
+        self.rule = rule
+        self.request = request
+        self.writes = writes
+
+
+def sample_data():
+    """IDs for the scenarios: recent tickets, the longest conversation and reference rows"""
+    ticket_ids = [
+        ticket_id for (ticket_id,) in db.session.query(Ticket.ticket_id)
+            .order_by(Ticket.last_updated_date.desc())
+            .limit(200)
+    ]
+    if not ticket_ids:
+        raise ValueError('No tickets to benchmark with; run `flask --app app seed-data` first')
+
+    longest = db.session.query(Message.ticket_id) \
+        .filter(Message.ticket_id.in_(ticket_ids)) \
+        .group_by(Message.ticket_id) \
+        .order_by(db.func.count().desc()) \
+        .first()
+    tag = Tag.query.first()
+    agent = Agent.query.first()
+    canned = CannedResponse.query.first()
+    faq = FAQAutoResponse.query.first()
+    faq_entry = FAQEntry.query.first()
+    attachment = db.session.query(Attachment.sha256).first()
+    archived = db.session.query(ArchivedTicket.ticket_id).first()
+    return {
+        'ticket_ids': ticket_ids,
+        'long_ticket_id': longest[0] if longest else ticket_ids[0],
+        'tag': tag.to_dict() if tag else None,
+        'agent': agent.to_dict() if agent else None,
+        'canned': canned.to_dict() if canned else None,
+        'faq': faq.to_dict() if faq else None,
+        'faq_entry': faq_entry.to_dict() if faq_entry else None,
+        'attachment_sha256': attachment[0] if attachment else None,
+        'archived_ticket_id': archived[0] if archived else None,
+    }
+
+
+def build_scenarios(data):
+    ticket_ids = data['ticket_ids']
+
+    def ticket(n):
+        return ticket_ids[n % len(ticket_ids)]
+
+    scenarios = [
+        Scenario('tickets (full list)', 'GET', '/api/tickets', lambda n: ('/api/tickets', None)),
+        Scenario('tickets page', 'GET', '/api/tickets', lambda n: ('/api/tickets?limit=50', None)),
+        Scenario('tickets page filtered', 'GET', '/api/tickets',
+                 lambda n: ('/api/tickets?limit=50&ticketStatus=New&priority=High', None)),
+        Scenario('tickets search filter', 'GET', '/api/tickets', lambda n: ('/api/tickets?limit=50&search=refund', None)),
+        Scenario('ticket search', 'GET', '/api/tickets/search', lambda n: ('/api/tickets/search?q=shipping', None)),
+        Scenario('ticket stats', 'GET', '/api/tickets/stats', lambda n: ('/api/tickets/stats', None)),
+        Scenario('ticket stats filtered', 'GET', '/api/tickets/stats', lambda n: ('/api/tickets/stats?priority=High', None)),
+        Scenario('ticket', 'GET', '/api/tickets/<ticket_id>', lambda n: (f'/api/tickets/{ticket(n)}', None)),
+        Scenario('ticket (longest conversation)', 'GET', '/api/tickets/<ticket_id>',
+                 lambda n: (f"/api/tickets/{data['long_ticket_id']}", None)),
+        Scenario('ticket messages', 'GET', '/api/tickets/<ticket_id>/messages',
+                 lambda n: (f"/api/tickets/{data['long_ticket_id']}/messages", None)),
+        Scenario('suggested responses', 'GET', '/api/tickets/<ticket_id>/suggestedResponses',
+                 lambda n: (f'/api/tickets/{ticket(n)}/suggestedResponses', None)),
+        Scenario('export csv', 'GET', '/api/tickets/export',
+                 lambda n: ('/api/tickets/export?format=csv&ticketStatus=New&priority=High', None)),
+        Scenario('export ndjson', 'GET', '/api/tickets/export',
+                 lambda n: ('/api/tickets/export?format=ndjson&ticketStatus=New&priority=High', None)),
+        Scenario('bootstrap', 'GET', '/api/bootstrap', lambda n: ('/api/bootstrap', None)),
+        Scenario('tags', 'GET', '/api/tags', lambda n: ('/api/tags', None)),
+        Scenario('agents', 'GET', '/api/agents', lambda n: ('/api/agents', None)),
+        Scenario('canned responses', 'GET', '/api/cannedResponses', lambda n: ('/api/cannedResponses', None)),
+        Scenario('FAQ auto response', 'GET', '/api/faqAutoResponse', lambda n: ('/api/faqAutoResponse', None)),
+        Scenario('FAQ entries', 'GET', '/api/faqEntries', lambda n: ('/api/faqEntries', None)),
+        Scenario('sync states', 'GET', '/api/syncStates', lambda n: ('/api/syncStates', None)),
+        Scenario('outbox', 'GET', '/api/outbox', lambda n: ('/api/outbox', None)),
+        Scenario('archive', 'GET', '/api/archive/tickets', lambda n: ('/api/archive/tickets', None)),
+        Scenario('archive search', 'GET', '/api/archive/tickets', lambda n: ('/api/archive/tickets?search=damaged', None)),
+        Scenario('metrics', 'GET', '/metrics', lambda n: ('/metrics', None)),
+        Scenario('slow queries', 'GET', '/metrics/slowQueries', lambda n: ('/metrics/slowQueries', None)),
+        Scenario('update ticket', 'PUT', '/api/tickets/<ticket_id>',
+                 lambda n: (f'/api/tickets/{ticket(n)}', {'priority': ('Low', 'Medium', 'High')[n % 3]}), writes=True),
+        Scenario('bulk update 50 tickets', 'PATCH', '/api/tickets/bulk',
+                 lambda n: ('/api/tickets/bulk', {
+                     'ticketIDs': [ticket(n + i) for i in range(50)], 'priority': ('Low', 'Medium', 'High')[n % 3]
+                 }), writes=True),
+        Scenario('reply', 'PUT', '/api/tickets/<ticket_id>/reply',
+                 lambda n: (f'/api/tickets/{ticket(n)}/reply', f'Benchmark reply {n}'), writes=True),
+        Scenario('rebalance agents', 'POST', '/api/agents/rebalance', lambda n: ('/api/agents/rebalance', None), writes=True),
+    ]
+
+    if data['archived_ticket_id']:
+        scenarios.append(Scenario('archived ticket', 'GET', '/api/archive/tickets/<ticket_id>',
+                                  lambda n: (f"/api/archive/tickets/{data['archived_ticket_id']}", None)))
+    if data['attachment_sha256']:
+        sha256 = data['attachment_sha256']
+        scenarios.append(Scenario('attachment', 'GET', '/api/attachments/<sha256>',
+                                  lambda n: (f'/api/attachments/{sha256}', None)))
+        scenarios.append(Scenario('attachment thumbnail', 'GET', '/api/attachments/<sha256>/thumbnail',
+                                  lambda n: (f'/api/attachments/{sha256}/thumbnail', None)))
+    # Reference data is written back unchanged
+    if data['tag']:
+        tag = data['tag']
+        scenarios.append(Scenario('update tag', 'PUT', '/api/tags/<tag_id>',
+                                  lambda n: (f"/api/tags/{tag['ID']}", {'name': tag['name'], 'color': tag['color']}), writes=True))
+    if data['agent']:
+        agent = data['agent']
+        scenarios.append(Scenario('update agent', 'PUT', '/api/agents/<agent_id>',
+                                  lambda n: (f"/api/agents/{agent['ID']}", {'name': agent['name']}), writes=True))
+    if data['canned']:
+        canned = data['canned']
+        scenarios.append(Scenario('update canned response', 'PUT', '/api/cannedResponses/<response_id>',
+                                  lambda n: (f"/api/cannedResponses/{canned['ID']}", {'response': canned['response']}), writes=True))
+    if data['faq']:
+        faq = data['faq']
+        scenarios.append(Scenario('update FAQ auto response', 'PUT', '/api/faqAutoResponse/<faq_id>',
+                                  lambda n: (f"/api/faqAutoResponse/{faq['ID']}", {'faqAutoResponse': faq['faqAutoResponse']}), writes=True))
+    if data['faq_entry']:
+        entry = data['faq_entry']
+        scenarios.append(Scenario('update FAQ entry', 'PUT', '/api/faqEntries/<entry_id>',
+                                  lambda n: (f"/api/faqEntries/{entry['ID']}", {'response': entry['response']}), writes=True))
+    return scenarios
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class StatementCounter:
+    """Counts SQL statements per thread across every engine"""
+
+    def __init__(self, engines):
+        self.local = threading.local()
+        self.engines = list(engines)
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self.count)
+
+    def count(self, *args):
+        self.local.statements = getattr(self.local, 'statements', 0) + 1
+
+    def take(self):
+        statements = getattr(self.local, 'statements', 0)
+        self.local.statements = 0
+        return statements
+
+    def close(self):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self.count)
+
+
+def run_scenario(app, scenario, requests, concurrency, counter, warmup=5):
+    client = app.test_client()
+    for n in range(warmup):
+        path, body = scenario.request(n)
+        client.open(path, method=scenario.method, json=body)
+
+    calls = count()
+    lock = threading.Lock()
+    latencies, statements, errors = [], [], []
+
+    def worker():
+        client = app.test_client()
+        while True:
+            n = next(calls)
+            if n >= requests:
+                return
+            path, body = scenario.request(n)
+            counter.take()
+            started = time.perf_counter()
+            response = client.open(path, method=scenario.method, json=body)
+            response.get_data()
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statements.append(counter.take())
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'method': scenario.method,
+        'rule': scenario.rule,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'p50': round(percentile(latencies, 0.50), 2),
+        'p95': round(percentile(latencies, 0.95), 2),
+        'p99': round(percentile(latencies, 0.99), 2),
+        'mean': round(sum(latencies) / len(latencies), 2),
+        'throughput': round(len(latencies) / duration, 1),
+        'queriesPerRequest': round(sum(statements) / len(statements), 2),
+        'maxQueries': max(statements),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(app, requests=200, concurrency=8, include_writes=False, only=None, progress=None):
+    """Run the scenarios (optionally only those whose name contains `only`); returns the report dict"""
+    with app.app_context():
+        data = sample_data()
+        ticket_count = db.session.query(db.func.count(Ticket.ticket_id)).scalar()
+        engines = db.engines.values()
+        database = db.engine.dialect.name
+
+    scenarios = build_scenarios(data)
+    covered = {(scenario.method, scenario.rule) for scenario in scenarios}
+    skipped = []
+    for rule in app.url_map.iter_rules():
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (method, rule.rule) not in covered:
+                reason = NOT_BENCHMARKED.get((method, rule.rule)) or NEEDS_DATA.get((method, rule.rule), 'no scenario')
+                skipped.append({'method': method, 'rule': rule.rule, 'reason': reason})
+
+    results = {}
+    counter = StatementCounter(engines)
+    try:
+        for scenario in scenarios:
+            if only and only.lower() not in scenario.name.lower():
+                continue
+            if scenario.writes and not include_writes:
+                skipped.append({'method': scenario.method, 'rule': scenario.rule, 'reason': f'{scenario.name}: writes (pass --writes)'})
+                continue
+            results[scenario.name] = run_scenario(app, scenario, requests, concurrency, counter)
+            if progress:
+                progress(scenario.name, results[scenario.name])
+    finally:
+        counter.close()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'database': database,
+            'tickets': ticket_count,
+            'requests': requests,
+            'concurrency': concurrency,
+        },
+        'routes': results,
+        'skipped': skipped,
+    }
+
+
+def compare_reports(baseline, report, threshold=0.2):
+    """
+    Per-route changes between two reports: {name: {'p95', 'baselineP95', 'change', 'queries', 'baselineQueries'}}
+    and the names whose p95 grew by more than threshold (a fraction) or that run at least one more query per request.
+    """
+    changes, regressions = {}, []
+    for name, result in report['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before:
+            continue
+        change = (result['p95'] - before['p95']) / before['p95'] if before['p95'] else 0.0
+        changes[name] = {
+            'p95': result['p95'],
+            'baselineP95': before['p95'],
+            'change': round(change, 3),
+            'queries': result['queriesPerRequest'],
+            'baselineQueries': before['queriesPerRequest'],
+        }
+        if change > threshold or result['queriesPerRequest'] >= before['queriesPerRequest'] + 1:
+            regressions.append(name)
+    return changes, regressions
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,438 @@
+"""
+Bulk import of historical conversations (`flask --app app import-conversations FILE...`), PostgreSQL only.
+
+Files are read a record at a time and never held in memory:
+  - NDJSON: a line per conversation, shaped like the lines of GET /api/tickets/export?format=ndjson
+    (marketplace, marketplaceConversationID, customerName, messages: [{message, date, ...}], ...)
+  - CSV: a row per message, with the columns of GET /api/tickets/export?format=csv
+So an export can be imported again elsewhere. Messages may carry an externalID; without one an ID
+is derived from their contents, so importing a file twice never duplicates them.
+
+Every IMPORT_BATCH_SIZE records are COPYed into temporary staging tables and merged in one
+transaction: new conversations become tickets (existing tickets, matched on
+marketplace_conversation_id, are left as they are), messages are added unless already there, and
+tags are linked, created by name if needed. The file offset reached is committed with the batch in
+import_checkpoints, so an interrupted import picks up after the last merged batch when run again.
+"""
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from extensions import db
+from models import ImportCheckpoint, Tag
+from services import archive, events, reference_cache
+from services.ticket_export import FORMULA_PREFIXES
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('ndjson', 'csv')
+# Color of tags that only exist because an import referenced them
+IMPORTED_TAG_COLOR = '#9CA3AF'
+# Invalid records logged individually before they're only counted
+MAX_LOGGED_ERRORS = 20
+
+STAGING_DDL = [
+    """
+    CREATE TEMP TABLE IF NOT EXISTS import_tickets (
+        seq bigint, ticket_id text, marketplace text, marketplace_conversation_id text, customer_name text,
+        priority text, ticket_status text, agent_name text, conversation_start_date timestamp, order_history text,
+        related_listing_url text
+    ) ON COMMIT DELETE ROWS
+    """,
+    """
+    CREATE TEMP TABLE IF NOT EXISTS import_messages (
+        marketplace_conversation_id text, external_id text, message text, authored boolean, date timestamp,
+        image_attachments text
+    ) ON COMMIT DELETE ROWS
+    """,
+    """
+    CREATE TEMP TABLE IF NOT EXISTS import_ticket_tags (
+        marketplace_conversation_id text, tag_name text
+    ) ON COMMIT DELETE ROWS
+    """,
+]
+
+# The last record for a conversation wins. New tickets are dated by their messages, so a backfill
+# lands in the list where it belongs rather than on top of it. Assignees are matched to agents by name.
+MERGE_TICKETS = """
+    INSERT INTO tickets (
+        ticket_id, marketplace, marketplace_conversation_id, customer_name, priority, ticket_status, assigned_to,
+        conversation_start_date, last_updated_date, changed_at, order_history, related_listing_url
+    )
+    SELECT s.ticket_id, s.marketplace, s.marketplace_conversation_id, s.customer_name, s.priority, s.ticket_status, a.id,
+           coalesce(s.conversation_start_date, m.first_date, now() AT TIME ZONE 'utc'),
+           coalesce(m.last_date, s.conversation_start_date, now() AT TIME ZONE 'utc'),
+           now() AT TIME ZONE 'utc',
+           s.order_history::json, s.related_listing_url
+    FROM (
+        SELECT DISTINCT ON (marketplace_conversation_id) *
+        FROM import_tickets
+        ORDER BY marketplace_conversation_id, seq DESC
+    ) s
+    LEFT JOIN (
+        SELECT marketplace_conversation_id, min(date) AS first_date, max(date) AS last_date
+        FROM import_messages
+        GROUP BY marketplace_conversation_id
+    ) m USING (marketplace_conversation_id)
+    LEFT JOIN agents a ON a.name = s.agent_name
+    ORDER BY s.marketplace_conversation_id
+    ON CONFLICT (marketplace_conversation_id) DO NOTHING
+    RETURNING ticket_id
+"""
+# Every ticket that received messages is marked changed for the change feed and ETags; only those
+# that received newer messages than their last update move up the list
+MERGE_MESSAGES = """
+    WITH inserted AS (
+        INSERT INTO messages (ticket_id, external_id, message, authored, date, image_attachments)
+        SELECT t.ticket_id, m.external_id, m.message, m.authored, m.date, m.image_attachments::json
+        FROM import_messages m
+        JOIN tickets t ON t.marketplace_conversation_id = m.marketplace_conversation_id
+        ON CONFLICT (ticket_id, external_id) DO NOTHING
+        RETURNING ticket_id, date
+    ), latest AS (
+        SELECT ticket_id, max(date) AS date, count(*) AS messages
+        FROM inserted
+        GROUP BY ticket_id
+    ), changed AS (
+        UPDATE tickets
+        SET last_updated_date = greatest(tickets.last_updated_date, latest.date),
+            changed_at = now() AT TIME ZONE 'utc'
+        FROM latest
+        WHERE tickets.ticket_id = latest.ticket_id
+        RETURNING tickets.ticket_id
+    )
+    SELECT (SELECT coalesce(sum(messages), 0)::bigint FROM latest), (SELECT array_agg(ticket_id) FROM changed)
+"""
+MERGE_TICKET_TAGS = """
+    WITH linked AS (
+        INSERT INTO ticket_tags (ticket_id, tag_id)
+        SELECT DISTINCT t.ticket_id, g.id
+        FROM import_ticket_tags s
+        JOIN tickets t ON t.marketplace_conversation_id = s.marketplace_conversation_id
+        JOIN tags g ON g.name = s.tag_name
+        ON CONFLICT DO NOTHING
+        RETURNING ticket_id
+    )
+    UPDATE tickets SET changed_at = now() AT TIME ZONE 'utc'
+    WHERE ticket_id IN (SELECT ticket_id FROM linked)
+    RETURNING ticket_id
+"""
+
+
+class BulkImportError(Exception):
+    pass
+
+
+class InvalidRecord(Exception):
+    pass
+
+
+# Reading
+
+def read_lines(file, offset):
+    """Decoded lines from offset, each with the offset just past it"""
+    file.seek(offset)
+    for raw in file:
+        offset += len(raw)
+        yield raw.decode('utf-8'), offset
+
+
+def read_ndjson(file, offset):
+    """(record or InvalidRecord, offset after it) from offset on"""
+    for line, end in read_lines(file, offset):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('not an object')
+            yield record, end
+        except ValueError as e:
+            yield InvalidRecord(f'invalid JSON: {e}'), end
+
+
+def read_csv(file, offset):
+    """(row dict, offset after it) from offset on; the header is always read from the top"""
+    file.seek(0)
+    header = next(csv.reader([file.readline().decode('utf-8-sig')]), None)
+    if not header:
+        return
+    position = {'end': max(offset, file.tell())}
+
+    def lines():
+        for line, end in read_lines(file, position['end']):
+            position['end'] = end
+            yield line
+
+    # A row can span several lines (quoted newlines); the reader has consumed exactly its lines when it yields
+    for row in csv.DictReader(lines(), fieldnames=header):
+        yield row, position['end']
+
+
+# Records
+
+def parse_date(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise InvalidRecord(f'{field} is not an ISO 8601 date: {value!r}')
+    # Stored dates are naive UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('true', 't', '1', 'yes')
+
+
+def required(record, field):
+    value = record.get(field)
+    if value in (None, ''):
+        raise InvalidRecord(f'{field} is missing')
+    return str(value)
+
+
+def unescape_cell(value):
+    # Undoes the export's protection against spreadsheet formulas
+    if value and value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def split_list(value):
+    return [item for item in (value or '').split(';') if item]
+
+
+def message_row(conversation_id, message, authored, date, external_id, image_attachments):
+    if date is None:
+        raise InvalidRecord('message date is missing')
+    if not external_id:
+        # Derived from the contents so importing the same file twice doesn't duplicate it
+        key = f'{conversation_id}\x1f{date.isoformat()}\x1f{authored}\x1f{message}'
+        external_id = 'import-' + hashlib.sha1(key.encode()).hexdigest()
+    return {
+        'marketplace_conversation_id': conversation_id,
+        'external_id': external_id,
+        'message': message,
+        'authored': authored,
+        'date': date,
+        'image_attachments': json.dumps(image_attachments),
+    }
+
+
+def ticket_row(record, conversation_id, default_status, order_history, start_date):
+    return {
+        'ticket_id': str(uuid.uuid4()),
+        'marketplace': required(record, 'marketplace'),
+        'marketplace_conversation_id': conversation_id,
+        'customer_name': unescape_cell(record.get('customerName')) or 'Unknown',
+        'priority': record.get('priority') or 'Medium',
+        'ticket_status': record.get('ticketStatus') or default_status,
+        'agent_name': record.get('assignedTo') or None,
+        'conversation_start_date': start_date,
+        'order_history': json.dumps(order_history),
+        'related_listing_url': record.get('relatedListingURL') or None,
+    }
+
+
+def parse_ndjson_record(record, default_status):
+    """(ticket row, message rows, tag names) for an export-shaped conversation"""
+    conversation_id = required(record, 'marketplaceConversationID')
+    messages = []
+    for message in record.get('messages') or []:
+        date = parse_date(message.get('date'), 'message date')
+        authored = parse_bool(message.get('authored'))
+        image_attachments = list(message.get('imageAttachments') or []) + [
+            {'sha256': attachment['ID'], 'contentType': attachment['contentType'], 'size': attachment['size']}
+            for attachment in message.get('attachments') or []
+        ]
+        messages.append(message_row(
+            conversation_id, message.get('message') or '', authored, date, message.get('externalID'), image_attachments
+        ))
+    ticket = ticket_row(
+        record, conversation_id, default_status, record.get('orderHistory') or [],
+        parse_date(record.get('conversationStartDate'), 'conversationStartDate')
+    )
+    tags = [tag['name'] if isinstance(tag, dict) else str(tag) for tag in record.get('tags') or []]
+    return ticket, messages, tags
+
+
+def parse_csv_record(record, default_status):
+    """(ticket row, message rows, tag names) for an export-shaped CSV row: one message of a conversation"""
+    conversation_id = required(record, 'marketplaceConversationID')
+    messages = []
+    if record.get('messageDate'):
+        messages.append(message_row(
+            conversation_id, unescape_cell(record.get('message') or ''), parse_bool(record.get('authored')),
+            parse_date(record.get('messageDate'), 'messageDate'), record.get('externalID'),
+            # Links only; stored attachments (/api/attachments/...) belong to the database that exported them
+            [url for url in (record.get('attachments') or '').split() if not url.startswith('/api/attachments/')]
+        ))
+    ticket = ticket_row(
+        record, conversation_id, default_status, split_list(record.get('orderHistory')),
+        parse_date(record.get('conversationStartDate'), 'conversationStartDate')
+    )
+    return ticket, messages, split_list(record.get('tags'))
+
+
+# Loading
+
+def copy_value(value):
+    # COPY text format
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(cursor, table, columns, rows):
+    if not rows:
+        return
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(row[column]) for column in columns) + '\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def ensure_tags(names):
+    """Create the tags that don't exist yet (in the caller's transaction); returns how many were created"""
+    existing = {tag.name for tag in Tag.query.filter(Tag.name.in_(names))} if names else set()
+    missing = sorted(set(names) - existing)
+    db.session.add_all([Tag(name=name, color=IMPORTED_TAG_COLOR) for name in missing])
+    db.session.flush()
+    return len(missing)
+
+
+def merge_batch(checkpoint, first_seq, parsed, end_offset, record_count):
+    """COPY one batch into the staging tables and merge it, committing the checkpoint with it"""
+    tickets = [ticket for ticket, _, _ in parsed]
+    for seq, ticket in enumerate(tickets, start=first_seq):
+        ticket['seq'] = seq
+    messages = [message for _, rows, _ in parsed for message in rows]
+    tags = [
+        {'marketplace_conversation_id': ticket['marketplace_conversation_id'], 'tag_name': name}
+        for ticket, _, names in parsed for name in names
+    ]
+
+    # A batch can take longer than DB_STATEMENT_TIMEOUT allows a web request
+    db.session.execute(db.text('SET LOCAL statement_timeout = 0'))
+    for ddl in STAGING_DDL:
+        db.session.execute(db.text(ddl))
+    # Conversations that were archived come back as they were, and then take the new messages
+    restored_ids = archive.restore_conversations(sorted({ticket['marketplace_conversation_id'] for ticket in tickets}))
+    created_tags = ensure_tags({tag['tag_name'] for tag in tags})
+
+    cursor = db.session.connection().connection.cursor()
+    copy_rows(cursor, 'import_tickets', (
+        'seq', 'ticket_id', 'marketplace', 'marketplace_conversation_id', 'customer_name', 'priority',
+        'ticket_status', 'agent_name', 'conversation_start_date', 'order_history', 'related_listing_url'
+    ), tickets)
+    copy_rows(cursor, 'import_messages', (
+        'marketplace_conversation_id', 'external_id', 'message', 'authored', 'date', 'image_attachments'
+    ), messages)
+    copy_rows(cursor, 'import_ticket_tags', ('marketplace_conversation_id', 'tag_name'), tags)
+
+    new_ticket_ids = [ticket_id for (ticket_id,) in db.session.execute(db.text(MERGE_TICKETS))]
+    new_messages, messaged_ids = db.session.execute(db.text(MERGE_MESSAGES)).one()
+    tagged_ids = [ticket_id for (ticket_id,) in db.session.execute(db.text(MERGE_TICKET_TAGS))] if tags else []
+
+    checkpoint.byte_offset = end_offset
+    checkpoint.records += record_count
+    checkpoint.updated_at = datetime.utcnow()
+    db.session.commit()
+
+    if created_tags:
+        reference_cache.invalidate(reference_cache.TAGS)
+    events.publish_ticket_ids('ticket.restored', restored_ids)
+    events.publish_ticket_ids('ticket.created', new_ticket_ids)
+    events.publish_ticket_ids('message.created', set(messaged_ids or []) - set(new_ticket_ids))
+    events.publish_ticket_ids('ticket.updated', set(tagged_ids) - set(new_ticket_ids), fields=['tags'])
+    return len(new_ticket_ids), new_messages
+
+
+def open_checkpoint(source, file_size, restart):
+    checkpoint = ImportCheckpoint.query.get(source)
+    if checkpoint is not None and not restart:
+        if checkpoint.completed_at is not None:
+            raise BulkImportError(f'{source} was imported on {checkpoint.completed_at:%Y-%m-%d %H:%M}; pass --restart to import it again')
+        if checkpoint.file_size != file_size:
+            raise BulkImportError(f'{source} changed since its import was interrupted; pass --restart to import it from the start')
+        return checkpoint
+
+    if checkpoint is not None:
+        db.session.delete(checkpoint)
+        db.session.flush()
+    checkpoint = ImportCheckpoint(source=source, file_size=file_size, byte_offset=0, records=0)
+    db.session.add(checkpoint)
+    db.session.commit()
+    return checkpoint
+
+
+def import_file(path, file_format=None, batch_size=10000, default_status='Completed', restart=False, progress=None):
+    """
+    Import one NDJSON or CSV file (format from the extension unless given), resuming from its
+    checkpoint. progress(stats) is called after each batch. Returns the stats: records, skipped,
+    tickets and messages created, resumedFrom (offset) and seconds.
+    """
+    if not events.is_postgres():
+        raise BulkImportError('import-conversations loads through COPY and needs PostgreSQL')
+    source = os.path.abspath(path)
+    file_format = file_format or ('csv' if source.lower().endswith('.csv') else 'ndjson')
+    if file_format not in FORMATS:
+        raise BulkImportError(f'Unknown format {file_format}')
+    parse = parse_csv_record if file_format == 'csv' else parse_ndjson_record
+    read = read_csv if file_format == 'csv' else read_ndjson
+
+    checkpoint = open_checkpoint(source, os.path.getsize(source), restart)
+    stats = {'records': 0, 'skipped': 0, 'tickets': 0, 'messages': 0, 'resumedFrom': checkpoint.byte_offset, 'seconds': 0.0}
+    started = time.perf_counter()
+
+    def flush(parsed, end_offset, record_count):
+        try:
+            tickets, messages = merge_batch(checkpoint, checkpoint.records, parsed, end_offset, record_count)
+        except Exception:
+            db.session.rollback()
+            raise
+        stats['tickets'] += tickets
+        stats['messages'] += messages
+        stats['seconds'] = time.perf_counter() - started
+        if progress:
+            progress(stats)
+
+    with open(source, 'rb') as file:
+        parsed, record_count, end_offset = [], 0, checkpoint.byte_offset
+        for record, end_offset in read(file, checkpoint.byte_offset):
+            record_count += 1
+            stats['records'] += 1
+            try:
+                if isinstance(record, InvalidRecord):
+                    raise record
+                parsed.append(parse(record, default_status))
+            except (InvalidRecord, KeyError, TypeError) as e:
+                stats['skipped'] += 1
+                if stats['skipped'] <= MAX_LOGGED_ERRORS:
+                    logger.warning(f"Skipping record {checkpoint.records + record_count} of {source}: {e}")
+            if record_count >= batch_size:
+                flush(parsed, end_offset, record_count)
+                parsed, record_count = [], 0
+        if record_count:
+            flush(parsed, end_offset, record_count)
+
+    checkpoint.completed_at = datetime.utcnow()
+    db.session.commit()
+    stats['seconds'] = time.perf_counter() - started
+    return stats
@@ -0,0 +1,13 @@
+from services.connectors.base import MarketplaceConnector, ConnectorError
+from services.connectors.marketplaces import ReverbConnector, EbayConnector, AmazonConnector, EtsyConnector
+
+CONNECTORS = {
+    connector.marketplace: connector
+    for connector in (ReverbConnector, EbayConnector, AmazonConnector, EtsyConnector)
+}
+
+
+def build_connectors(config):
+    """Connectors for every marketplace that has credentials and an API URL configured"""
+    connectors = [connector.from_config(config) for connector in CONNECTORS.values()]
+    return [connector for connector in connectors if connector.enabled]
@@ -0,0 +1,238 @@
+"""
+Base class for marketplace connectors.
+A connector polls one marketplace and returns conversations in the normalized format below;
+the fetch engine runs every enabled connector concurrently.
+
+Normalized conversation:
+    {
+        'marketplace': 'eBay',
+        'marketplace_conversation_id': '...',
+        'customer_name': '...',
+        'related_listing_url': '...' or None,
+        'order_history': [...],
+        'conversation_start_date': datetime,
+        'messages': [
+            {'external_id': '...', 'message': '...', 'authored': False, 'date': datetime, 'image_attachments': [...]}
+        ]
+    }
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+class ConnectorError(Exception):
+    
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+    
+    @property
+    def retryable(self):
+        # Other client errors will fail the same way every time
+        return self.status_code is None or self.status_code >= 500 or self.status_code in (408, 429)
+
+
+class MarketplaceConnector:
+    marketplace = None
+    config_prefix = None
+    default_api_url = ''
+    conversations_path = '/conversations'
+    messages_path = '/conversations/{conversation_id}/messages'
+    # Bulk send endpoint for marketplaces whose API has one; None sends one request per reply
+    batch_messages_path = None
+    
+    def __init__(self, api_key, api_url=None, account='default', request_timeout=10, retries=2, pool_size=4):
+        self.api_key = api_key
+        self.account = account
+        self.api_url = (api_url or self.default_api_url).rstrip('/')
+        self.request_timeout = request_timeout
+        self.retries = retries
+        self.pool_size = pool_size
+        self._session = None
+    
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            api_key=config.get(f'{cls.config_prefix}_API_KEY', ''),
+            api_url=config.get(f'{cls.config_prefix}_API_URL') or None,
+            account=config.get(f'{cls.config_prefix}_ACCOUNT') or 'default',
+            request_timeout=config.get('FETCH_REQUEST_TIMEOUT', 10),
+            retries=config.get('FETCH_RETRIES', 2),
+            pool_size=config.get('FETCH_POOL_SIZE', 4),
+        )
+    
+    @property
+    def enabled(self):
+        return bool(self.api_key and self.api_url)
+    
+    @property
+    def session(self):
+        # One pooled session per connector, reused across polls so connections stay warm
+        if self._session is None:
+            retry = Retry(
+                total=self.retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET']),
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(self.auth_headers())
+            self._session = session
+        return self._session
+    
+    def auth_headers(self):
+        return {'Authorization': f'Bearer {self.api_key}'}
+    
+    def get(self, path, params=None, headers=None):
+        response = self.session.get(f'{self.api_url}{path}', params=params, headers=headers, timeout=self.request_timeout)
+        if response.status_code >= 400:
+            raise ConnectorError(f'{self.marketplace} returned {response.status_code} for {path}', response.status_code)
+        return response
+    
+    def post(self, path, payload, headers=None):
+        # Never retried here (see session): the outbox dispatcher retries sends with backoff
+        try:
+            response = self.session.post(f'{self.api_url}{path}', json=payload, headers=headers, timeout=self.request_timeout)
+        except requests.RequestException as e:
+            raise ConnectorError(f'{self.marketplace} request to {path} failed: {e}')
+        if response.status_code >= 400:
+            raise ConnectorError(f'{self.marketplace} returned {response.status_code} for {path}', response.status_code)
+        return response
+    
+    def fetch_conversations(self, cursor=None):
+        """
+        Fetch conversations changed since the sync cursor and return them normalized, along with
+        the cursor to store once they are ingested.
+        Cursor: {'since': datetime or None, 'page_token': str or None, 'etag': str or None}
+        """
+        cursor = cursor or {}
+        started = datetime.utcnow()
+        params = {}
+        headers = {}
+        if cursor.get('since'):
+            # Re-request a small overlap; ingestion drops the messages we already have
+            params['updated_since'] = (cursor['since'] - SYNC_OVERLAP).isoformat() + 'Z'
+        if cursor.get('page_token'):
+            # Delta token handed out by the marketplace at the end of the previous sync
+            params['sync_token'] = cursor['page_token']
+        if cursor.get('etag'):
+            headers['If-None-Match'] = cursor['etag']
+        
+        conversations = []
+        page = 1
+        etag = cursor.get('etag')
+        sync_token = None
+        while page:
+            response = self.get(self.conversations_path, params={**params, 'page': page}, headers=headers)
+            if response.status_code == 304:
+                return [], cursor
+            if page == 1:
+                etag = response.headers.get('ETag')
+            headers = {}
+            payload = response.json()
+            conversations.extend(self.parse_conversation(raw) for raw in payload.get('conversations', []))
+            sync_token = payload.get('sync_token') or sync_token
+            page = payload.get('next_page')
+        
+        latest = max((m['date'] for c in conversations for m in c['messages']), default=None)
+        # A skewed or future message date must not move the cursor past updates made after this fetch
+        if latest is not None:
+            latest = min(latest, started)
+        since = cursor.get('since')
+        return conversations, {
+            'since': max(since, latest) if since and latest else (latest or since),
+            'page_token': sync_token or cursor.get('page_token'),
+            'etag': etag,
+        }
+    
+    def send_message(self, conversation_id, body, idempotency_key):
+        """Send one reply and return the marketplace's ID for it"""
+        response = self.post(
+            self.messages_path.format(conversation_id=conversation_id),
+            {'body': body},
+            headers={'Idempotency-Key': idempotency_key}
+        )
+        return str(response.json().get('id') or '')
+    
+    def send_messages(self, replies):
+        """
+        Send replies, in one request when the marketplace has a bulk endpoint.
+        replies: [{'key': idempotency key, 'conversation_id': ..., 'body': ...}]
+        Returns {key: marketplace message ID or ConnectorError}, so one bad reply doesn't fail the others.
+        """
+        if self.batch_messages_path and len(replies) > 1:
+            return self.send_batch(replies)
+        
+        results = {}
+        for reply in replies:
+            try:
+                results[reply['key']] = self.send_message(reply['conversation_id'], reply['body'], reply['key'])
+            except ConnectorError as e:
+                results[reply['key']] = e
+        return results
+    
+    def send_batch(self, replies):
+        try:
+            response = self.post(self.batch_messages_path, {'messages': [
+                {'conversation_id': reply['conversation_id'], 'body': reply['body'], 'idempotency_key': reply['key']}
+                for reply in replies
+            ]})
+        except ConnectorError as e:
+            return {reply['key']: e for reply in replies}
+        
+        results = {reply['key']: ConnectorError(f'{self.marketplace} returned no result') for reply in replies}
+        for reply, result in zip(replies, response.json().get('results', [])):
+            if result.get('error'):
+                results[reply['key']] = ConnectorError(result['error'], result.get('status'))
+            else:
+                results[reply['key']] = str(result.get('id') or '')
+        return results
+    
+    # Payload mapping. The defaults match the local mock marketplace server
+    # (services/connectors/mock_server.py); override per marketplace as needed.
+    
+    def parse_conversation(self, raw):
+        messages = [self.parse_message(message) for message in raw.get('messages', [])]
+        return {
+            'marketplace': self.marketplace,
+            'marketplace_conversation_id': str(raw['id']),
+            'customer_name': raw.get('customer_name') or 'Unknown',
+            'related_listing_url': raw.get('listing_url'),
+            'order_history': raw.get('orders') or [],
+            'conversation_start_date': min((m['date'] for m in messages), default=datetime.utcnow()),
+            'messages': messages,
+        }
+    
+    def parse_message(self, raw):
+        return {
+            'external_id': str(raw['id']),
+            'message': raw.get('body') or '',
+            'authored': bool(raw.get('from_seller')),
+            'date': parse_timestamp(raw.get('sent_at')),
+            'image_attachments': raw.get('attachments') or [],
+        }
+    
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+def parse_timestamp(value):
+    if not value:
+        return datetime.utcnow()
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    # Stored dates are naive UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
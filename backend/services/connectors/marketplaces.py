@@ -0,0 +1,49 @@
+"""
+One connector per marketplace. Endpoints and auth follow each marketplace's API;
+adjust parse_conversation/parse_message if your account's payloads differ.
+"""
+from services.connectors.base import MarketplaceConnector
+
+
+class ReverbConnector(MarketplaceConnector):
+    marketplace = 'Reverb'
+    config_prefix = 'REVERB'
+    default_api_url = 'https://api.reverb.com/api'
+    conversations_path = '/my/conversations'
+    
+    def auth_headers(self):
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Accept-Version': '3.0',
+            'Accept': 'application/hal+json',
+        }
+
+
+class EbayConnector(MarketplaceConnector):
+    marketplace = 'eBay'
+    config_prefix = 'EBAY'
+    conversations_path = '/conversations'
+    batch_messages_path = '/messages/batch'
+    
+    def auth_headers(self):
+        return {'Authorization': f'IAF {self.api_key}'}
+
+
+class AmazonConnector(MarketplaceConnector):
+    marketplace = 'Amazon'
+    config_prefix = 'AMAZON'
+    conversations_path = '/conversations'
+    batch_messages_path = '/messages/batch'
+    
+    def auth_headers(self):
+        return {'x-amz-access-token': self.api_key}
+
+
+class EtsyConnector(MarketplaceConnector):
+    marketplace = 'Etsy'
+    config_prefix = 'ETSY'
+    default_api_url = 'https://openapi.etsy.com/v3'
+    conversations_path = '/conversations'
+    
+    def auth_headers(self):
+        return {'x-api-key': self.api_key}
@@ -0,0 +1,226 @@
+"""
+Local mock marketplace server for testing the fetch engine offline.
+
+Serves /<marketplace>/conversations?page=N for reverb, ebay, amazon and etsy with
+deterministic generated conversations. Supports `updated_since` deltas and ETag/If-None-Match. Per-marketplace latency and failure rates
+make it possible to check that one slow or broken marketplace doesn't hold up the others.
+
+Also accepts replies, for testing the outbox dispatcher: POST /<marketplace>/conversations/<id>/messages
+and POST /<marketplace>/messages/batch. Repeated Idempotency-Keys return the original message ID.
+
+    python -m services.connectors.mock_server --port 5055 --latency amazon=5 --fail-rate etsy=0.5
+
+Then point the connectors at it, e.g. EBAY_API_URL=http://localhost:5055/ebay
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+MARKETPLACES = ('reverb', 'ebay', 'amazon', 'etsy')
+
+
+# Fixed so that repeated polls see the same conversations
+EPOCH = datetime.utcnow().replace(microsecond=0)
+
+
+def generate_page(marketplace, page, page_size, pages, since=None):
+    now = EPOCH
+    conversations = []
+    for index in range(page_size):
+        conversation_id = f'{marketplace}-{page}-{index}'
+        rng = random.Random(conversation_id)
+        start = now - timedelta(hours=rng.randint(1, 24 * 30))
+        messages = []
+        for message_index in range(rng.randint(1, 8)):
+            messages.append({
+                'id': f'{conversation_id}-m{message_index}',
+                'body': rng.choice([
+                    'Hi, where is my order?',
+                    'Can I get a refund for this kit?',
+                    'Does this work with a 1970s receiver?',
+                    'Thanks, it arrived today!',
+                    'The solder in the kit was missing.',
+                ]),
+                'sent_at': (start + timedelta(minutes=15 * message_index)).isoformat() + 'Z',
+                'from_seller': message_index % 2 == 1,
+                'attachments': [],
+            })
+        if since:
+            messages = [message for message in messages if message['sent_at'] > since]
+            if not messages:
+                continue
+        conversations.append({
+            'id': conversation_id,
+            'customer_name': f'{marketplace.title()} Customer {page}-{index}',
+            'listing_url': f'https://example.com/{marketplace}/listing/{rng.randint(1000, 9999)}',
+            'orders': [f'ORDER-{rng.randint(100000, 999999)}'],
+            'messages': messages,
+        })
+    return {'conversations': conversations, 'next_page': page + 1 if page < pages else None}
+
+
+class MockMarketplaceHandler(BaseHTTPRequestHandler):
+    server_version = 'MockMarketplace/1.0'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if len(parts) < 2 or parts[0] not in MARKETPLACES:
+            return self.send_json(404, {'error': 'not found'})
+        marketplace = parts[0]
+        settings = self.server.settings
+        
+        time.sleep(settings['latency'].get(marketplace, 0))
+        if random.random() < settings['fail_rate'].get(marketplace, 0):
+            return self.send_json(503, {'error': 'unavailable'})
+        
+        query = parse_qs(url.query)
+        page = int(query.get('page', ['1'])[0])
+        since = query.get('updated_since', [None])[0]
+        body = generate_page(marketplace, page, settings['page_size'], settings['pages'], since)
+        
+        etag = '"%s"' % hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_json(200, body, {'ETag': etag})
+    
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if len(parts) < 2 or parts[0] not in MARKETPLACES:
+            return self.send_json(404, {'error': 'not found'})
+        marketplace = parts[0]
+        settings = self.server.settings
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        with self.server.lock:
+            self.server.requests[marketplace] = self.server.requests.get(marketplace, 0) + 1
+        
+        time.sleep(settings['latency'].get(marketplace, 0))
+        if random.random() < settings['fail_rate'].get(marketplace, 0):
+            return self.send_json(503, {'error': 'unavailable'})
+        
+        if parts[1:] == ['messages', 'batch']:
+            results = [
+                self.record_reply(marketplace, message.get('conversation_id'), message.get('body'), message.get('idempotency_key'))
+                for message in payload.get('messages', [])
+            ]
+            return self.send_json(200, {'results': results})
+        
+        if len(parts) == 4 and parts[1] == 'conversations' and parts[3] == 'messages':
+            result = self.record_reply(marketplace, parts[2], payload.get('body'), self.headers.get('Idempotency-Key'))
+            if result.get('error'):
+                return self.send_json(result['status'], result)
+            return self.send_json(201, result)
+        
+        return self.send_json(404, {'error': 'not found'})
+    
+    def record_reply(self, marketplace, conversation_id, body, idempotency_key):
+        if not conversation_id or not body:
+            return {'error': 'conversation_id and body are required', 'status': 400}
+        with self.server.lock:
+            if idempotency_key and idempotency_key in self.server.sent:
+                return {'id': self.server.sent[idempotency_key]['id']}
+            message_id = f'{marketplace}-sent-{len(self.server.sent) + 1}'
+            self.server.sent[idempotency_key or message_id] = {
+                'id': message_id, 'conversation_id': conversation_id, 'body': body
+            }
+        return {'id': message_id}
+
+
+def start_mock_server(port=5055, latency=None, fail_rate=None, page_size=50, pages=2):
+    """Start the server on a background thread and return it (call .shutdown() to stop)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockMarketplaceHandler)
+    server.settings = {
+        'latency': latency or {},
+        'fail_rate': fail_rate or {},
+        'page_size': page_size,
+        'pages': pages,
+    }
+    # Replies received, by idempotency key, and POSTs handled per marketplace
+    server.sent = {}
+    server.requests = {}
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check_reply_batching(connector_classes, replies=5):
+    """
+    Send a batch of replies twice through each connector with a bulk endpoint, against a server on a
+    free port. Returns {marketplace: problems}; a connector passes when its batch went out in one
+    request, every reply got an ID and sending the batch again returned the same IDs.
+    """
+    server = start_mock_server(port=0)
+    port = server.server_address[1]
+    results = {}
+    try:
+        for connector_class in connector_classes:
+            if not connector_class.batch_messages_path:
+                continue
+            marketplace = connector_class.marketplace.lower()
+            connector = connector_class(api_key='mock', api_url=f'http://127.0.0.1:{port}/{marketplace}', retries=0)
+            batch = [
+                {'key': f'check-{marketplace}-{index}', 'conversation_id': f'{marketplace}-conv-{index}', 'body': f'Reply {index}'}
+                for index in range(replies)
+            ]
+            first = connector.send_messages(batch)
+            again = connector.send_messages(batch)
+
+            problems = []
+            requests = server.requests.get(marketplace, 0)
+            if requests != 2:
+                problems.append(f'{requests} requests for 2 batches')
+            missing = [key for key, result in first.items() if isinstance(result, Exception) or not result]
+            if missing:
+                problems.append(f'{len(missing)} of {replies} replies got no ID: {first[missing[0]]}')
+            elif again != first:
+                problems.append('sending the batch again returned new IDs')
+            results[connector_class.marketplace] = problems
+    finally:
+        server.shutdown()
+    return results
+
+
+def parse_overrides(values):
+    return {marketplace.lower(): float(value) for marketplace, value in (item.split('=') for item in values or [])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local mock marketplace API')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--latency', action='append', help='marketplace=seconds')
+    parser.add_argument('--fail-rate', action='append', help='marketplace=probability')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--pages', type=int, default=2)
+    args = parser.parse_args()
+    
+    server = start_mock_server(
+        args.port, parse_overrides(args.latency), parse_overrides(args.fail_rate), args.page_size, args.pages
+    )
+    print(f'Mock marketplace server running on http://127.0.0.1:{args.port}/<marketplace>')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,131 @@
+"""
+Cheap validators for conditional GETs.
+
+Each read endpoint declares a validator that derives an ETag from per-table versions and the
+request's query parameters. A request whose If-None-Match matches gets a 304 before the view
+loads or serializes any rows.
+
+On PostgreSQL a table's version is its write counter in table_versions, which triggers bump on
+every statement that inserts, updates or deletes rows, so a validator reads a few rows by primary
+key. Other databases fall back to the row count plus the latest updated_at / changed_at,
+which together change on every insert, update and delete but need a scan of the table.
+"""
+import hashlib
+from functools import wraps
+from flask import request, make_response
+from extensions import db
+from models import (
+    Tag, Agent, CannedResponse, FAQAutoResponse, FAQEntry, Ticket, TicketTombstone, OutboxMessage, TableVersion,
+    VERSIONED_TABLES
+)
+
+
+def table_versions(*columns):
+    """A version for the table of each timestamp column, in one round trip"""
+    if db.engine.dialect.name == 'postgresql':
+        # ticket_tombstones has no counter: deleting a ticket bumps the one of tickets already
+        names = [column.table.name for column in columns if column.table.name in VERSIONED_TABLES]
+        versions = dict(db.session.execute(
+            db.select(TableVersion.table_name, db.func.sum(TableVersion.version))
+                .where(TableVersion.table_name.in_(names))
+                .group_by(TableVersion.table_name)
+        ).all())
+        return [versions.get(name) for name in names]
+    
+    # (count, max(column)) per table
+    parts = []
+    for column in columns:
+        table = column.table
+        parts.append(db.select(db.func.count()).select_from(table).scalar_subquery())
+        parts.append(db.select(db.func.max(column)).scalar_subquery())
+    row = db.session.execute(db.select(*parts)).one()
+    return [(row[index], row[index + 1]) for index in range(0, len(row), 2)]
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def request_args():
+    return sorted(request.args.items(multi=True))
+
+
+# Validators
+
+def tags_etag():
+    return make_etag('tags', table_versions(Tag.updated_at))
+
+
+def agents_etag():
+    return make_etag('agents', table_versions(Agent.updated_at))
+
+
+def canned_responses_etag():
+    return make_etag('cannedResponses', table_versions(CannedResponse.updated_at))
+
+
+def faq_etag():
+    return make_etag('faq', table_versions(FAQAutoResponse.updated_at))
+
+
+def faq_entries_etag():
+    return make_etag('faqEntries', table_versions(FAQEntry.updated_at))
+
+
+def tickets_etag():
+    # Ticket payloads embed agent names and tag names/colors, so their versions count too
+    return make_etag('tickets', request.path, request_args(), table_versions(
+        Ticket.changed_at, TicketTombstone.deleted_at, Agent.updated_at, Tag.updated_at
+    ))
+
+
+def conversation_version(ticket_id):
+    """
+    The ticket's changed_at (bumped by every new message) and the latest change of its replies'
+    outbox rows, whose retries don't touch the ticket
+    """
+    return db.session.execute(db.select(
+        db.select(Ticket.changed_at).where(Ticket.ticket_id == ticket_id).scalar_subquery(),
+        db.select(db.func.max(OutboxMessage.updated_at)).where(OutboxMessage.ticket_id == ticket_id).scalar_subquery()
+    )).one()
+
+
+def ticket_etag(ticket_id):
+    return make_etag('ticket', ticket_id, tuple(conversation_version(ticket_id)), table_versions(Agent.updated_at, Tag.updated_at))
+
+
+def messages_etag(ticket_id):
+    return make_etag('messages', ticket_id, request_args(), tuple(conversation_version(ticket_id)))
+
+
+def suggested_responses_etag(ticket_id):
+    # Suggestions depend only on the conversation and the canned responses
+    return make_etag('suggestedResponses', ticket_id, request_args(), tuple(conversation_version(ticket_id)),
+                     table_versions(CannedResponse.updated_at))
+
+
+def conditional(validator):
+    """Answer 304 when If-None-Match matches the validator's ETag, otherwise tag the view's response"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                etag = validator(**kwargs)
+            except Exception:
+                # Never let a validator failure break the endpoint itself
+                db.session.rollback()
+                return view(*args, **kwargs)
+            
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag)
+            # Cache, but always revalidate
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,148 @@
+"""
+Dashboard change events, streamed to browsers over server-sent events (see routes/event_routes.py).
+
+Writers call publish() after their commit. On PostgreSQL events go through NOTIFY so every web
+worker (and the standalone scheduler process) reaches every connected dashboard; each process
+runs one LISTEN thread that fans notifications out to its local subscribers. Other databases
+only deliver within the current process.
+
+Events are notifications, not data: payloads carry ticket IDs and the client pulls summaries
+from GET /api/tickets?updatedSince=<token>.
+"""
+import json
+import logging
+import queue
+import select
+import threading
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'dashboard_events'
+SUBSCRIBER_QUEUE_SIZE = 1000
+# NOTIFY payloads are limited to 8000 bytes, so ID lists are split
+MAX_IDS_PER_EVENT = 100
+
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+_listener = None
+_listener_lock = threading.Lock()
+# Extra channels other modules listen on through this process's connection: channel -> (handler, on_connect)
+_channels = {}
+
+
+def subscribe():
+    """Returns a queue receiving (event, data) tuples; call unsubscribe() when done"""
+    ensure_listener()
+    subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _subscribers_lock:
+        _subscribers.add(subscriber)
+    return subscriber
+
+
+def unsubscribe(subscriber):
+    with _subscribers_lock:
+        _subscribers.discard(subscriber)
+
+
+def dispatch(event, data):
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for subscriber in subscribers:
+        try:
+            subscriber.put_nowait((event, data))
+        except queue.Full:
+            # A stalled client misses events; it catches up through the delta endpoint
+            pass
+
+
+def is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def notify(channel, payload):
+    """Send a raw NOTIFY on the given channel (PostgreSQL only)"""
+    with db.engine.connect() as connection:
+        connection.execute(db.text('SELECT pg_notify(:channel, :payload)'), {'channel': channel, 'payload': payload})
+        connection.commit()
+
+
+def publish(event, data):
+    """Publish an event to every connected dashboard; call only after the change is committed"""
+    try:
+        if is_postgres():
+            notify(CHANNEL, json.dumps({'event': event, 'data': data}))
+        else:
+            dispatch(event, data)
+    except Exception as e:
+        # Events are best-effort; clients can always resync with updatedSince
+        logger.warning(f"Failed to publish {event}: {e}")
+
+
+def publish_ticket_ids(event, ticket_ids, **fields):
+    ticket_ids = list(ticket_ids)
+    for start in range(0, len(ticket_ids), MAX_IDS_PER_EVENT):
+        publish(event, {'ticketIDs': ticket_ids[start:start + MAX_IDS_PER_EVENT], **fields})
+
+
+def handle_notification(channel, payload):
+    if channel != CHANNEL:
+        handler, _ = _channels[channel]
+        handler(payload)
+        return
+    message = json.loads(payload)
+    dispatch(message['event'], message['data'])
+
+
+def register_channel(channel, handler, on_connect=None):
+    """
+    Also LISTEN on channel, calling handler(payload) for each notification. on_connect() runs
+    every time the listener (re)connects, since notifications sent while disconnected are lost.
+    Register at import time, before the listener starts.
+    """
+    _channels[channel] = (handler, on_connect)
+
+
+def ensure_listener():
+    # One LISTEN connection per process, started lazily
+    global _listener
+    if not is_postgres():
+        return
+    with _listener_lock:
+        if _listener is not None and _listener.is_alive():
+            return
+        engine = db.engine
+        _listener = threading.Thread(target=listen, args=(engine,), name='event-listener', daemon=True)
+        _listener.start()
+
+
+def listen(engine):
+    while True:
+        try:
+            connection = engine.raw_connection()
+            dbapi_connection = connection.driver_connection
+            # Dedicated for the life of the thread, so keep it out of the pool
+            connection.detach()
+            try:
+                dbapi_connection.autocommit = True
+                cursor = dbapi_connection.cursor()
+                for channel in [CHANNEL, *_channels]:
+                    cursor.execute(f'LISTEN {channel}')
+                for _, on_connect in _channels.values():
+                    if on_connect:
+                        on_connect()
+                while True:
+                    if select.select([dbapi_connection], [], [], 5) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        notification = dbapi_connection.notifies.pop(0)
+                        try:
+                            handle_notification(notification.channel, notification.payload)
+                        except Exception as e:
+                            logger.warning(f"Bad notification on {notification.channel}: {e}")
+            finally:
+                dbapi_connection.close()
+        except Exception as e:
+            logger.error(f"Event listener lost its connection, reconnecting: {e}")
+            threading.Event().wait(5)
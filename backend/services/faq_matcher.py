@@ -0,0 +1,360 @@
+"""
+Automatic FAQ replies on ingest.
+
+Every enabled FAQEntry's trigger phrases are compiled into a single regular expression: the
+phrases go into a character trie and the trie is written out as nested alternations, so the
+expression shares common prefixes ("where is my order", "where is my refund") and a message is
+scanned once, whatever the number of phrases. Phrases match whole words, case-insensitively and
+with any whitespace between their words; of overlapping phrases only the longest counts.
+
+An entry matches a message when the message contains at least min_phrase_matches of its distinct
+phrases; the match is confident when that entry has strictly more phrases in the message than any
+other matching entry. For each ticket in an ingest batch, the latest new customer message with a
+confident match gets the entry's response queued through the outbox, in the batch's transaction,
+and the ticket is tagged FAQ_AUTO_REPLY_TAG. Tickets already carrying the tag are never answered
+again, so an agent removes it to let the next question be answered.
+
+A message is only answered while it's still the latest of its conversation (the seller hasn't
+replied, nor the customer written again) and no older than FAQ_AUTO_REPLY_MAX_AGE; tickets the
+batch restored from the archive aren't answered, as their new messages may be old history.
+
+The entries come from services/reference_cache.py, so the matcher is recompiled in every process
+once they change.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from extensions import db
+from models import Message, OutboxMessage, Tag, ticket_tags
+from services import outbox, reference_cache
+from services.seed import CUSTOMER_LINES, PRODUCTS
+
+logger = logging.getLogger(__name__)
+
+MAX_PHRASE_LENGTH = 200
+AUTO_REPLY_TAG_COLOR = '#95E1D3'
+
+_END = ''  # Trie key marking the end of a phrase
+
+messages_table = Message.__table__
+outbox_table = OutboxMessage.__table__
+
+
+def normalize_phrase(phrase):
+    return ' '.join(phrase.lower().split())
+
+
+def trie_pattern(node):
+    """Regex for the phrases below a trie node; a space stands for any run of whitespace"""
+    branches = []
+    single_chars = []
+    for char in sorted((key for key in node if key != _END), reverse=True):
+        child = node[char]
+        escaped = r'\s+' if char == ' ' else re.escape(char)
+        if list(child) == [_END] and char != ' ':
+            single_chars.append(escaped)
+        else:
+            branches.append(escaped + trie_pattern(child))
+    if single_chars:
+        branches.append(single_chars[0] if len(single_chars) == 1 else '[' + ''.join(single_chars) + ']')
+
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if _END in node:
+        # Greedy, so the longest phrase wins and a shorter one is the fallback
+        pattern = '(?:' + pattern + ')?'
+    return pattern
+
+
+def compile_phrases(phrases):
+    """One regex matching any of the (normalized, so lowercase) phrases as whole words in lowercased text"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[_END] = True
+    # Lowercasing the text first is about twice as fast as re.IGNORECASE
+    return re.compile(r'(?<!\w)' + trie_pattern(trie) + r'(?!\w)')
+
+
+class FAQMatcher:
+    """Matches messages against FAQ entries (the dicts GET /faqEntries returns)"""
+
+    def __init__(self, entries):
+        self.entries = {}
+        self.phrase_entries = {}  # normalized phrase -> IDs of the entries using it
+        for entry in entries:
+            if not entry['enabled']:
+                continue
+            phrases = {normalize_phrase(phrase) for phrase in entry['triggerPhrases']} - {''}
+            if not phrases:
+                continue
+            self.entries[entry['ID']] = entry
+            for phrase in phrases:
+                self.phrase_entries.setdefault(phrase, []).append(entry['ID'])
+        self.pattern = compile_phrases(self.phrase_entries) if self.phrase_entries else None
+
+    def __bool__(self):
+        return self.pattern is not None
+
+    def matched_phrases(self, text):
+        if self.pattern is None or not text:
+            return set()
+        return {normalize_phrase(match) for match in self.pattern.findall(text.lower())}
+
+    def match(self, text):
+        """The entry confidently matching text, or None"""
+        counts = {}
+        for phrase in self.matched_phrases(text):
+            for entry_id in self.phrase_entries.get(phrase, ()):
+                counts[entry_id] = counts.get(entry_id, 0) + 1
+        candidates = sorted(
+            ((count, entry_id) for entry_id, count in counts.items()
+             if count >= self.entries[entry_id]['minPhraseMatches']),
+            reverse=True
+        )
+        if not candidates or (len(candidates) > 1 and candidates[1][0] == candidates[0][0]):
+            # Nothing matched enough, or two entries matched equally well
+            return None
+        return self.entries[candidates[0][1]]
+
+
+_compiled = (None, None)  # (entries the matcher was built from, matcher)
+_compiled_lock = threading.Lock()
+
+
+def current_matcher():
+    global _compiled
+    entries = reference_cache.faq_entries()
+    with _compiled_lock:
+        # A reload after REFERENCE_CACHE_TTL usually brings the same entries back
+        if _compiled[0] != entries:
+            started = time.perf_counter()
+            _compiled = (entries, FAQMatcher(entries))
+            logger.info(
+                f'Compiled {len(_compiled[1].phrase_entries)} FAQ trigger phrases '
+                f'in {(time.perf_counter() - started) * 1000:.1f}ms'
+            )
+        return _compiled[1]
+
+
+def auto_reply_tag():
+    """(tag ID, whether it was just created) of the tag marking answered tickets, created in the caller's transaction"""
+    name = current_app.config.get('FAQ_AUTO_REPLY_TAG', 'AutoResponded')
+    tag = Tag.query.filter_by(name=name).first()
+    if tag:
+        return tag.id, False
+    tag = Tag(name=name, color=AUTO_REPLY_TAG_COLOR)
+    db.session.add(tag)
+    db.session.flush()
+    return tag.id, True
+
+
+def later_message_tickets(answers):
+    """IDs of the tickets with a message stored after the one matched ({ticket_id: (message, entry)})"""
+    return {
+        ticket_id for (ticket_id,) in db.session.execute(
+            db.select(messages_table.c.ticket_id).where(db.or_(*(
+                db.and_(
+                    messages_table.c.ticket_id == ticket_id,
+                    db.tuple_(messages_table.c.date, messages_table.c.id) > (message['date'], message['id'])
+                )
+                for ticket_id, (message, _) in answers.items()
+            ))).distinct()
+        )
+    }
+
+
+def queue_auto_replies(new_messages, tickets, restored_ids=()):
+    """
+    Queue FAQ replies to an ingest batch's new messages, within the batch's transaction.
+    new_messages: the batch's inserted messages ({'id', 'ticket_id', 'message', 'authored', 'date'})
+    tickets: {ticket_id: {'marketplace', 'marketplace_conversation_id'}} for the batch's tickets
+    restored_ids: tickets the batch restored from the archive, which aren't answered
+    Returns (IDs of the tickets answered, whether the tag was created); after the commit, call
+    outbox.notify_pending() if any were answered and invalidate the cached tags if the tag is new
+    """
+    if not current_app.config.get('FAQ_AUTO_REPLY', True):
+        return [], False
+    matcher = current_matcher()
+    if not matcher:
+        return [], False
+
+    # The latest confidently matched message of each ticket
+    max_age = current_app.config.get('FAQ_AUTO_REPLY_MAX_AGE', 86400)
+    oldest = datetime.utcnow() - timedelta(seconds=max_age) if max_age else None
+    skipped = set(restored_ids)
+    answers = {}
+    for message in sorted(new_messages, key=lambda message: (message['date'], message['id'])):
+        if message['authored'] or message['ticket_id'] in skipped or (oldest and message['date'] < oldest):
+            continue
+        entry = matcher.match(message['message'])
+        if entry:
+            answers[message['ticket_id']] = (message, entry)
+    if not answers:
+        return [], False
+
+    # Answered only while nothing came after the question, from either side
+    later = later_message_tickets(answers)
+    answers = {ticket_id: entry for ticket_id, (message, entry) in answers.items() if ticket_id not in later}
+    if not answers:
+        return [], False
+
+    tag_id, created_tag = auto_reply_tag()
+    already_answered = {
+        ticket_id for (ticket_id,) in db.session.execute(
+            db.select(ticket_tags.c.ticket_id).where(
+                ticket_tags.c.tag_id == tag_id,
+                ticket_tags.c.ticket_id.in_(list(answers))
+            )
+        )
+    }
+    answers = {ticket_id: entry for ticket_id, entry in answers.items() if ticket_id not in already_answered}
+    if not answers:
+        return [], created_tag
+
+    # Bulk inserts, as for the fetched messages; imported lazily, as services/ingest.py imports this module
+    from services.ingest import dialect_insert
+    now = datetime.utcnow()
+    message_ids = {
+        ticket_id: message_id for message_id, ticket_id in db.session.execute(
+            messages_table.insert().returning(messages_table.c.id, messages_table.c.ticket_id),
+            [
+                {
+                    'ticket_id': ticket_id,
+                    'message': entry['response'],
+                    'authored': True,
+                    'date': now,
+                    'image_attachments': [],
+                    'delivery_status': outbox.PENDING,
+                }
+                for ticket_id, entry in answers.items()
+            ]
+        )
+    }
+    db.session.execute(outbox_table.insert(), [
+        {
+            'message_id': message_ids[ticket_id],
+            'ticket_id': ticket_id,
+            'marketplace': tickets[ticket_id]['marketplace'],
+            'marketplace_conversation_id': tickets[ticket_id]['marketplace_conversation_id'],
+            'body': entry['response'],
+            'status': outbox.PENDING,
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now,
+            'updated_at': now,
+        }
+        for ticket_id, entry in answers.items()
+    ])
+    db.session.execute(
+        dialect_insert(ticket_tags).on_conflict_do_nothing(),
+        [{'ticket_id': ticket_id, 'tag_id': tag_id} for ticket_id in answers]
+    )
+
+    logger.info(f'Queued {len(answers)} FAQ auto-replies')
+    return list(answers), created_tag
+
+
+# Benchmark (`flask --app app bench-faq-matcher`)
+
+FILLER_WORDS = (
+    'please', 'thanks', 'again', 'really', 'just', 'also', 'today', 'yesterday', 'order', 'item', 'seller',
+    'listing', 'photo', 'box', 'package', 'color', 'size', 'works', 'sound', 'great', 'question', 'sorry'
+)
+FAQ_PHRASES = (
+    ('Tracking', ('tracking number', 'shipping updates', 'where is my order')),
+    ('Stock', ('still in stock', 'back in stock')),
+    ('Returns', ('return the', 'not what i expected', 'return label')),
+    ('Combined shipping', ('combine shipping', 'combined shipping')),
+    ('Refunds', ('my refund', 'refund status')),
+)
+
+
+def synthetic_entries(rng, count, phrases_per_entry):
+    """The FAQ_PHRASES entries, then made-up ones of two to four words up to count"""
+    entries = [
+        {'ID': f'faq-{index}', 'triggerPhrases': list(phrases), 'minPhraseMatches': 1, 'enabled': True,
+         'response': f'{name} answer'}
+        for index, (name, phrases) in enumerate(FAQ_PHRASES[:count])
+    ]
+    vocabulary = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(3, 9))) for _ in range(2000)]
+    while len(entries) < count:
+        entries.append({
+            'ID': f'faq-{len(entries)}',
+            'triggerPhrases': [' '.join(rng.choices(vocabulary, k=rng.randint(2, 4))) for _ in range(phrases_per_entry)],
+            'minPhraseMatches': 1,
+            'enabled': True,
+            'response': 'answer'
+        })
+    return entries
+
+
+def synthetic_messages(rng, count):
+    # The seed data's customer lines, padded with filler so lengths vary
+    return [
+        ' '.join(rng.choices(FILLER_WORDS, k=rng.randint(0, 40))) + ' '
+        + rng.choice(CUSTOMER_LINES).format(product=rng.choice(PRODUCTS), days=rng.randint(2, 14))
+        for _ in range(count)
+    ]
+
+
+def benchmark_matcher(messages=100000, entries=200, phrases_per_entry=5, seed=None, baseline_sample=500):
+    """
+    Match a synthetic corpus with the compiled matcher; also times a naive scan (one regex per phrase)
+    on baseline_sample of the messages for comparison. Returns a report dict.
+    """
+    rng = random.Random(seed)
+    faq_entries = synthetic_entries(rng, entries, phrases_per_entry)
+    corpus = synthetic_messages(rng, messages)
+
+    started = time.perf_counter()
+    matcher = FAQMatcher(faq_entries)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    # Timed in chunks, which gives per-message percentiles without timing calls dominating
+    chunk = 100
+    per_message_us = []
+    matched = 0
+    started = time.perf_counter()
+    for offset in range(0, len(corpus), chunk):
+        chunk_started = time.perf_counter()
+        for text in corpus[offset:offset + chunk]:
+            if matcher.match(text):
+                matched += 1
+        per_message_us.append((time.perf_counter() - chunk_started) * 1e6 / len(corpus[offset:offset + chunk]))
+    elapsed = time.perf_counter() - started
+    per_message_us.sort()
+
+    naive_patterns = [
+        re.compile(r'(?<!\w)' + r'\s+'.join(map(re.escape, phrase.split())) + r'(?!\w)')
+        for phrase in matcher.phrase_entries
+    ]
+    sample = corpus[:baseline_sample]
+    started = time.perf_counter()
+    for text in sample:
+        text = text.lower()
+        [pattern for pattern in naive_patterns if pattern.search(text)]
+    naive_us = (time.perf_counter() - started) * 1e6 / max(len(sample), 1)
+
+    return {
+        'messages': len(corpus),
+        'entries': len(matcher.entries),
+        'phrases': len(matcher.phrase_entries),
+        'patternLength': len(matcher.pattern.pattern),
+        'compileMs': round(compile_ms, 1),
+        'matched': matched,
+        'messagesPerSecond': round(len(corpus) / elapsed),
+        'usPerMessage': {
+            'mean': round(elapsed * 1e6 / len(corpus), 2),
+            'p50': round(per_message_us[len(per_message_us) // 2], 2),
+            'p99': round(per_message_us[min(len(per_message_us) - 1, int(len(per_message_us) * 0.99))], 2),
+        },
+        'naiveUsPerMessage': round(naive_us, 2),
+    }
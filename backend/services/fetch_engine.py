@@ -0,0 +1,132 @@
+"""
+Runs every marketplace connector concurrently inside the single scheduler job.
+Each connector gets its own deadline, counted from when its fetch actually starts on a worker, so
+one slow or failing marketplace cannot stall the others. A fetch that overruns is left to finish
+in the background and its result is handed out by the next cycle instead of being thrown away, so
+a marketplace that is always slower than the timeout still gets ingested.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+class FetchEngine:
+    
+    def __init__(self, connectors, max_workers=4, connector_timeout=60):
+        self.connectors = connectors
+        self.connector_timeout = connector_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='marketplace-fetch')
+        # Connectors whose previous fetch is still running after its deadline
+        self.in_flight = set()
+        # marketplace -> when its current fetch started on a worker
+        self.started = {}
+        # marketplace -> (cursor fetched from, conversations, new cursor, duration) of fetches that overran
+        self.late = {}
+        self.lock = threading.Lock()
+    
+    def _run(self, connector, cursor):
+        started = time.monotonic()
+        with self.lock:
+            self.started[connector.marketplace] = started
+        try:
+            return connector.fetch_conversations(cursor)
+        finally:
+            with self.lock:
+                self.in_flight.discard(connector.marketplace)
+                self.started.pop(connector.marketplace, None)
+            logger.debug(f"{connector.marketplace} fetch finished in {time.monotonic() - started:.2f}s")
+    
+    def _keep_late(self, marketplace, cursor, started):
+        def done(future):
+            if future.cancelled() or future.exception() is not None:
+                logger.warning(f"Late {marketplace} fetch failed: {future.exception() if not future.cancelled() else 'cancelled'}")
+                return
+            conversations, new_cursor = future.result()
+            with self.lock:
+                self.late[marketplace] = (cursor, conversations, new_cursor, time.monotonic() - started)
+            logger.info(f"Late {marketplace} fetch finished; it is ingested by the next cycle")
+        return done
+    
+    def _wait(self, futures, submitted):
+        """Wait until every future is done or past its deadline; returns the ones that timed out"""
+        pending = set(futures)
+        timed_out = set()
+        while True:
+            pending = {future for future in pending if not future.done()}
+            if not pending:
+                return timed_out
+            now = time.monotonic()
+            with self.lock:
+                # A fetch still queued behind busy workers only gets the timeout to start
+                deadlines = {
+                    future: self.started.get(futures[future].marketplace, submitted) + self.connector_timeout
+                    for future in pending
+                }
+            overdue = {future for future in pending if deadlines[future] <= now and not future.done()}
+            timed_out |= overdue
+            pending -= overdue
+            if pending:
+                wait(pending, timeout=min(deadlines[future] for future in pending) - now, return_when=FIRST_COMPLETED)
+    
+    def fetch_all(self, cursors=None, marketplaces=None):
+        """
+        cursors: {marketplace: sync cursor} as stored in SyncState
+        marketplaces: only fetch these (default: all connectors)
+        Returns {marketplace: {'conversations': [...], 'cursor': new cursor or None, 'error': str or None, 'duration': seconds}}
+        """
+        cursors = cursors or {}
+        results = {}
+        futures = {}
+        submitted = time.monotonic()
+        
+        for connector in self.connectors:
+            marketplace = connector.marketplace
+            if marketplaces is not None and marketplace not in marketplaces:
+                continue
+            cursor = cursors.get(marketplace)
+            with self.lock:
+                late = self.late.pop(marketplace, None)
+                # Unless the cursor was rewound meanwhile, the overrun fetch is this cycle's result
+                if late is not None and late[0] == cursor:
+                    results[marketplace] = {'conversations': late[1], 'cursor': late[2], 'error': None, 'duration': late[3]}
+                    continue
+                if marketplace in self.in_flight:
+                    results[marketplace] = {
+                        'conversations': [], 'cursor': None, 'error': 'previous fetch still running', 'duration': 0.0
+                    }
+                    continue
+                self.in_flight.add(marketplace)
+            futures[self.executor.submit(self._run, connector, cursor)] = connector
+        
+        timed_out = self._wait(futures, submitted)
+        
+        for future, connector in futures.items():
+            marketplace = connector.marketplace
+            duration = time.monotonic() - submitted
+            if future in timed_out:
+                # Left running in the background; the next cycle picks up its result
+                with self.lock:
+                    begun = self.started.get(marketplace, submitted)
+                logger.warning(f"{marketplace} fetch exceeded {self.connector_timeout}s")
+                future.add_done_callback(self._keep_late(marketplace, cursors.get(marketplace), begun))
+                results[marketplace] = {'conversations': [], 'cursor': None, 'error': 'timeout', 'duration': duration}
+            elif future.exception() is not None:
+                logger.error(f"{marketplace} fetch failed: {future.exception()}")
+                results[marketplace] = {
+                    'conversations': [], 'cursor': None, 'error': str(future.exception()), 'duration': duration
+                }
+            else:
+                conversations, cursor = future.result()
+                results[marketplace] = {
+                    'conversations': conversations, 'cursor': cursor, 'error': None, 'duration': duration
+                }
+        
+        return results
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for connector in self.connectors:
+            connector.close()
@@ -0,0 +1,234 @@
+"""
+Set-based ingestion of fetched conversations (see services/connectors/base.py for the format).
+
+Attachment URLs in the batch's messages are first downloaded into the attachment store
+(services/attachments.py), in a transaction of their own. Then each batch is one transaction:
+  1. one SELECT to find which conversations already have tickets (after restoring any that were archived)
+  2. one INSERT ... ON CONFLICT (marketplace_conversation_id) DO UPDATE for the tickets, which only
+     rewrites (and marks changed) the existing tickets whose marketplace fields actually changed
+  3. one INSERT ... ON CONFLICT (ticket_id, external_id) DO NOTHING for the messages
+  4. one UPDATE bumping last_updated_date on tickets that received new messages
+  5. FAQ auto-replies to the new customer messages, queued in the outbox (services/faq_matcher.py)
+  6. with AUTO_ASSIGN on, the new tickets are handed to agents (services/assignment.py)
+The marketplace sync cursor is advanced in the same transaction as the final batch, so a
+crash mid-poll leaves the cursor where it was and the next poll re-fetches (and dedupes) the rest.
+"""
+import logging
+import uuid
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from flask import current_app
+from extensions import db
+from models import Ticket, Message, SyncState
+from services import archive, assignment, attachments, events, faq_matcher, outbox, reference_cache
+
+logger = logging.getLogger(__name__)
+
+tickets_table = Ticket.__table__
+messages_table = Message.__table__
+sync_states_table = SyncState.__table__
+
+
+def dialect_insert(table):
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(table)
+    if db.engine.dialect.name == 'sqlite':
+        return sqlite.insert(table)
+    raise RuntimeError(f'Bulk ingestion is not supported on {db.engine.dialect.name}')
+
+
+def is_distinct_from(column, value):
+    # PostgreSQL's json type has no equality operator, so JSON columns are compared as jsonb
+    if isinstance(column.type, db.JSON) and db.engine.dialect.name == 'postgresql':
+        return db.cast(column, postgresql.JSONB).is_distinct_from(db.cast(value, postgresql.JSONB))
+    return column.is_distinct_from(value)
+
+
+def merge_duplicates(conversations):
+    # The same conversation can't be upserted twice in one statement, so fold repeats together
+    merged = {}
+    for conversation in conversations:
+        key = conversation['marketplace_conversation_id']
+        if key in merged:
+            merged[key] = {**merged[key], **conversation, 'messages': merged[key]['messages'] + conversation['messages']}
+        else:
+            merged[key] = conversation
+    return list(merged.values())
+
+
+def save_sync_cursor(marketplace, account, cursor):
+    """Upsert the cursor for a marketplace account (part of the caller's transaction)"""
+    upsert = dialect_insert(sync_states_table)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=['marketplace', 'account'],
+        set_={
+            'since': upsert.excluded.since,
+            'page_token': upsert.excluded.page_token,
+            'etag': upsert.excluded.etag,
+            'updated_at': upsert.excluded.updated_at,
+        }
+    )
+    db.session.execute(upsert, {
+        'id': str(uuid.uuid4()),
+        'marketplace': marketplace,
+        'account': account,
+        'since': cursor.get('since'),
+        'page_token': cursor.get('page_token'),
+        'etag': cursor.get('etag'),
+        'updated_at': datetime.utcnow(),
+    })
+
+
+def ingest_batch(conversations, sync_cursor=None):
+    """
+    Upsert one batch of conversations in a single transaction.
+    sync_cursor: optional {'marketplace', 'account', 'cursor'} to advance in the same transaction
+    Returns {'ticket_ids': [...], 'new_ticket_ids': [...], 'new_messages': [{'id', 'ticket_id', 'message', 'authored', 'date'}]}
+    """
+    now = datetime.utcnow()
+    conversations = merge_duplicates(conversations)
+    conversation_ids = [conversation['marketplace_conversation_id'] for conversation in conversations]
+    
+    # Before the transaction below, which then never waits on a download
+    attachments.store_message_attachments(conversations)
+    
+    # A conversation that continues after its ticket was archived gets the same ticket back, history and all
+    restored_ids = archive.restore_conversations(conversation_ids)
+    
+    existing = dict(db.session.execute(
+        db.select(tickets_table.c.marketplace_conversation_id, tickets_table.c.ticket_id)
+            .where(tickets_table.c.marketplace_conversation_id.in_(conversation_ids))
+    ).all())
+    
+    ticket_rows = [
+        {
+            'ticket_id': existing.get(conversation['marketplace_conversation_id']) or str(uuid.uuid4()),
+            'marketplace': conversation['marketplace'],
+            'marketplace_conversation_id': conversation['marketplace_conversation_id'],
+            'customer_name': conversation['customer_name'],
+            'priority': 'Medium',
+            'ticket_status': 'New',
+            'conversation_start_date': conversation.get('conversation_start_date') or now,
+            'last_updated_date': now,
+            'order_history': conversation.get('order_history') or [],
+            'related_listing_url': conversation.get('related_listing_url'),
+        }
+        for conversation in conversations
+    ]
+    upsert = dialect_insert(tickets_table)
+    # Marketplace-owned fields only; status, priority, assignee and tags belong to the dashboard
+    marketplace_fields = {
+        'customer_name': upsert.excluded.customer_name,
+        'order_history': upsert.excluded.order_history,
+        'related_listing_url': db.func.coalesce(upsert.excluded.related_listing_url, tickets_table.c.related_listing_url),
+    }
+    upsert = upsert.on_conflict_do_update(
+        index_elements=['marketplace_conversation_id'],
+        # Re-fetched tickets are left alone unless the marketplace changed them, so a poll doesn't
+        # rewrite every ticket it overlaps with; a change reaches the change feed but keeps the list position
+        set_={**marketplace_fields, 'changed_at': now},
+        where=db.or_(*(is_distinct_from(tickets_table.c[name], value) for name, value in marketplace_fields.items()))
+    ).returning(tickets_table.c.marketplace_conversation_id, tickets_table.c.ticket_id)
+    written = dict(db.session.execute(upsert, ticket_rows).all())
+    changed_ids = {ticket_id for conversation_id, ticket_id in written.items() if conversation_id in existing}
+    ticket_ids = {**existing, **written}
+    # Tickets another process created since the SELECT above, unchanged and so not returned
+    missing = [conversation_id for conversation_id in conversation_ids if conversation_id not in ticket_ids]
+    if missing:
+        ticket_ids.update(db.session.execute(
+            db.select(tickets_table.c.marketplace_conversation_id, tickets_table.c.ticket_id)
+                .where(tickets_table.c.marketplace_conversation_id.in_(missing))
+        ).all())
+    
+    message_rows = [
+        {
+            'ticket_id': ticket_ids[conversation['marketplace_conversation_id']],
+            'external_id': message['external_id'],
+            'message': message['message'],
+            'authored': message.get('authored', False),
+            'date': message.get('date') or now,
+            'image_attachments': message.get('image_attachments') or [],
+        }
+        for conversation in conversations
+        for message in conversation['messages']
+    ]
+    new_messages = []
+    if message_rows:
+        insert_messages = dialect_insert(messages_table).on_conflict_do_nothing(
+            index_elements=['ticket_id', 'external_id']
+        ).returning(
+            messages_table.c.id, messages_table.c.ticket_id, messages_table.c.message,
+            messages_table.c.authored, messages_table.c.date
+        )
+        new_messages = [dict(row._mapping) for row in db.session.execute(insert_messages, message_rows)]
+    
+    # Existing tickets only move up the list when something new arrived, once per batch
+    updated_ids = {message['ticket_id'] for message in new_messages} & set(existing.values())
+    if updated_ids:
+        db.session.execute(
+            tickets_table.update()
+                .where(tickets_table.c.ticket_id.in_(updated_ids))
+                .values(last_updated_date=now)
+        )
+    
+    answered_ids, created_tag = faq_matcher.queue_auto_replies(new_messages, {
+        ticket_ids[conversation['marketplace_conversation_id']]: conversation for conversation in conversations
+    }, restored_ids)
+    
+    new_ticket_ids = [ticket_id for conversation_id, ticket_id in ticket_ids.items() if conversation_id not in existing]
+    assigned = assignment.assign_tickets(new_ticket_ids) if current_app.config.get('AUTO_ASSIGN', True) else {}
+    
+    if sync_cursor:
+        save_sync_cursor(sync_cursor['marketplace'], sync_cursor['account'], sync_cursor['cursor'])
+    
+    db.session.commit()
+    
+    events.publish_ticket_ids('ticket.restored', restored_ids)
+    events.publish_ticket_ids('ticket.created', new_ticket_ids)
+    events.publish_ticket_ids('message.created', updated_ids)
+    events.publish_ticket_ids('ticket.updated', changed_ids - updated_ids - set(restored_ids),
+                              fields=['customerName', 'orderHistory', 'relatedListingURL'])
+    if created_tag:
+        reference_cache.invalidate(reference_cache.TAGS)
+    if answered_ids:
+        outbox.notify_pending()
+        events.publish_ticket_ids('message.created', answered_ids, authored=True)
+        events.publish_ticket_ids('ticket.updated', answered_ids, fields=['tags'])
+    assignment.publish_assignments(assigned)
+    
+    return {
+        'ticket_ids': list(ticket_ids.values()),
+        'new_ticket_ids': new_ticket_ids,
+        'new_messages': new_messages,
+    }
+
+
+def ingest_conversations(conversations, batch_size=None, sync_cursor=None):
+    """
+    Ingest fetched conversations in batches; returns the merged ingest_batch results.
+    sync_cursor is only stored once every batch has been committed.
+    """
+    batch_size = batch_size or current_app.config.get('INGEST_BATCH_SIZE', 500)
+    totals = {'ticket_ids': [], 'new_ticket_ids': [], 'new_messages': []}
+    
+    if not conversations:
+        if sync_cursor:
+            save_sync_cursor(sync_cursor['marketplace'], sync_cursor['account'], sync_cursor['cursor'])
+            db.session.commit()
+        return totals
+    
+    for start in range(0, len(conversations), batch_size):
+        is_last = start + batch_size >= len(conversations)
+        try:
+            result = ingest_batch(conversations[start:start + batch_size], sync_cursor if is_last else None)
+        except Exception:
+            db.session.rollback()
+            raise
+        for key in totals:
+            totals[key].extend(result[key])
+    
+    logger.info(
+        f"Ingested {len(totals['ticket_ids'])} conversations "
+        f"({len(totals['new_ticket_ids'])} new tickets, {len(totals['new_messages'])} new messages)"
+    )
+    return totals
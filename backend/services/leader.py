@@ -0,0 +1,86 @@
+"""
+Leader election through a lease row, so a job runs in exactly one process however many web
+workers and worker.py processes are up.
+
+Every candidate calls renew() periodically (well within the TTL). The holder extends its lease;
+the others only get it once it has expired, i.e. when the leader has died or stopped renewing.
+Expiry times come from each host's clock (UTC), so hosts need to agree on the time to well within the TTL.
+"""
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from extensions import db
+from models import SchedulerLease
+from services.ingest import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    
+    def __init__(self, name, ttl=30):
+        self.name = name
+        self.ttl = ttl
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        # Local deadline, measured from before the renewal, so it always ends before the stored expiry
+        self._held_until = 0.0
+    
+    @property
+    def held(self):
+        return time.monotonic() < self._held_until
+    
+    def renew(self):
+        """Take or extend the lease if possible; returns whether this process is the leader"""
+        started = time.monotonic()
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+        was_held = self.held
+        try:
+            result = db.session.execute(
+                db.update(SchedulerLease)
+                    .where(
+                        SchedulerLease.name == self.name,
+                        db.or_(SchedulerLease.holder == self.holder, SchedulerLease.expires_at < now)
+                    )
+                    .values(
+                        holder=self.holder,
+                        expires_at=expires_at,
+                        acquired_at=db.case((SchedulerLease.holder == self.holder, SchedulerLease.acquired_at), else_=now)
+                    )
+            )
+            acquired = result.rowcount == 1
+            if not acquired:
+                # First run: nobody has held this lease yet
+                result = db.session.execute(
+                    dialect_insert(SchedulerLease.__table__)
+                        .values(name=self.name, holder=self.holder, acquired_at=now, expires_at=expires_at)
+                        .on_conflict_do_nothing()
+                )
+                acquired = result.rowcount == 1
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Renewing the {self.name} lease failed: {e}")
+            acquired = False
+        
+        self._held_until = started + self.ttl if acquired else 0.0
+        if acquired != was_held:
+            logger.info(f"{self.holder} {'became' if acquired else 'is no longer'} the {self.name} leader")
+        return acquired
+    
+    def release(self):
+        """Give the lease up so another process takes over right away"""
+        self._held_until = 0.0
+        try:
+            db.session.execute(
+                db.update(SchedulerLease)
+                    .where(SchedulerLease.name == self.name, SchedulerLease.holder == self.holder)
+                    .values(expires_at=datetime.utcnow())
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Releasing the {self.name} lease failed: {e}")
@@ -0,0 +1,33 @@
+"""
+Logging for the web app and worker.py: plain text lines by default, or one JSON object per line
+with LOG_FORMAT=json (python-json-logger), which carries the structured fields that the request
+and slow query logs pass as `extra`.
+"""
+import logging
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+JSON_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+
+
+def configure_logging(config):
+    root = logging.getLogger()
+    # Once per process, and never over a configuration someone else installed
+    if getattr(root, '_configured_by_app', False) or root.handlers:
+        return
+    
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter(TEXT_FORMAT)
+    missing_json_logger = False
+    if config.get('LOG_FORMAT', 'text').lower() == 'json':
+        try:
+            from pythonjsonlogger import jsonlogger
+            formatter = jsonlogger.JsonFormatter(JSON_FORMAT)
+        except ImportError:
+            missing_json_logger = True
+    handler.setFormatter(formatter)
+    
+    root.addHandler(handler)
+    root.setLevel(config.get('LOG_LEVEL', 'INFO').upper())
+    root._configured_by_app = True
+    if missing_json_logger:
+        logging.getLogger(__name__).warning('LOG_FORMAT=json needs python-json-logger; logging plain text')
@@ -0,0 +1,274 @@
+"""
+Request, SQL and background job instrumentation, exposed in the Prometheus text format at /metrics.
+
+init_app registers hooks that record, for every request: latency by route and status, response
+size, and the number and total time of the SQL statements it ran. Statements slower than
+SLOW_QUERY_MS are logged with their bind parameters and kept in a small ring buffer
+(GET /metrics/slowQueries). The scheduler records job durations and ingested rows through
+time_job() and INGESTED_ROWS.
+
+Metrics live in the memory of each process, so every web worker is scraped on its own; worker.py
+serves its scheduler and dispatcher metrics on WORKER_METRICS_PORT.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        _registry.append(self)
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with _lock:
+            for key, value in sorted(self.values.items()):
+                lines.extend(self.render_value(key, value))
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render_value(self, key, value):
+        return [f'{self.name}{format_labels(self.labels, key)} {value}']
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, amount, **labels):
+        key = self.key(labels)
+        with _lock:
+            value = self.values.get(key)
+            if value is None:
+                value = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if amount <= bound:
+                    value[0][index] += 1
+            value[1] += amount
+            value[2] += 1
+
+    def render_value(self, key, value):
+        counts, total, observations = value
+        lines = [
+            f'{self.name}_bucket{format_labels(self.labels, key, [("le", bound)])} {count}'
+            for bound, count in zip(self.buckets, counts)
+        ]
+        lines.append(f'{self.name}_bucket{format_labels(self.labels, key, [("le", "+Inf")])} {observations}')
+        lines.append(f'{self.name}_sum{format_labels(self.labels, key)} {total}')
+        lines.append(f'{self.name}_count{format_labels(self.labels, key)} {observations}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Request latency', ('method', 'route', 'status'))
+RESPONSE_BYTES = Histogram('http_response_size_bytes', 'Response body size', ('method', 'route'), SIZE_BUCKETS)
+REQUEST_STATEMENTS = Histogram('http_request_sql_statements', 'SQL statements run per request', ('method', 'route'), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram('http_request_sql_duration_seconds', 'Total SQL time per request', ('method', 'route'))
+STATEMENT_SECONDS = Histogram('sql_statement_duration_seconds', 'SQL statement latency, requests and background jobs alike', ('bind',))
+SLOW_STATEMENTS = Counter('sql_slow_statements_total', 'SQL statements slower than SLOW_QUERY_MS', ('bind', 'route'))
+JOB_SECONDS = Histogram('scheduler_job_duration_seconds', 'Scheduler job run time', ('job',), JOB_BUCKETS)
+JOB_FAILURES = Counter('scheduler_job_failures_total', 'Scheduler job runs that raised', ('job',))
+INGESTED_ROWS = Counter('ingested_rows_total', 'Conversations, new tickets and new messages ingested from the marketplaces', ('marketplace', 'kind'))
+
+# Most recent slow statements, newest last
+slow_queries = deque(maxlen=50)
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def time_job(job):
+    """Record a scheduler job run's duration, and a failure if it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        JOB_FAILURES.inc(job=job)
+        raise
+    finally:
+        JOB_SECONDS.observe(time.perf_counter() - started, job=job)
+
+
+def route_label():
+    # The URL rule rather than the path, so IDs don't each become a series
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+# SQL
+
+def instrument_engine(engine, bind, slow_seconds):
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+        STATEMENT_SECONDS.observe(elapsed, bind=bind)
+
+        route = None
+        if has_request_context():
+            route = route_label()
+            g.sql_statements = g.get('sql_statements', 0) + 1
+            g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+
+        if elapsed >= slow_seconds:
+            SLOW_STATEMENTS.inc(bind=bind, route=route or 'background')
+            sample = {
+                'at': datetime.utcnow().isoformat(),
+                'bind': bind,
+                'route': route,
+                'durationMs': round(elapsed * 1000, 1),
+                'statement': statement[:2000],
+                'parameters': repr(parameters)[:1000],
+            }
+            with _lock:
+                slow_queries.append(sample)
+            logger.warning(f"Slow SQL ({sample['durationMs']}ms) on {route or 'background'}", extra={'slowQuery': sample})
+
+    def handle_error(context):
+        # A failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.connection.info.get('metrics_started'):
+            context.connection.info['metrics_started'].pop()
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(engine, 'handle_error', handle_error)
+
+
+def recent_slow_queries():
+    with _lock:
+        return list(reversed(slow_queries))
+
+
+# Requests
+
+def start_request():
+    g.metrics_started = time.perf_counter()
+
+
+def record_request(response, slow_request_seconds):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    method, route = request.method, route_label()
+    statements = g.get('sql_statements', 0)
+    sql_seconds = g.get('sql_seconds', 0.0)
+
+    REQUEST_SECONDS.observe(elapsed, method=method, route=route, status=response.status_code)
+    REQUEST_STATEMENTS.observe(statements, method=method, route=route)
+    REQUEST_SQL_SECONDS.observe(sql_seconds, method=method, route=route)
+    # Streamed responses (server-sent events) have no size up front
+    if not response.is_streamed and response.content_length is not None:
+        RESPONSE_BYTES.observe(response.content_length, method=method, route=route)
+
+    fields = {
+        'method': method,
+        'route': route,
+        'path': request.path,
+        'status': response.status_code,
+        'durationMs': round(elapsed * 1000, 1),
+        'sqlStatements': statements,
+        'sqlMs': round(sql_seconds * 1000, 1),
+    }
+    if response.status_code >= 500:
+        # The routes turn exceptions into {'error': ...} responses, so this is where they get logged
+        error = response.get_json(silent=True) if response.is_json else None
+        fields['error'] = (error or {}).get('error') if isinstance(error, dict) else None
+        logger.error(f"{method} {request.path} failed with {response.status_code}: {fields['error']}", extra=fields)
+    elif elapsed >= slow_request_seconds:
+        logger.warning(f"Slow request {method} {request.path} ({fields['durationMs']}ms, {statements} SQL statements)", extra=fields)
+    return response
+
+
+def init_app(app):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    slow_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000
+    slow_request_seconds = app.config.get('SLOW_REQUEST_MS', 1000) / 1000
+
+    with app.app_context():
+        for bind, engine in app.extensions['sqlalchemy'].engines.items():
+            instrument_engine(engine, bind or 'primary', slow_seconds)
+
+    app.before_request(start_request)
+    app.after_request(lambda response: record_request(response, slow_request_seconds))
+
+
+# Standalone endpoint for processes without a web server (worker.py)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='0.0.0.0'):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"Serving metrics on :{port}/metrics")
+    return server
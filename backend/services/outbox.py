@@ -0,0 +1,351 @@
+"""
+Transactional outbox for replies sent from the dashboard.
+
+reply_to_ticket writes the Message and its OutboxMessage in the same commit and returns right away.
+The Dispatcher, a background thread with a bounded pool of send workers, claims due rows and sends
+them through the marketplace connectors, one batch per marketplace at a time (in a single request
+where the marketplace has a bulk endpoint). Failed sends are retried with exponential backoff until
+OUTBOX_MAX_ATTEMPTS, and every outcome is mirrored onto Message.delivery_status for the dashboard.
+Rows for a marketplace no dispatcher has a connector for are failed once they've waited
+OUTBOX_UNROUTABLE_AFTER, rather than left pending; a process without any connector doesn't
+dispatch at all.
+
+Claims are leases (locked_until), so rows claimed by a dispatcher that dies are picked up again once
+the lease runs out, unless they've used up their attempts, in which case they're failed; sends carry
+an idempotency key so a retried send isn't posted twice. On
+PostgreSQL claims use FOR UPDATE SKIP LOCKED, which lets several processes dispatch at once, and new
+replies wake the dispatchers of every process through NOTIFY.
+"""
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Message, OutboxMessage, Ticket
+from services import events
+from services.connectors import build_connectors, ConnectorError
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'outbox'
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+# Set when there may be new work; the dispatcher otherwise polls every OUTBOX_POLL_INTERVAL seconds
+_wake = threading.Event()
+
+
+def enqueue_reply(message, ticket):
+    """Add the outbox row for a new reply to the session; it's committed together with the message"""
+    message.delivery_status = PENDING
+    outbox_message = OutboxMessage(
+        message=message,
+        ticket_id=ticket.ticket_id,
+        marketplace=ticket.marketplace,
+        marketplace_conversation_id=ticket.marketplace_conversation_id,
+        body=message.message,
+        status=PENDING,
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(outbox_message)
+    return outbox_message
+
+
+def notify_pending():
+    """Wake the dispatchers; call after committing new outbox rows"""
+    _wake.set()
+    try:
+        if events.is_postgres():
+            events.notify(CHANNEL, '')
+    except Exception as e:
+        # The dispatchers poll as well, so the reply is only delayed
+        logger.warning(f"Failed to notify outbox dispatchers: {e}")
+
+
+events.register_channel(CHANNEL, lambda payload: _wake.set())
+
+
+def retry_delay(attempts, base, maximum):
+    # Exponential backoff with jitter, so replies that failed together don't retry together
+    delay = min(maximum, base * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def give_up(rows, now):
+    """Mirror FAILED onto the messages of rows just failed outside record_results; returns their ticket IDs"""
+    if not rows:
+        return set()
+    db.session.query(Message).filter(Message.id.in_([row.message_id for row in rows])).update(
+        {Message.delivery_status: FAILED}, synchronize_session=False
+    )
+    ticket_ids = {row.ticket_id for row in rows}
+    touch_tickets(ticket_ids, now)
+    return ticket_ids
+
+
+def touch_tickets(ticket_ids, now):
+    # Delivery status is part of the ticket's payload, so its ETag and the change feed must see it
+    # move; last_updated_date stays, so the ticket keeps its place in the list and its archive age
+    if ticket_ids:
+        db.session.query(Ticket).filter(Ticket.ticket_id.in_(ticket_ids)).update(
+            {Ticket.changed_at: now, Ticket.last_updated_date: Ticket.last_updated_date}, synchronize_session=False
+        )
+
+
+def claim(marketplace, limit, lease, max_attempts):
+    """
+    Lease up to limit due rows for marketplace; returns them as plain dicts for the send workers.
+    Expired leases of rows that have used up their attempts are failed instead of claimed again.
+    """
+    now = datetime.utcnow()
+    rows = OutboxMessage.query.filter(
+        OutboxMessage.marketplace == marketplace,
+        db.or_(
+            db.and_(OutboxMessage.status == PENDING, OutboxMessage.next_attempt_at <= now),
+            # Leases left behind by a dispatcher that died mid-send
+            db.and_(OutboxMessage.status == SENDING, OutboxMessage.locked_until < now)
+        )
+    ).order_by(OutboxMessage.next_attempt_at).limit(limit).with_for_update(skip_locked=True).all()
+
+    claimed, expired = [], []
+    for row in rows:
+        if row.status == SENDING and row.attempts >= max_attempts:
+            row.status = FAILED
+            row.locked_until = None
+            row.last_error = f'No result recorded after {row.attempts} attempt(s)'
+            logger.warning(f"Giving up on outbox message {row.id}: {row.last_error}")
+            expired.append(row)
+            continue
+        row.status = SENDING
+        row.locked_until = now + timedelta(seconds=lease)
+        row.attempts += 1
+        claimed.append({
+            'id': row.id,
+            'attempts': row.attempts,
+            'key': f'message-{row.message_id}',
+            'conversation_id': row.marketplace_conversation_id,
+            'body': row.body,
+        })
+    ticket_ids = give_up(expired, now)
+    db.session.commit()
+    events.publish_ticket_ids('message.delivery', sorted(ticket_ids))
+    return claimed
+
+
+def fail_unroutable(marketplaces, older_than):
+    """
+    Fail the rows of marketplaces without a connector here that have been pending for older_than
+    seconds; another process configured for the marketplace would have sent them by then
+    """
+    now = datetime.utcnow()
+    rows = OutboxMessage.query.filter(
+        OutboxMessage.status == PENDING,
+        OutboxMessage.marketplace.notin_(marketplaces),
+        OutboxMessage.created_at < now - timedelta(seconds=older_than)
+    ).with_for_update(skip_locked=True).all()
+    if not rows:
+        db.session.rollback()
+        return 0
+
+    for row in rows:
+        row.status = FAILED
+        row.last_error = f'No connector configured for {row.marketplace}'
+        logger.warning(f"Failing outbox message {row.id}: {row.last_error}")
+    ticket_ids = give_up(rows, now)
+    db.session.commit()
+    events.publish_ticket_ids('message.delivery', sorted(ticket_ids))
+    return len(rows)
+
+
+def link_external_id(message, external_id):
+    """
+    Give a sent reply the marketplace's ID for it, so the marketplace's copy is recognized when
+    it's fetched back. A fetch that ran during the send may have stored that copy as a message of
+    its own already; it's dropped in favour of the reply.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.query(Message).filter(
+                Message.ticket_id == message.ticket_id,
+                Message.external_id == external_id,
+                Message.id != message.id
+            ).delete(synchronize_session=False)
+            message.external_id = external_id
+    except IntegrityError as e:
+        # Only the reply's own ID is lost; the send itself is still recorded
+        logger.warning(f"Could not link message {message.id} to marketplace message {external_id}: {e}")
+
+
+def record_results(claimed, results, max_attempts, retry_base, retry_max):
+    """
+    Store the outcome of each claimed send ({key: external ID or ConnectorError}) and commit.
+    Each reply is linked to its marketplace ID in a savepoint of its own, so one that can't be
+    doesn't keep the rest of the batch from being recorded.
+    """
+    now = datetime.utcnow()
+    rows = {
+        row.id: row for row in OutboxMessage.query.filter(OutboxMessage.id.in_([item['id'] for item in claimed]))
+    }
+    messages = {
+        message.id: message
+        for message in Message.query.filter(Message.id.in_([row.message_id for row in rows.values()]))
+    } if rows else {}
+
+    ticket_ids = set()
+    for item in claimed:
+        row = rows.get(item['id'])
+        # Skip rows that were deleted or whose lease ran out and were claimed again meanwhile
+        if row is None or row.status != SENDING or row.attempts != item['attempts']:
+            continue
+
+        result = results.get(item['key'], ConnectorError('No result for this reply'))
+        if isinstance(result, ConnectorError):
+            row.last_error = str(result)
+            if result.retryable and row.attempts < max_attempts:
+                row.status = PENDING
+                row.next_attempt_at = now + timedelta(seconds=retry_delay(row.attempts, retry_base, retry_max))
+            else:
+                row.status = FAILED
+                logger.warning(f"Giving up on outbox message {row.id} after {row.attempts} attempt(s): {result}")
+        else:
+            row.status = SENT
+            row.external_id = result or None
+            row.sent_at = now
+            row.last_error = None
+        row.locked_until = None
+
+        message = messages.get(row.message_id)
+        if message is not None:
+            message.delivery_status = row.status
+            if row.status == SENT and row.external_id:
+                link_external_id(message, row.external_id)
+        ticket_ids.add(row.ticket_id)
+
+    touch_tickets(ticket_ids, now)
+    db.session.commit()
+    return ticket_ids
+
+
+class Dispatcher:
+
+    def __init__(self, app, connectors, max_workers=4, batch_size=20, poll_interval=5, lease=300,
+                 max_attempts=8, retry_base=5, retry_max=900, unroutable_after=3600):
+        self.app = app
+        self.connectors = {connector.marketplace: connector for connector in connectors}
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.unroutable_after = unroutable_after
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='outbox-send')
+        # Marketplaces with a batch being sent; each marketplace has at most one at a time
+        self.busy = set()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    @classmethod
+    def from_config(cls, app):
+        config = app.config
+        return cls(
+            app,
+            build_connectors(config),
+            max_workers=config.get('OUTBOX_WORKERS', 4),
+            batch_size=config.get('OUTBOX_BATCH_SIZE', 20),
+            poll_interval=config.get('OUTBOX_POLL_INTERVAL', 5),
+            lease=config.get('OUTBOX_LEASE', 300),
+            max_attempts=config.get('OUTBOX_MAX_ATTEMPTS', 8),
+            retry_base=config.get('OUTBOX_RETRY_BASE', 5),
+            retry_max=config.get('OUTBOX_RETRY_MAX', 900),
+            unroutable_after=config.get('OUTBOX_UNROUTABLE_AFTER', 3600),
+        )
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='outbox-dispatcher', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        _wake.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.executor.shutdown(wait=True)
+
+    def run(self):
+        with self.app.app_context():
+            # Wake-ups from replies committed in other processes
+            events.ensure_listener()
+        while not self.stopping.is_set():
+            claimed = 0
+            try:
+                with self.app.app_context():
+                    claimed = self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {e}")
+            if not claimed:
+                _wake.wait(self.poll_interval)
+                _wake.clear()
+
+    def dispatch_once(self):
+        """Claim a batch for every idle marketplace and hand it to the pool; returns how many rows were claimed"""
+        fail_unroutable(list(self.connectors), self.unroutable_after)
+        total = 0
+        for marketplace in self.connectors:
+            with self.lock:
+                if marketplace in self.busy:
+                    continue
+                self.busy.add(marketplace)
+            try:
+                claimed = claim(marketplace, self.batch_size, self.lease, self.max_attempts)
+            except Exception:
+                db.session.rollback()
+                with self.lock:
+                    self.busy.discard(marketplace)
+                raise
+            if not claimed:
+                with self.lock:
+                    self.busy.discard(marketplace)
+                continue
+            total += len(claimed)
+            self.executor.submit(self.send, marketplace, claimed)
+        return total
+
+    def send(self, marketplace, claimed):
+        try:
+            try:
+                results = self.connectors[marketplace].send_messages(claimed)
+            except Exception as e:
+                results = {item['key']: ConnectorError(str(e)) for item in claimed}
+
+            with self.app.app_context():
+                ticket_ids = record_results(claimed, results, self.max_attempts, self.retry_base, self.retry_max)
+                events.publish_ticket_ids('message.delivery', sorted(ticket_ids))
+        except Exception as e:
+            # The rows stay leased and are retried when the lease runs out
+            logger.error(f"Recording {marketplace} outbox results failed: {e}")
+        finally:
+            with self.lock:
+                self.busy.discard(marketplace)
+            # More may be waiting for this marketplace
+            _wake.set()
+
+
+def start_dispatcher(app):
+    """Start a dispatcher for the configured marketplaces; returns None when none are configured"""
+    dispatcher = Dispatcher.from_config(app)
+    if not dispatcher.connectors:
+        logger.info("No marketplace connectors configured; replies are left for other processes to send")
+        dispatcher.executor.shutdown(wait=False)
+        return None
+    dispatcher.start()
+    logger.info(f"Outbox dispatcher started for {', '.join(dispatcher.connectors)}")
+    return dispatcher
@@ -0,0 +1,136 @@
+"""
+Statement-count regression check for the read endpoints (`flask --app app check-query-counts`).
+
+Each endpoint is requested twice through the test client, once returning a few rows and once
+returning many, and a before_cursor_execute listener counts the SQL statements each request
+issues. An endpoint fails when the larger request issues more statements than the smaller one (a
+relationship missing from its services/query_loading.py profile loads lazily once per row) or more
+than its budget. Run it against a seeded database (`flask --app app seed-data`), so the larger
+requests return more rows than the smaller ones.
+"""
+from extensions import db
+from models import Message, Ticket
+from services.benchmark import StatementCounter
+from services.ticket_queries import MAX_PAGE_LIMIT
+
+# Rows the larger requests return at most; selectinload loads 500 parents per IN query, so more
+# rows than that legitimately cost another statement per relationship
+LARGE_ROWS = MAX_PAGE_LIMIT
+
+
+class QueryCountCheck:
+    """
+    An endpoint requested at two sizes; rows(json) counts the rows a response returned.
+    fallback_budget applies off PostgreSQL, for endpoints that take another path there.
+    """
+
+    def __init__(self, name, small, large, budget, rows, fallback_budget=None):
+        self.name = name
+        self.small = small
+        self.large = large
+        self.budget = budget
+        self.rows = rows
+        self.fallback_budget = fallback_budget
+
+    def budget_for(self, dialect):
+        if dialect != 'postgresql' and self.fallback_budget is not None:
+            return self.fallback_budget
+        return self.budget
+
+
+def list_rows(data):
+    return len(data)
+
+
+def ticket_page_rows(data):
+    return len(data['tickets'])
+
+
+def message_rows(data):
+    return len(data['messages'])
+
+
+def sample_tickets():
+    """
+    (conversation starts of the third and the LARGE_ROWS-th newest tickets, shortest and longest
+    conversation) from the current database
+    """
+    starts = [
+        start for (start,) in db.session.query(Ticket.conversation_start_date)
+            .order_by(Ticket.conversation_start_date.desc())
+            .limit(LARGE_ROWS)
+    ]
+    if not starts:
+        raise ValueError('No tickets to check with; run `flask --app app seed-data` first')
+
+    lengths = db.session.query(Message.ticket_id, db.func.count().label('messages')) \
+        .group_by(Message.ticket_id) \
+        .subquery()
+    shortest = db.session.query(lengths.c.ticket_id).order_by(lengths.c.messages, lengths.c.ticket_id).first()
+    longest = db.session.query(lengths.c.ticket_id).order_by(lengths.c.messages.desc(), lengths.c.ticket_id).first()
+    if not longest:
+        raise ValueError('No messages to check with; run `flask --app app seed-data` first')
+    return starts[min(2, len(starts) - 1)], starts[-1], shortest[0], longest[0]
+
+
+def build_checks(few_start, many_start, short_ticket_id, long_ticket_id):
+    return [
+        QueryCountCheck('tickets (full list)', f'/api/tickets?startDate={few_start.isoformat()}',
+                        f'/api/tickets?startDate={many_start.isoformat()}', 4, list_rows),
+        QueryCountCheck('tickets page', '/api/tickets?limit=2', f'/api/tickets?limit={LARGE_ROWS}', 4, ticket_page_rows),
+        # The in-process search index catches up on tickets and messages in two statements of its own
+        QueryCountCheck('ticket search', '/api/tickets/search?q=order&limit=2',
+                        f'/api/tickets/search?q=order&limit={LARGE_ROWS}', 6, list_rows, fallback_budget=7),
+        QueryCountCheck('ticket', f'/api/tickets/{short_ticket_id}', f'/api/tickets/{long_ticket_id}', 5, message_rows),
+        QueryCountCheck('ticket messages', f'/api/tickets/{long_ticket_id}/messages?limit=2',
+                        f'/api/tickets/{long_ticket_id}/messages?limit={LARGE_ROWS}', 3, message_rows),
+        QueryCountCheck('bootstrap', '/api/bootstrap?limit=2', f'/api/bootstrap?limit={LARGE_ROWS}', 4, ticket_page_rows),
+        QueryCountCheck('archive', '/api/archive/tickets?limit=2', f'/api/archive/tickets?limit={LARGE_ROWS}', 1, ticket_page_rows),
+    ]
+
+
+def count_statements(client, counter, path):
+    # The first request warms the per-worker caches (reference data, suggestion index)
+    client.get(path)
+    counter.take()
+    response = client.get(path)
+    statements = counter.take()
+    if response.status_code != 200:
+        raise ValueError(f'GET {path} returned {response.status_code}')
+    return statements, response.get_json()
+
+
+def check_query_counts(app):
+    """
+    Returns {endpoint: {'statements': (small, large), 'rows': (small, large), 'budget', 'problems', 'note'}};
+    an endpoint passes when its problems list is empty, and the note says when the check proved little
+    """
+    with app.app_context():
+        checks = build_checks(*sample_tickets())
+        counter = StatementCounter(db.engines.values())
+        dialect = db.engine.dialect.name
+
+    client = app.test_client()
+    results = {}
+    try:
+        for check in checks:
+            small_statements, small_data = count_statements(client, counter, check.small)
+            large_statements, large_data = count_statements(client, counter, check.large)
+            small_rows, large_rows = check.rows(small_data), check.rows(large_data)
+
+            budget = check.budget_for(dialect)
+            problems = []
+            if large_statements > small_statements:
+                problems.append(f'{large_statements - small_statements} more statement(s) for {large_rows - small_rows} more row(s)')
+            if max(small_statements, large_statements) > budget:
+                problems.append(f'over the budget of {budget}')
+            results[check.name] = {
+                'statements': (small_statements, large_statements),
+                'rows': (small_rows, large_rows),
+                'budget': budget,
+                'problems': problems,
+                'note': None if large_rows > small_rows else 'the larger request returned no more rows',
+            }
+    finally:
+        counter.close()
+    return results
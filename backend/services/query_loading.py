@@ -0,0 +1,31 @@
+"""
+Relationship loading profiles for the read endpoints.
+Each endpoint declares which profile matches what it serializes, so the number of
+SQL round trips stays fixed regardless of how many rows are returned.
+"""
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload, raiseload
+from models import Agent, Ticket
+
+# Ticket.agent is a backref declared on Agent, so mappers must be configured before it exists
+configure_mappers()
+
+# Only the agent's name is serialized, so its assignment rules (selectin by default) stay unloaded
+AGENT_NAME = joinedload(Ticket.agent).lazyload(Agent.assignment_rules)
+
+# Ticket.to_summary_dict(): agent name and tags, never the conversation
+TICKET_SUMMARY = (
+    AGENT_NAME,
+    selectinload(Ticket.tags),
+    raiseload(Ticket.messages),
+)
+
+# Ticket.to_dict(): agent name, tags and the full conversation
+TICKET_FULL = (
+    AGENT_NAME,
+    selectinload(Ticket.tags),
+    selectinload(Ticket.messages),
+)
+
+
+def with_profile(query, profile):
+    return query.options(*profile)
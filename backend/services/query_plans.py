@@ -0,0 +1,77 @@
+"""
+Query-plan regression check for the ticket filters.
+EXPLAINs the query each FilterBar combination produces and reports any
+sequential scan on the hot tables, which means an index has gone missing.
+"""
+import json
+import re
+from datetime import datetime, timedelta
+from werkzeug.datastructures import MultiDict
+from extensions import db
+from models import Agent, Tag, Ticket
+from services.ticket_queries import apply_ticket_filters, ticket_page_query, encode_cursor
+from services.query_loading import with_profile, TICKET_FULL
+
+HOT_TABLES = ('tickets', 'messages', 'ticket_tags')
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def filter_combinations():
+    # Representative values from the current database, the same shapes the FilterBar sends
+    agent = Agent.query.first()
+    tag = Tag.query.first()
+    now = datetime.utcnow()
+    
+    combinations = {
+        'none': {},
+        'status': {'ticketStatus': 'New'},
+        'priority': {'priority': 'High'},
+        'status+priority': {'ticketStatus': 'In Progress', 'priority': 'High'},
+        'search': {'search': 'refund'},
+        'status+search': {'ticketStatus': 'New', 'search': 'refund'},
+        'dateRange': {'startDate': (now - timedelta(days=30)).isoformat(), 'endDate': now.isoformat()},
+    }
+    if agent:
+        combinations['assignedTo'] = {'assignedTo': agent.name}
+        combinations['status+assignedTo'] = {'ticketStatus': 'New', 'assignedTo': agent.name}
+    if tag:
+        combinations['tags'] = {'tags': json.dumps([{'ID': tag.id}])}
+        combinations['status+tags'] = {'ticketStatus': 'New', 'tags': json.dumps([{'ID': tag.id}])}
+    return combinations
+
+
+def explain(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    with db.engine.connect() as connection:
+        # Make any seq scan that is chosen only because an index is missing show up,
+        # regardless of how small the database being checked is
+        connection.exec_driver_sql('SET enable_seqscan = off')
+        rows = connection.exec_driver_sql('EXPLAIN ' + str(compiled).replace('%', '%%')).all()
+        connection.exec_driver_sql('RESET enable_seqscan')
+    return '\n'.join(row[0] for row in rows)
+
+
+def check_ticket_filter_plans():
+    """
+    Returns {combination: [tables seq-scanned]} for every filter combination, in both the
+    full list and the paginated summary modes of get_tickets.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        raise ValueError('Query plan checks require PostgreSQL')
+    
+    cursor = encode_cursor(datetime.utcnow(), 'ffffffff-ffff-ffff-ffff-ffffffffffff')
+    results = {}
+    for name, params in filter_combinations().items():
+        args = MultiDict(params)
+        queries = {
+            'list': apply_ticket_filters(with_profile(Ticket.query, TICKET_FULL), args)
+                .order_by(Ticket.last_updated_date.desc()),
+            'page': ticket_page_query(args, 50),
+            'page+cursor': ticket_page_query(args, 50, cursor),
+        }
+        for mode, query in queries.items():
+            plan = explain(query)
+            results[f'{name} ({mode})'] = sorted({
+                table for table in SEQ_SCAN.findall(plan) if table in HOT_TABLES
+            })
+    return results
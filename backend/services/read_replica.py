@@ -0,0 +1,83 @@
+"""
+Read-replica routing for db.session.
+
+When DATABASE_REPLICA_URL is set, the 'replica' bind serves the reads of GET and HEAD requests and
+everything else (writes, flushes, other methods, background jobs) goes to the primary. A client
+that has just written through a PUT/POST/PATCH/DELETE is pinned to the primary for
+REPLICA_STICKY_SECONDS afterwards, through a timestamp in the signed Flask session cookie, so it
+reads its own writes however far the replica lags. Code that needs the primary inside a GET (such
+as the shared reference cache) wraps its queries in primary().
+"""
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.expression import UpdateBase
+
+REPLICA = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+# Session cookie key holding the time until which this client reads from the primary
+STICKY_KEY = 'primaryUntil'
+
+
+def has_replica(app=None):
+    return REPLICA in ((app or current_app).config.get('SQLALCHEMY_BINDS') or {})
+
+
+def reads_from_replica():
+    if not has_request_context() or request.method not in READ_METHODS or g.get('db_primary'):
+        return False
+    # Decided once per request
+    if 'db_replica' not in g:
+        g.db_replica = has_replica() and session.get(STICKY_KEY, 0) < time.time()
+    return g.db_replica
+
+
+@contextmanager
+def primary():
+    """Send the session's reads to the primary for the duration of the block"""
+    if not has_request_context():
+        yield
+        return
+    g.db_primary = g.get('db_primary', 0) + 1
+    try:
+        yield
+    finally:
+        g.db_primary -= 1
+
+
+class RoutingSession(Session):
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase) and reads_from_replica():
+            return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def pin_to_primary(response):
+    # A successful write: this client's next reads must see it
+    if request.method not in READ_METHODS + ('OPTIONS',) and response.status_code < 400 and has_replica():
+        session[STICKY_KEY] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+    return response
+
+
+def set_statement_timeout(milliseconds):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'SET statement_timeout = {int(milliseconds)}')
+        cursor.close()
+        # Otherwise the setting is rolled back with the implicit transaction around it
+        dbapi_connection.commit()
+    return on_connect
+
+
+def init_app(app):
+    app.after_request(pin_to_primary)
+    
+    timeout = app.config.get('DB_STATEMENT_TIMEOUT', 0)
+    if timeout:
+        with app.app_context():
+            for engine in app.extensions['sqlalchemy'].engines.values():
+                if engine.dialect.name == 'postgresql':
+                    event.listen(engine, 'connect', set_statement_timeout(timeout))
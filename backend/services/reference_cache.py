@@ -0,0 +1,109 @@
+"""
+Process-local cache of the small reference tables: tags, agents, canned responses, the FAQ text
+and the FAQ entries.
+
+Entries hold the serialized payloads the GET routes return, so they're safe to share between
+requests. The write routes call invalidate() after their commit; on PostgreSQL that also sends a
+NOTIFY so every other web worker drops its copy (through the LISTEN thread in services/events.py).
+REFERENCE_CACHE_TTL bounds how stale an entry can get if a notification is ever lost.
+"""
+import json
+import logging
+import threading
+import time
+from flask import current_app
+from models import Tag, Agent, CannedResponse, FAQAutoResponse, FAQEntry
+from services import events
+from services.read_replica import primary
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'reference_cache'
+
+TAGS = 'tags'
+AGENTS = 'agents'
+CANNED_RESPONSES = 'cannedResponses'
+FAQ_AUTO_RESPONSE = 'faqAutoResponse'
+FAQ_ENTRIES = 'faqEntries'
+
+_entries = {}  # key -> (loaded_at, value)
+# Bumped on every invalidation, so a load that raced with one isn't stored
+_generations = {}
+_lock = threading.Lock()
+
+
+def get(key, loader):
+    events.ensure_listener()
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry and now - entry[0] < current_app.config['REFERENCE_CACHE_TTL']:
+            return entry[1]
+        generation = _generations.get(key, 0)
+
+    # From the primary: every worker shares what it loads, so it mustn't be behind the invalidation
+    with primary():
+        value = loader()
+    with _lock:
+        if _generations.get(key, 0) == generation:
+            _entries[key] = (now, value)
+    return value
+
+
+def drop(keys):
+    with _lock:
+        for key in keys:
+            _entries.pop(key, None)
+            _generations[key] = _generations.get(key, 0) + 1
+
+
+def drop_all():
+    drop(list(_entries))
+
+
+def invalidate(*keys):
+    """Drop keys here and in every other worker; call only after the change is committed"""
+    drop(keys)
+    try:
+        if events.is_postgres():
+            events.notify(CHANNEL, json.dumps(keys))
+    except Exception as e:
+        # Other workers pick the change up when their entries expire
+        logger.warning(f"Failed to propagate invalidation of {keys}: {e}")
+
+
+def handle_notification(payload):
+    drop(json.loads(payload))
+
+
+# Anything could have changed while the listener was disconnected
+events.register_channel(CHANNEL, handle_notification, on_connect=drop_all)
+
+
+# Cached reads
+
+def tags():
+    return get(TAGS, lambda: [tag.to_dict() for tag in Tag.query.order_by(Tag.name)])
+
+
+def agents():
+    return get(AGENTS, lambda: [agent.to_dict() for agent in Agent.query.order_by(Agent.name)])
+
+
+def canned_responses():
+    return get(CANNED_RESPONSES, lambda: [
+        response.to_dict() for response in CannedResponse.query.order_by(CannedResponse.created_at.desc())
+    ])
+
+
+def faq_auto_response():
+    # Just the text, as GET /faqAutoResponse returns it
+    def load():
+        faq = FAQAutoResponse.query.first()
+        return faq.faq_auto_response if faq else ''
+    return get(FAQ_AUTO_RESPONSE, load)
+
+
+def faq_entries():
+    # Also what services/faq_matcher.py compiles, so a reload here recompiles the matcher
+    return get(FAQ_ENTRIES, lambda: [entry.to_dict() for entry in FAQEntry.query.order_by(FAQEntry.name)])
@@ -0,0 +1,246 @@
+"""
+Canned responses ranked against a ticket (GET /api/tickets/<id>/suggestedResponses).
+
+Each process keeps a TF-IDF index of the canned responses: postings from each term to the
+responses containing it and how often (NumPy arrays), and each response's vector length. A ticket's
+latest customer messages are scored by adding up the weighted postings of their terms only, then
+dividing by the lengths (cosine similarity) and taking the top few with argpartition, so a lookup
+is a handful of array operations however many canned responses there are.
+
+The index is built on first use and then kept up to date one response at a time: the canned
+response routes call changed() after their commit, which marks the response for reloading here
+and, on PostgreSQL, in every other process (through the LISTEN thread in services/events.py).
+Pending responses are reloaded by the next lookup, and the lengths, which depend on every
+response's terms through IDF, are recomputed in one pass after a change.
+"""
+import json
+import logging
+import math
+import threading
+from collections import Counter
+import numpy as np
+from flask import current_app
+from extensions import db
+from models import CannedResponse, Message
+from services import events
+from services.read_replica import primary
+from services.search import tokenize
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'response_suggestions'
+MAX_SUGGESTIONS = 20
+
+# Words too common in customer messages and templates alike to tell responses apart
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'can', 'do', 'for', 'from', 'have', 'hi',
+    'hello', 'i', 'if', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'our', 'please', 'so', 'thank',
+    'thanks', 'that', 'the', 'this', 'to', 'was', 'we', 'will', 'with', 'you', 'your'
+))
+
+
+def terms(text):
+    return Counter(token for token in tokenize(text) if token not in STOP_WORDS and len(token) > 1)
+
+
+class ResponseIndex:
+    """TF-IDF postings over the canned responses; callers hold _lock"""
+
+    def __init__(self):
+        self.vocabulary = {}  # term -> term number
+        self.document_frequency = []  # term number -> responses containing it
+        self.postings = {}  # term number -> {row: term count}
+        self.posting_arrays = {}  # term number -> (rows, counts), built from postings when first needed
+        self.documents = []  # row -> (response ID, text, term numbers, counts), None once removed
+        self.rows = {}  # response ID -> row
+        self.free_rows = []
+        self.lengths = None  # row -> vector length; None until recomputed after a change
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, response_id, text):
+        self.remove(response_id)
+        counts = {}
+        for term, count in terms(text).items():
+            number = self.vocabulary.get(term)
+            if number is None:
+                number = self.vocabulary[term] = len(self.document_frequency)
+                self.document_frequency.append(0)
+                self.postings[number] = {}
+            counts[number] = count
+        row = self.free_rows.pop() if self.free_rows else len(self.documents)
+        if row == len(self.documents):
+            self.documents.append(None)
+        self.documents[row] = (
+            response_id, text,
+            np.fromiter(counts.keys(), dtype=np.int64, count=len(counts)),
+            np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        )
+        self.rows[response_id] = row
+        for number, count in counts.items():
+            self.postings[number][row] = count
+            self.document_frequency[number] += 1
+            self.posting_arrays.pop(number, None)
+        self.lengths = None
+
+    def remove(self, response_id):
+        row = self.rows.pop(response_id, None)
+        if row is None:
+            return
+        for number in self.documents[row][2].tolist():
+            del self.postings[number][row]
+            self.document_frequency[number] -= 1
+            self.posting_arrays.pop(number, None)
+        self.documents[row] = None
+        self.free_rows.append(row)
+        self.lengths = None
+
+    def idf(self):
+        # Smoothed, so a term in every response still counts a little
+        return np.log((1 + len(self.rows)) / (1 + np.asarray(self.document_frequency, dtype=np.float64))) + 1
+
+    def posting(self, number):
+        arrays = self.posting_arrays.get(number)
+        if arrays is None:
+            postings = self.postings[number]
+            arrays = self.posting_arrays[number] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            )
+        return arrays
+
+    def compute_lengths(self, idf):
+        # Every row's length in one pass over all (row, term, count) entries
+        documents = [(row, document) for row, document in enumerate(self.documents) if document]
+        if not documents:
+            return np.zeros(len(self.documents))
+        rows = np.repeat([row for row, _ in documents], [len(document[2]) for _, document in documents])
+        numbers = np.concatenate([document[2] for _, document in documents])
+        counts = np.concatenate([document[3] for _, document in documents])
+        weights = counts * idf[numbers]
+        return np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(self.documents)))
+
+    def search(self, text, limit):
+        """[(response ID, text, score)] best first, leaving out responses sharing no term with text"""
+        query = {self.vocabulary[term]: count for term, count in terms(text).items() if term in self.vocabulary}
+        if not query or not self.rows:
+            return []
+
+        idf = self.idf()
+        if self.lengths is None:
+            self.lengths = self.compute_lengths(idf)
+
+        scores = np.zeros(len(self.documents))
+        query_length = 0.0
+        for number, count in query.items():
+            weight = count * idf[number]
+            query_length += weight * weight
+            rows, counts = self.posting(number)
+            # Each row appears once per posting, so plain fancy indexing adds correctly
+            scores[rows] += weight * idf[number] * counts
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        scores = scores[matched] / (self.lengths[matched] * math.sqrt(query_length))
+
+        if len(matched) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(matched))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [
+            (*self.documents[matched[index]][:2], float(scores[index]))
+            for index in top
+        ]
+
+
+_index = None
+_pending = set()  # Response IDs changed since the index last loaded them
+_lock = threading.Lock()
+
+
+def load_index():
+    index = ResponseIndex()
+    with primary():
+        for response_id, text in db.session.query(CannedResponse.id, CannedResponse.response):
+            index.add(response_id, text)
+    logger.info(f'Built the canned response index ({len(index)} responses, {len(index.vocabulary)} terms)')
+    return index
+
+
+def current_index():
+    """The index with every pending change applied; call with _lock held"""
+    global _index
+    if _index is None:
+        events.ensure_listener()
+        _pending.clear()
+        _index = load_index()
+    elif _pending:
+        response_ids = list(_pending)
+        _pending.clear()
+        with primary():
+            texts = dict(
+                db.session.query(CannedResponse.id, CannedResponse.response)
+                    .filter(CannedResponse.id.in_(response_ids))
+                    .all()
+            )
+        for response_id in response_ids:
+            if response_id in texts:
+                _index.add(response_id, texts[response_id])
+            else:
+                _index.remove(response_id)
+    return _index
+
+
+def mark_changed(response_ids):
+    with _lock:
+        _pending.update(response_ids)
+
+
+def reset():
+    global _index
+    with _lock:
+        _index = None
+
+
+def changed(*response_ids):
+    """A canned response was created, edited or deleted; call only after the change is committed"""
+    mark_changed(response_ids)
+    try:
+        if events.is_postgres():
+            events.notify(CHANNEL, json.dumps(response_ids))
+    except Exception as e:
+        # Other processes keep suggesting the old text until they rebuild
+        logger.warning(f"Failed to propagate canned response changes {response_ids}: {e}")
+
+
+def handle_notification(payload):
+    mark_changed(json.loads(payload))
+
+
+# Changes may have been missed while the listener was disconnected
+events.register_channel(CHANNEL, handle_notification, on_connect=reset)
+
+
+def customer_text(ticket_id):
+    """The ticket's latest customer messages (SUGGESTION_MESSAGES of them) as one text"""
+    messages = db.session.query(Message.message) \
+        .filter(Message.ticket_id == ticket_id, Message.authored.is_(False)) \
+        .order_by(Message.date.desc(), Message.id.desc()) \
+        .limit(current_app.config.get('SUGGESTION_MESSAGES', 3)) \
+        .all()
+    return '\n'.join(message for (message,) in messages)
+
+
+def suggest_responses(ticket_id, limit):
+    """[{ID, response, score}] for the canned responses best matching the ticket's latest customer messages"""
+    text = customer_text(ticket_id)
+    if not text:
+        return []
+    with _lock:
+        matches = current_index().search(text, limit)
+    return [
+        {'ID': response_id, 'response': response, 'score': round(score, 4)}
+        for response_id, response, score in matches
+    ]
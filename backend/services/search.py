@@ -0,0 +1,241 @@
+"""
+Ticket search across customer names, marketplace conversation IDs and message bodies.
+
+On PostgreSQL this uses GIN-indexed tsvector expressions (see the ix_*_fts indexes), which
+Postgres keeps current on every insert, so ingested and replied-to messages are searchable
+immediately. Other databases fall back to an in-process inverted index that catches up
+incrementally from the messages table before each search.
+"""
+import bisect
+import html
+import re
+import threading
+from collections import defaultdict
+from extensions import db
+from models import Ticket, Message
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+SNIPPET_WORDS = 20
+TICKET_FIELD_WEIGHT = 2.0
+# ts_headline's hit markers, swapped for <mark> tags once the rest of the snippet is HTML-escaped
+HIT_START, HIT_STOP = '\x02', '\x03'
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_PATTERN.findall(text or '')]
+
+
+def is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+# PostgreSQL full-text search
+# These expressions must stay identical to the ones in the ix_*_fts indexes
+
+def message_vector():
+    return db.func.to_tsvector(db.literal_column("'english'"), Message.message)
+
+
+def ticket_vector():
+    return db.func.to_tsvector(
+        db.literal_column("'simple'"),
+        Ticket.customer_name.op('||')(db.literal_column("' '")).op('||')(Ticket.marketplace_conversation_id)
+    )
+
+
+def to_tsquery(config, term):
+    # Every word must match, each as a prefix so partial names and IDs still hit
+    query = ' & '.join(f'{token}:*' for token in tokenize(term))
+    return db.func.to_tsquery(db.literal_column(f"'{config}'"), query)
+
+
+def postgres_match_clause(term):
+    # A UNION of both index scans rather than an OR, which would force a scan of tickets
+    hits = db.union(
+        db.select(Ticket.ticket_id).where(ticket_vector().op('@@')(to_tsquery('simple', term))),
+        db.select(Message.ticket_id).where(message_vector().op('@@')(to_tsquery('english', term)))
+    )
+    return Ticket.ticket_id.in_(hits)
+
+
+def postgres_search(term, limit):
+    message_query = to_tsquery('english', term)
+    ticket_query = to_tsquery('simple', term)
+    
+    hits = db.union_all(
+        db.select(Message.ticket_id.label('ticket_id'), db.func.ts_rank(message_vector(), message_query).label('rank'))
+            .where(message_vector().op('@@')(message_query)),
+        db.select(Ticket.ticket_id.label('ticket_id'), (db.func.ts_rank(ticket_vector(), ticket_query) * TICKET_FIELD_WEIGHT).label('rank'))
+            .where(ticket_vector().op('@@')(ticket_query))
+    ).subquery()
+    ranked = db.session.execute(
+        db.select(hits.c.ticket_id, db.func.sum(hits.c.rank).label('rank'))
+            .group_by(hits.c.ticket_id)
+            .order_by(db.desc('rank'))
+            .limit(limit)
+    ).all()
+    if not ranked:
+        return []
+    
+    # Highlight only the best matching message of each returned ticket
+    ticket_ids = [row.ticket_id for row in ranked]
+    headline_options = f'StartSel={HIT_START}, StopSel={HIT_STOP}, MaxWords={SNIPPET_WORDS}, MinWords=5'
+    headlines = db.session.execute(
+        db.select(
+            Message.ticket_id,
+            db.func.ts_headline(db.literal_column("'english'"), Message.message, message_query, headline_options)
+        )
+            .where(Message.ticket_id.in_(ticket_ids), message_vector().op('@@')(message_query))
+            .order_by(Message.ticket_id, db.func.ts_rank(message_vector(), message_query).desc())
+            .distinct(Message.ticket_id)
+    ).all()
+    snippets = {ticket_id: escape_snippet(headline) for ticket_id, headline in headlines}
+    
+    return [
+        {'ticketID': row.ticket_id, 'rank': float(row.rank), 'snippet': snippets.get(row.ticket_id)}
+        for row in ranked
+    ]
+
+
+def escape_snippet(headline):
+    # Snippets are customer text, so only the <mark> tags may reach the client as markup
+    return html.escape(headline).replace(HIT_START, '<mark>').replace(HIT_STOP, '</mark>')
+
+
+# In-process fallback
+
+class InvertedIndex:
+    """
+    token -> {ticket_id: weight} postings over ticket fields and message bodies.
+    Words are matched by prefix through a sorted vocabulary, mirroring the `word:*` tsquery.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = defaultdict(lambda: defaultdict(float))
+        self.vocabulary = []
+        self.ticket_tokens = {}
+        self.last_message_id = 0
+        self.last_ticket_update = None
+    
+    def _add(self, token, ticket_id, weight):
+        if token not in self.postings:
+            bisect.insort(self.vocabulary, token)
+        self.postings[token][ticket_id] += weight
+    
+    def _index_ticket(self, ticket_id, customer_name, conversation_id):
+        # Ticket fields can change, so drop the previous postings first
+        for token in self.ticket_tokens.pop(ticket_id, ()):
+            self.postings[token][ticket_id] -= TICKET_FIELD_WEIGHT
+        tokens = set(tokenize(customer_name) + tokenize(conversation_id))
+        for token in tokens:
+            self._add(token, ticket_id, TICKET_FIELD_WEIGHT)
+        self.ticket_tokens[ticket_id] = tokens
+    
+    def refresh(self):
+        # Catch up on everything written since the last search, by any write path
+        ticket_query = db.select(Ticket.ticket_id, Ticket.customer_name, Ticket.marketplace_conversation_id, Ticket.changed_at)
+        if self.last_ticket_update is not None:
+            ticket_query = ticket_query.where(Ticket.changed_at >= self.last_ticket_update)
+        for ticket_id, customer_name, conversation_id, last_updated in db.session.execute(ticket_query):
+            self._index_ticket(ticket_id, customer_name, conversation_id)
+            if self.last_ticket_update is None or last_updated > self.last_ticket_update:
+                self.last_ticket_update = last_updated
+        
+        message_query = db.select(Message.id, Message.ticket_id, Message.message) \
+            .where(Message.id > self.last_message_id) \
+            .order_by(Message.id)
+        for message_id, ticket_id, text in db.session.execute(message_query):
+            for token in tokenize(text):
+                self._add(token, ticket_id, 1.0)
+            self.last_message_id = message_id
+    
+    def _prefix_matches(self, prefix):
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            yield token
+    
+    def match(self, term):
+        """Returns {ticket_id: score} for tickets matching every word of the term"""
+        with self.lock:
+            self.refresh()
+            scores = None
+            for word in tokenize(term):
+                word_scores = defaultdict(float)
+                for token in self._prefix_matches(word):
+                    for ticket_id, weight in self.postings[token].items():
+                        if weight > 0:
+                            word_scores[ticket_id] += weight
+                if scores is None:
+                    scores = word_scores
+                else:
+                    scores = {ticket_id: score + word_scores[ticket_id] for ticket_id, score in scores.items() if ticket_id in word_scores}
+                if not scores:
+                    return {}
+            return scores or {}
+
+
+_fallback_index = InvertedIndex()
+
+
+def highlight(text, term):
+    words = tokenize(term)
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(word) for word in words) + r')\w*', re.IGNORECASE)
+    match = pattern.search(text)
+    if not match:
+        return None
+    
+    # Window of words around the first hit
+    before = text[:match.start()].split()[-5:]
+    after = text[match.start():].split()[:SNIPPET_WORDS - len(before)]
+    snippet = ' '.join(before + after)
+    
+    # Escaped piece by piece, so only the <mark> tags reach the client as markup
+    parts, end = [], 0
+    for hit in pattern.finditer(snippet):
+        parts.append(html.escape(snippet[end:hit.start()]))
+        parts.append(f'<mark>{html.escape(hit.group(0))}</mark>')
+        end = hit.end()
+    parts.append(html.escape(snippet[end:]))
+    return ''.join(parts)
+
+
+def fallback_search(term, limit):
+    scores = _fallback_index.match(term)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+    
+    snippets = {}
+    ticket_ids = [ticket_id for ticket_id, _ in ranked]
+    if ticket_ids:
+        for ticket_id, text in db.session.execute(
+            db.select(Message.ticket_id, Message.message).where(Message.ticket_id.in_(ticket_ids))
+        ):
+            if ticket_id not in snippets:
+                snippet = highlight(text, term)
+                if snippet:
+                    snippets[ticket_id] = snippet
+    
+    return [
+        {'ticketID': ticket_id, 'rank': score, 'snippet': snippets.get(ticket_id)}
+        for ticket_id, score in ranked
+    ]
+
+
+# Public API
+
+def search_match_clause(term):
+    """Filter clause for Ticket queries matching the search term"""
+    if is_postgres():
+        return postgres_match_clause(term)
+    return Ticket.ticket_id.in_(list(_fallback_index.match(term)))
+
+
+def search_tickets(term, limit=20):
+    """Ranked matches as [{'ticketID', 'rank', 'snippet'}], best first"""
+    if not tokenize(term):
+        return []
+    if is_postgres():
+        return postgres_search(term, limit)
+    return fallback_search(term, limit)
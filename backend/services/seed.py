@@ -0,0 +1,171 @@
+"""
+Synthetic data for load testing (`flask --app app seed-data`).
+
+Generates tickets spread over the four marketplaces with a realistic skew: most conversations
+are a few messages long and a few run to hundreds, older tickets are mostly Completed, and
+tags, agents and order histories are sprinkled on. Rows are written with multi-row INSERTs,
+one transaction per batch, so a million messages take minutes rather than hours.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+from extensions import db
+from models import Ticket, Message, Tag, Agent, CannedResponse, FAQAutoResponse, ticket_tags
+
+MARKETPLACES = ('Reverb', 'eBay', 'Amazon', 'Etsy')
+# Share of tickets per marketplace
+MARKETPLACE_WEIGHTS = (4, 3, 2, 1)
+LISTING_URLS = {
+    'Reverb': 'https://reverb.com/item/{}',
+    'eBay': 'https://ebay.com/itm/{}',
+    'Amazon': 'https://amazon.com/dp/B0{}',
+    'Etsy': 'https://etsy.com/listing/{}',
+}
+
+AGENT_NAMES = ('Adam', 'Daniel', 'Priya', 'Marcus', 'Sofia', 'Kenji')
+TAGS = (
+    ('WaitingOnShop', '#FF6B6B'),
+    ('WaitingOnCustomer', '#4ECDC4'),
+    ('AutoResponded', '#95E1D3'),
+    ('WaitingOnRestock', '#FFE66D'),
+    ('Urgent', '#FF0000'),
+    ('Refund', '#A78BFA'),
+    ('Shipping', '#60A5FA'),
+)
+
+FIRST_NAMES = ('Sarah', 'Michael', 'Emily', 'James', 'Olivia', 'Liam', 'Ava', 'Noah', 'Mia', 'Lucas', 'Chloe', 'Ethan')
+LAST_NAMES = ('Johnson', 'Chen', 'Rodriguez', 'Smith', 'Nguyen', 'Garcia', 'Muller', 'Okafor', 'Rossi', 'Kim')
+PRODUCTS = ('guitar pedal', 'amp', 'set of strings', 'tuner', 'capo', 'drum throne', 'synth', 'microphone', 'cable')
+CUSTOMER_LINES = (
+    "Hi, I ordered a {product} {days} days ago and haven't received any shipping updates.",
+    'Can you tell me if the {product} is still in stock?',
+    'The {product} arrived damaged. The box was crushed and it does not power on.',
+    'I would like to return the {product}, it is not what I expected.',
+    'Is there a way to combine shipping if I also buy a {product}?',
+    'Thanks, the tracking number works now.',
+    'Any update on my refund for the {product}?',
+)
+CANNED_RESPONSES = (
+    'Thank you for contacting us! We will get back to you shortly.',
+    'Your order has been shipped and you should receive tracking information soon.',
+    'We apologize for the inconvenience. Let us make this right for you.',
+)
+FAQ_AUTO_RESPONSE = 'Thank you for your message! We will review your inquiry and get back to you within 24 hours.'
+AGENT_LINES = (
+    'Thanks for reaching out! Let me check on your order right away.',
+    'Your {product} shipped today, you should receive tracking information within 24 hours.',
+    "I'm sorry about that. Could you send a photo of the damage so we can make this right?",
+    "We've issued the refund, it can take 3-5 business days to appear.",
+    'Yes, the {product} is in stock and ships the same day.',
+)
+
+
+def message_count(rng):
+    # Long-tailed: over half of conversations are a single message, a few run past a hundred
+    return min(int(rng.paretovariate(1.2)), 300)
+
+
+def ensure_reference_data():
+    """
+    Create the seed agents and tags that don't exist yet, and canned responses and the FAQ text if
+    there are none. Returns (agent IDs, tag IDs).
+    """
+    agents = {agent.name: agent for agent in Agent.query.filter(Agent.name.in_(AGENT_NAMES))}
+    tags = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_([name for name, _ in TAGS]))}
+    for name in AGENT_NAMES:
+        if name not in agents:
+            agents[name] = Agent(name=name)
+            db.session.add(agents[name])
+    for name, color in TAGS:
+        if name not in tags:
+            tags[name] = Tag(name=name, color=color)
+            db.session.add(tags[name])
+    if not CannedResponse.query.first():
+        db.session.add_all([CannedResponse(response=response) for response in CANNED_RESPONSES])
+    if not FAQAutoResponse.query.first():
+        db.session.add(FAQAutoResponse(faq_auto_response=FAQ_AUTO_RESPONSE))
+    db.session.commit()
+    return [agent.id for agent in agents.values()], [tag.id for tag in tags.values()]
+
+
+def generate_batch(rng, count, agent_ids, tag_ids, now, days):
+    """Rows for count tickets: (ticket rows, message rows, ticket_tags rows)"""
+    tickets, messages, links = [], [], []
+    for _ in range(count):
+        ticket_id = str(uuid.uuid4())
+        marketplace = rng.choices(MARKETPLACES, MARKETPLACE_WEIGHTS)[0]
+        age = timedelta(days=days) * rng.random() ** 2  # skewed towards recent tickets
+        started = now - age
+        product = rng.choice(PRODUCTS)
+
+        n_messages = message_count(rng)
+        date = started
+        for index in range(n_messages):
+            authored = index > 0 and rng.random() < 0.45
+            lines = AGENT_LINES if authored else CUSTOMER_LINES
+            messages.append({
+                'ticket_id': ticket_id,
+                'message': rng.choice(lines).format(product=product, days=rng.randint(2, 14)),
+                'authored': authored,
+                'date': date,
+                'image_attachments': [],
+                'external_id': None if authored else f'seed-{uuid.uuid4().hex}',
+            })
+            date = min(date + timedelta(minutes=rng.expovariate(1 / 240)), now)
+
+        # The older the conversation, the more likely it's done
+        if age > timedelta(days=14) and rng.random() < 0.9:
+            status = 'Completed'
+        else:
+            status = rng.choices(('New', 'In Progress', 'Completed'), (5, 3, 2))[0]
+
+        tickets.append({
+            'ticket_id': ticket_id,
+            'marketplace': marketplace,
+            'marketplace_conversation_id': f'SEED-{marketplace.upper()}-{uuid.uuid4().hex[:16]}',
+            'customer_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'priority': rng.choices(('Low', 'Medium', 'High'), (3, 6, 1))[0],
+            'ticket_status': status,
+            'assigned_to': rng.choice(agent_ids) if agent_ids and rng.random() < 0.7 else None,
+            'conversation_start_date': started,
+            'last_updated_date': date,
+            'order_history': [f'ORD-{rng.randint(1000, 99999)}' for _ in range(rng.choice((0, 1, 1, 2, 3)))],
+            'related_listing_url': LISTING_URLS[marketplace].format(rng.randint(10000, 999999)),
+        })
+        for tag_id in rng.sample(tag_ids, min(len(tag_ids), rng.choices((0, 1, 2, 3), (4, 4, 2, 1))[0])):
+            links.append({'ticket_id': ticket_id, 'tag_id': tag_id})
+
+    return tickets, messages, links
+
+
+def seed_tickets(count, days=365, batch_size=1000, seed=None, progress=None):
+    """
+    Insert count synthetic tickets with their messages and tags, committing every batch_size tickets.
+    progress(tickets_so_far) is called after each batch. Returns {'tickets', 'messages', 'tags'} counts.
+    """
+    rng = random.Random(seed)
+    agent_ids, tag_ids = ensure_reference_data()
+    # Stable order, so a given seed makes the same choices
+    agent_ids, tag_ids = sorted(agent_ids), sorted(tag_ids)
+    now = datetime.utcnow()
+    totals = {'tickets': 0, 'messages': 0, 'tags': 0}
+
+    for start in range(0, count, batch_size):
+        tickets, messages, links = generate_batch(rng, min(batch_size, count - start), agent_ids, tag_ids, now, days)
+        try:
+            db.session.execute(db.insert(Ticket), tickets)
+            if messages:
+                db.session.execute(db.insert(Message), messages)
+            if links:
+                db.session.execute(ticket_tags.insert(), links)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        totals['tickets'] += len(tickets)
+        totals['messages'] += len(messages)
+        totals['tags'] += len(links)
+        if progress:
+            progress(totals['tickets'])
+
+    return totals
@@ -0,0 +1,148 @@
+"""
+Set-based updates of many tickets at once (PATCH /api/tickets/bulk).
+
+Whatever the number of tickets, a bulk update runs a fixed number of statements: one SELECT to
+find which tickets exist, one UPDATE on tickets, one DELETE and one INSERT ... SELECT on
+ticket_tags, and one SELECT to report the resulting tags.
+"""
+from datetime import datetime
+from extensions import db
+from models import Ticket, Tag, Agent, ticket_tags
+from services.ingest import dialect_insert
+
+MAX_BULK_TICKETS = 1000
+
+TICKET_STATUSES = ('New', 'In Progress', 'Completed')
+PRIORITIES = ('Low', 'Medium', 'High')
+
+
+class BulkUpdateError(ValueError):
+    """The operation itself is invalid, so no ticket was changed"""
+
+
+def parse_tag_ids(data, field):
+    tag_ids = data.get(field)
+    if tag_ids is None:
+        return set()
+    if not isinstance(tag_ids, list) or not all(isinstance(tag_id, str) for tag_id in tag_ids):
+        raise BulkUpdateError(f'{field} must be a list of tag IDs')
+    return set(tag_ids)
+
+
+def parse_bulk_update(data):
+    """Validates the request body; returns (ticket_ids, values, add_tag_ids, remove_tag_ids)"""
+    if not isinstance(data, dict):
+        raise BulkUpdateError('Request body must be an object')
+
+    ticket_ids = data.get('ticketIDs')
+    if not isinstance(ticket_ids, list) or not ticket_ids:
+        raise BulkUpdateError('ticketIDs must be a non-empty list')
+    if len(ticket_ids) > MAX_BULK_TICKETS:
+        raise BulkUpdateError(f'At most {MAX_BULK_TICKETS} tickets can be updated at once')
+
+    values = {}
+    if 'ticketStatus' in data:
+        if data['ticketStatus'] not in TICKET_STATUSES:
+            raise BulkUpdateError(f"Invalid ticketStatus: {data['ticketStatus']}")
+        values[Ticket.ticket_status] = data['ticketStatus']
+
+    if 'priority' in data:
+        if data['priority'] not in PRIORITIES:
+            raise BulkUpdateError(f"Invalid priority: {data['priority']}")
+        values[Ticket.priority] = data['priority']
+
+    if 'assignedTo' in data:
+        # Agent name, or empty string to unassign
+        if data['assignedTo']:
+            agent = Agent.query.filter_by(name=data['assignedTo']).first()
+            if not agent:
+                raise BulkUpdateError(f"Agent not found: {data['assignedTo']}")
+            values[Ticket.assigned_to] = agent.id
+        else:
+            values[Ticket.assigned_to] = None
+
+    add_tag_ids = parse_tag_ids(data, 'addTags')
+    remove_tag_ids = parse_tag_ids(data, 'removeTags')
+    if add_tag_ids & remove_tag_ids:
+        raise BulkUpdateError('A tag cannot be both added and removed')
+    if add_tag_ids:
+        found = {tag_id for (tag_id,) in db.session.query(Tag.id).filter(Tag.id.in_(add_tag_ids))}
+        missing = add_tag_ids - found
+        if missing:
+            raise BulkUpdateError(f"Tags not found: {', '.join(sorted(missing))}")
+
+    if not values and not add_tag_ids and not remove_tag_ids:
+        raise BulkUpdateError('No changes requested')
+
+    return ticket_ids, values, add_tag_ids, remove_tag_ids
+
+
+def bulk_update_tickets(ticket_ids, values, add_tag_ids=(), remove_tag_ids=()):
+    """
+    Applies the changes to every existing ticket in ticket_ids and commits. Returns
+    (ticket_ids that were updated, {ticket_id: error} for the ones that weren't, the new last_updated_date).
+    """
+    failures = {}
+    requested = []
+    seen = set()
+    for ticket_id in ticket_ids:
+        if not isinstance(ticket_id, str):
+            failures[str(ticket_id)] = 'Invalid ticket ID'
+        elif ticket_id not in seen:
+            # A ticket listed more than once is updated, and reported, once
+            seen.add(ticket_id)
+            requested.append(ticket_id)
+
+    existing = {
+        ticket_id for (ticket_id,) in db.session.query(Ticket.ticket_id).filter(Ticket.ticket_id.in_(requested))
+    } if requested else set()
+    for ticket_id in requested:
+        if ticket_id not in existing:
+            failures[ticket_id] = 'Ticket not found'
+    updated_ids = [ticket_id for ticket_id in requested if ticket_id in existing]
+    if not updated_ids:
+        return [], failures, None
+
+    # Tag changes don't touch the tickets row, so last_updated_date is always bumped for the change feed
+    updated_at = datetime.utcnow()
+    db.session.execute(
+        db.update(Ticket)
+            .where(Ticket.ticket_id.in_(updated_ids))
+            .values({**values, Ticket.last_updated_date: updated_at})
+            .execution_options(synchronize_session=False)
+    )
+
+    if remove_tag_ids:
+        db.session.execute(
+            ticket_tags.delete().where(
+                ticket_tags.c.ticket_id.in_(updated_ids),
+                ticket_tags.c.tag_id.in_(remove_tag_ids)
+            )
+        )
+
+    if add_tag_ids:
+        # Every (ticket, tag) pair, skipping the ones already linked
+        pairs = db.select(Ticket.ticket_id, Tag.id).join(Tag, db.true()).where(
+            Ticket.ticket_id.in_(updated_ids),
+            Tag.id.in_(add_tag_ids)
+        )
+        db.session.execute(
+            dialect_insert(ticket_tags)
+                .from_select(['ticket_id', 'tag_id'], pairs)
+                .on_conflict_do_nothing()
+        )
+
+    db.session.commit()
+    return updated_ids, failures, updated_at
+
+
+def tags_by_ticket(ticket_ids):
+    """{ticket_id: [tag dict, ...]} for the given tickets, in one query"""
+    tags = {ticket_id: [] for ticket_id in ticket_ids}
+    rows = db.session.query(ticket_tags.c.ticket_id, Tag) \
+        .join(Tag, Tag.id == ticket_tags.c.tag_id) \
+        .filter(ticket_tags.c.ticket_id.in_(ticket_ids)) \
+        .order_by(Tag.name)
+    for ticket_id, tag in rows:
+        tags[ticket_id].append(tag.to_dict())
+    return tags
@@ -0,0 +1,157 @@
+"""
+Streaming export of tickets with their conversations (GET /api/tickets/export).
+
+One query joins the filtered tickets to their messages and is read through a server-side cursor
+(yield_per, which implies stream_results), EXPORT_BATCH_SIZE rows at a time. Rows are written
+out as they arrive, so the export's memory use stays the same however many messages it covers.
+
+CSV has a row per message with the ticket's columns repeated (a ticket without messages gets one
+row with empty message columns). NDJSON has a line per ticket with its messages nested, in the
+shape of GET /api/tickets/<id> plus each message's externalID.
+"""
+import csv
+import io
+import json
+import logging
+from flask import current_app
+from extensions import db
+from models import Ticket, Message, Agent, Tag, ticket_tags, serialize_attachments
+from services.ticket_queries import apply_ticket_filters
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+CSV_COLUMNS = (
+    'ticketID', 'marketplace', 'marketplaceConversationID', 'customerName', 'priority', 'ticketStatus',
+    'assignedTo', 'tags', 'conversationStartDate', 'lastUpdatedDate', 'orderHistory', 'relatedListingURL',
+    'messageDate', 'authored', 'message', 'attachments', 'deliveryStatus', 'externalID'
+)
+# Written out once the buffer passes this many characters
+FLUSH_SIZE = 64 * 1024
+# Spreadsheets run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_query(args):
+    tag_names = db.select(db.func.aggregate_strings(Tag.name, ';')) \
+        .select_from(ticket_tags.join(Tag, Tag.id == ticket_tags.c.tag_id)) \
+        .where(ticket_tags.c.ticket_id == Ticket.ticket_id) \
+        .correlate(Ticket) \
+        .scalar_subquery()
+    query = db.select(
+        Ticket.ticket_id, Ticket.marketplace, Ticket.marketplace_conversation_id, Ticket.customer_name,
+        Ticket.priority, Ticket.ticket_status, Agent.name.label('agent_name'), tag_names.label('tag_names'),
+        Ticket.conversation_start_date, Ticket.last_updated_date, Ticket.order_history, Ticket.related_listing_url,
+        Message.date.label('message_date'), Message.authored, Message.message, Message.image_attachments,
+        Message.delivery_status, Message.external_id
+    ) \
+        .select_from(Ticket) \
+        .outerjoin(Agent, Agent.id == Ticket.assigned_to) \
+        .outerjoin(Message, Message.ticket_id == Ticket.ticket_id)
+    # Same order as the ticket list, each conversation oldest message first
+    return apply_ticket_filters(query, args).order_by(
+        Ticket.last_updated_date.desc(), Ticket.ticket_id.desc(), Message.date, Message.id
+    )
+
+
+def stream_rows(args):
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    result = db.session.execute(export_query(args).execution_options(yield_per=batch_size))
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def ticket_fields(row):
+    return {
+        'ticketID': row.ticket_id,
+        'marketplace': row.marketplace,
+        'marketplaceConversationID': row.marketplace_conversation_id,
+        'customerName': row.customer_name,
+        'priority': row.priority,
+        'ticketStatus': row.ticket_status,
+        'assignedTo': row.agent_name or '',
+        'tags': sorted(row.tag_names.split(';')) if row.tag_names else [],
+        'conversationStartDate': row.conversation_start_date.isoformat(),
+        'lastUpdatedDate': row.last_updated_date.isoformat(),
+        'orderHistory': row.order_history or [],
+        'relatedListingURL': row.related_listing_url
+    }
+
+
+def message_fields(row):
+    return {
+        'message': row.message,
+        'authored': row.authored,
+        'date': row.message_date.isoformat(),
+        **serialize_attachments(row.image_attachments),
+        'deliveryStatus': row.delivery_status,
+        # The marketplace's message ID, so re-importing an export (flask import-conversations) skips messages it has
+        'externalID': row.external_id
+    }
+
+
+def safe_cell(value):
+    # Customer-written text could otherwise run as a formula when the CSV is opened in a spreadsheet
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def generate_csv(args):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for row in stream_rows(args):
+        ticket = ticket_fields(row)
+        message = message_fields(row) if row.message_date is not None else None
+        writer.writerow([
+            ticket['ticketID'], ticket['marketplace'], ticket['marketplaceConversationID'],
+            safe_cell(ticket['customerName']), ticket['priority'], ticket['ticketStatus'], ticket['assignedTo'],
+            ';'.join(ticket['tags']), ticket['conversationStartDate'], ticket['lastUpdatedDate'],
+            ';'.join(str(order) for order in ticket['orderHistory']), ticket['relatedListingURL'] or '',
+            *([
+                message['date'], message['authored'], safe_cell(message['message']),
+                ' '.join(message['imageAttachments'] + [f"/api/attachments/{a['ID']}" for a in message['attachments']]),
+                message['deliveryStatus'] or '', message['externalID'] or ''
+            ] if message else [''] * 6)
+        ])
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generate_ndjson(args):
+    buffer = io.StringIO()
+    ticket = None
+    for row in stream_rows(args):
+        if ticket is None or ticket['ticketID'] != row.ticket_id:
+            # Rows arrive grouped by ticket, so only one conversation is held at a time
+            if ticket is not None:
+                buffer.write(json.dumps(ticket) + '\n')
+            ticket = {**ticket_fields(row), 'messages': []}
+        if row.message_date is not None:
+            ticket['messages'].append(message_fields(row))
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if ticket is not None:
+        buffer.write(json.dumps(ticket) + '\n')
+    yield buffer.getvalue()
+
+
+def generate_export(export_format, args):
+    """Chunks of the export as text; logs and re-raises a failure part way, which cuts the download short"""
+    generate = generate_csv if export_format == 'csv' else generate_ndjson
+    try:
+        yield from generate(args)
+    except Exception:
+        logger.exception(f'{export_format} export failed part way')
+        raise
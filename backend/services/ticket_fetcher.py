@@ -1,40 +1,211 @@
 import logging
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
+from flask import current_app
 from extensions import db
-from models import Ticket, Message
-import requests
+from models import Ticket, Message, SyncState
+from services.connectors import build_connectors
+from services.fetch_engine import FetchEngine
+from services.ingest import ingest_conversations
+from services.leader import LeaderLease
+from services.archive import archive_tickets
+from services import metrics
 
 logger = logging.getLogger(__name__)
 
+# Built on first use and kept for the life of the process so HTTP sessions stay pooled
+_engine = None
+_scheduler = None
+_lease = None
+
+
+class AdaptiveInterval:
+    """
+    Polling interval for one marketplace: halves while polls bring in new messages,
+    grows by half while they don't, and doubles after a failed poll.
+    """
+    
+    def __init__(self, initial, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.seconds = min(max(initial, minimum), maximum)
+    
+    def update(self, new_messages, failed=False):
+        if failed:
+            seconds = self.seconds * 2
+        elif new_messages:
+            seconds = self.seconds / 2
+        else:
+            seconds = self.seconds * 1.5
+        self.seconds = min(max(seconds, self.minimum), self.maximum)
+        return self.seconds
+
+
 def start_scheduler(app):
-    from config import Config
+    """
+    Poll every marketplace on its own adaptive interval, from a single leader process.
+    
+    Safe to call in every process (web workers, worker.py): each one competes for the
+    scheduler lease, and only the current holder polls. If it dies the lease expires and
+    another process takes over within SCHEDULER_LEASE_TTL seconds.
+    """
+    global _scheduler, _lease
+    config = app.config
     
     scheduler = BackgroundScheduler()
+    lease = LeaderLease('ticket_fetcher', ttl=config.get('SCHEDULER_LEASE_TTL', 30))
     
-    # Wrap the job in app context
-    def scheduled_job():
-        with app.app_context():
-            fetch_messages()
+    def renew_lease():
+        with app.app_context(), metrics.time_job('scheduler_lease'):
+            lease.renew()
     
-    # Schedule the job to run every X minutes (from config)
-    interval_minutes = Config.TICKET_FETCH_INTERVAL
+    # Renewed well within the TTL, so a healthy leader never loses it
     scheduler.add_job(
-        func=scheduled_job,
+        func=renew_lease,
         trigger="interval",
-        minutes=interval_minutes,
-        id='fetch_tickets_job',
-        name='Fetch and create tickets from some external API',
-        replace_existing=True
+        seconds=lease.ttl / 3,
+        id='scheduler_lease',
+        name='Renew or take over the ticket fetcher lease',
+        replace_existing=True,
+        max_instances=1
     )
     
+    with app.app_context():
+        lease.renew()
+        marketplaces = [connector.marketplace for connector in get_engine().connectors]
+    
+    # One job per marketplace, each rescheduled after every poll
+    for marketplace in marketplaces:
+        interval = AdaptiveInterval(
+            config.get('TICKET_FETCH_INTERVAL', 5) * 60,
+            config.get('FETCH_MIN_INTERVAL', 30),
+            config.get('FETCH_MAX_INTERVAL', 900)
+        )
+        scheduler.add_job(
+            func=poll_marketplace_job,
+            args=(app, scheduler, lease, marketplace, interval),
+            trigger="interval",
+            seconds=interval.seconds,
+            next_run_time=datetime.now(),
+            id=f'fetch_{marketplace}',
+            name=f'Fetch and ingest {marketplace} conversations',
+            replace_existing=True,
+            max_instances=1
+        )
+    
+    # Moving old Completed tickets out of the working set rides on the same lease
+    if config.get('ARCHIVE_INTERVAL', 3600) > 0:
+        scheduler.add_job(
+            func=archive_job,
+            args=(app, lease),
+            trigger="interval",
+            seconds=config.get('ARCHIVE_INTERVAL', 3600),
+            id='archive_tickets',
+            name='Archive tickets completed long ago',
+            replace_existing=True,
+            max_instances=1
+        )
+    
     scheduler.start()
-    logger.info(f"Ticket fetcher scheduler started (runs every {interval_minutes} minutes)")
+    _scheduler, _lease = scheduler, lease
+    logger.info(f"Ticket fetcher scheduler started for {', '.join(marketplaces) or 'no marketplaces'} ({lease.holder})")
+    return scheduler
+
+
+def stop_scheduler(app):
+    """Stop polling and hand the lease over straight away"""
+    global _scheduler, _lease
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=True)
+    if _lease is not None:
+        with app.app_context():
+            _lease.release()
+    _scheduler, _lease = None, None
+
+
+def poll_marketplace_job(app, scheduler, lease, marketplace, interval):
+    if not lease.held:
+        return
+    with app.app_context(), metrics.time_job(f'fetch_{marketplace}'):
+        result = poll_marketplaces([marketplace])[marketplace]
     
-    # Optional: Run once on startup
-    # scheduled_job()
+    previous = interval.seconds
+    seconds = interval.update(result['new_messages'], failed=result['error'] is not None)
+    if seconds != previous:
+        logger.info(f"Polling {marketplace} every {seconds:.0f}s")
+        scheduler.reschedule_job(f'fetch_{marketplace}', trigger='interval', seconds=seconds)
+
+
+def archive_job(app, lease):
+    if not lease.held:
+        return
+    with app.app_context():
+        try:
+            with metrics.time_job('archive_tickets'):
+                archive_tickets()
+        except Exception as e:
+            logger.error(f"Archiving tickets failed: {e}")
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        config = current_app.config
+        _engine = FetchEngine(
+            build_connectors(config),
+            max_workers=config.get('FETCH_MAX_WORKERS', 4),
+            connector_timeout=config.get('FETCH_CONNECTOR_TIMEOUT', 60)
+        )
+    return _engine
 
-def fetch_messages(api_key):
-    # This is a placeholder function that you'd use to fetch & format messages into Ticket objects
-    return []
 
+def load_cursors(connectors):
+    states = {
+        (state.marketplace, state.account): state
+        for state in SyncState.query.filter(SyncState.marketplace.in_([c.marketplace for c in connectors]))
+    }
+    cursors = {}
+    for connector in connectors:
+        state = states.get((connector.marketplace, connector.account))
+        cursors[connector.marketplace] = state.to_cursor() if state else None
+    return cursors
+
+
+def fetch_messages(marketplaces=None):
+    """
+    Poll the configured marketplaces (default: all of them) concurrently for changes since their stored sync cursors.
+    Returns {marketplace: {'conversations', 'cursor', 'error', 'duration'}} (see FetchEngine.fetch_all)
+    """
+    engine = get_engine()
+    return engine.fetch_all(load_cursors(engine.connectors), marketplaces)
+
+
+def poll_marketplaces(marketplaces=None):
+    """
+    Fetch deltas from the marketplaces and ingest them, advancing each sync cursor with its data.
+    Returns {marketplace: {'new_messages': count, 'error': str or None}}
+    """
+    accounts = {connector.marketplace: connector.account for connector in get_engine().connectors}
+    summary = {}
+    
+    for marketplace, result in fetch_messages(marketplaces).items():
+        if result['error']:
+            logger.warning(f"Skipping {marketplace} this poll: {result['error']}")
+            summary[marketplace] = {'new_messages': 0, 'error': result['error']}
+            continue
+        try:
+            totals = ingest_conversations(result['conversations'], sync_cursor={
+                'marketplace': marketplace,
+                'account': accounts[marketplace],
+                'cursor': result['cursor'],
+            })
+            summary[marketplace] = {'new_messages': len(totals['new_messages']), 'error': None}
+            metrics.INGESTED_ROWS.inc(len(totals['ticket_ids']), marketplace=marketplace, kind='conversations')
+            metrics.INGESTED_ROWS.inc(len(totals['new_ticket_ids']), marketplace=marketplace, kind='new_tickets')
+            metrics.INGESTED_ROWS.inc(len(totals['new_messages']), marketplace=marketplace, kind='new_messages')
+        except Exception as e:
+            # One marketplace failing to ingest shouldn't stop the others
+            logger.error(f"Ingesting {marketplace} failed: {e}")
+            summary[marketplace] = {'new_messages': 0, 'error': str(e)}
+    
+    return summary
@@ -0,0 +1,247 @@
+"""
+Ticket list queries shared by the ticket routes: FilterBar filters, the summary projection,
+keyset pagination and the change feed.
+"""
+from datetime import datetime, timedelta
+import base64
+import json
+from extensions import db
+from models import Ticket, Message, Agent, TicketTombstone, ticket_tags
+from services.query_loading import with_profile, TICKET_SUMMARY
+from services.search import search_match_clause
+
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+MESSAGE_PREVIEW_LENGTH = 140
+
+# Query parameters handled by apply_ticket_filters
+TICKET_FILTER_PARAMS = ('search', 'ticketStatus', 'priority', 'assignedTo', 'tags', 'startDate', 'endDate')
+
+
+def has_ticket_filters(args):
+    return any(args.get(param) for param in TICKET_FILTER_PARAMS)
+
+
+def apply_ticket_filters(query, args):
+    """Apply the FilterBar query parameters to a Ticket query"""
+    search = args.get('search', '').strip()
+    if search:
+        # Indexed search over customer name, marketplace conversation ID and message bodies
+        query = query.filter(search_match_clause(search))
+    
+    ticket_status = args.get('ticketStatus')
+    if ticket_status:
+        query = query.filter(Ticket.ticket_status == ticket_status)
+    
+    priority = args.get('priority')
+    if priority:
+        query = query.filter(Ticket.priority == priority)
+    
+    assigned_to = args.get('assignedTo')
+    if assigned_to:
+        # get the agent id
+        agent = Agent.query.filter_by(name=assigned_to).first()
+        if agent:
+            query = query.filter(Ticket.assigned_to == agent.id)
+    
+    tags_param = args.get('tags')
+    if tags_param:
+        try:
+            tag_list = json.loads(tags_param)
+            if tag_list and len(tag_list) > 0:
+                # Filter tickets that have ANY of the specified tags
+                tag_ids = [tag.get('ID') for tag in tag_list if tag.get('ID')]
+                if tag_ids:
+                    # Use a subquery rather than a join so a ticket matching several tags is returned once
+                    tagged = db.select(ticket_tags.c.ticket_id).where(ticket_tags.c.tag_id.in_(tag_ids))
+                    query = query.filter(Ticket.ticket_id.in_(tagged))
+        except json.JSONDecodeError:
+            pass
+    
+    start_date = args.get('startDate')
+    if start_date:
+        try:
+            start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+            query = query.filter(Ticket.conversation_start_date >= start)
+        except ValueError:
+            pass
+    
+    end_date = args.get('endDate')
+    if end_date:
+        try:
+            end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+            query = query.filter(Ticket.conversation_start_date <= end)
+        except ValueError:
+            pass
+    
+    return query
+
+
+def encode_cursor(last_updated_date, ticket_id):
+    raw = json.dumps([last_updated_date.isoformat(), ticket_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        last_updated, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(last_updated), ticket_id
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def ticket_summary_query(args):
+    """
+    Filtered query whose rows are (Ticket, message_count, preview, preview_authored, preview_date),
+    i.e. everything Ticket.to_summary_dict needs in one round trip plus the tags/agent loads.
+    """
+    message_count = db.select(db.func.count(Message.id)) \
+        .where(Message.ticket_id == Ticket.ticket_id) \
+        .correlate(Ticket) \
+        .scalar_subquery()
+    last_message_id = db.select(Message.id) \
+        .where(Message.ticket_id == Ticket.ticket_id) \
+        .order_by(Message.date.desc(), Message.id.desc()) \
+        .limit(1) \
+        .correlate(Ticket) \
+        .scalar_subquery()
+    last_message = db.aliased(Message)
+    
+    query = with_profile(Ticket.query, TICKET_SUMMARY).select_from(Ticket).outerjoin(last_message, last_message.id == last_message_id).add_columns(
+        message_count.label('message_count'),
+        db.func.substr(last_message.message, 1, MESSAGE_PREVIEW_LENGTH).label('preview'),
+        last_message.authored.label('preview_authored'),
+        last_message.date.label('preview_date')
+    )
+    return apply_ticket_filters(query, args)
+
+
+def summary_rows_to_dicts(rows):
+    tickets = []
+    for ticket, count, preview, preview_authored, preview_date in rows:
+        last_message_preview = None
+        if preview_date is not None:
+            last_message_preview = {
+                'message': preview,
+                'authored': preview_authored,
+                'date': preview_date.isoformat()
+            }
+        tickets.append(ticket.to_summary_dict(count, last_message_preview))
+    return tickets
+
+
+def ticket_page_query(args, limit, cursor=None):
+    """
+    Keyset pagination over (last_updated_date, ticket_id), newest first, with the same filters as get_tickets.
+    One extra row is fetched so the caller can tell whether there is a next page.
+    """
+    query = ticket_summary_query(args)
+    
+    if cursor:
+        last_updated, ticket_id = decode_cursor(cursor)
+        # Row-value comparison so the planner can seek ix_tickets_last_updated directly
+        query = query.filter(db.tuple_(Ticket.last_updated_date, Ticket.ticket_id) < (last_updated, ticket_id))
+    
+    return query.order_by(Ticket.last_updated_date.desc(), Ticket.ticket_id.desc()).limit(limit + 1)
+
+
+def get_ticket_page(args, limit, cursor=None):
+    """
+    Returns the summary dicts for one page and the cursor for the next one (None on the last page).
+    """
+    rows = ticket_page_query(args, limit, cursor).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    tickets = summary_rows_to_dicts(rows)
+    
+    next_cursor = None
+    if has_more:
+        last_ticket = rows[-1][0]
+        next_cursor = encode_cursor(last_ticket.last_updated_date, last_ticket.ticket_id)
+    
+    return tickets, next_cursor
+
+
+# Message timeline
+
+def get_message_page(ticket_id, limit, cursor=None):
+    """
+    One page of a ticket's conversation, newest first by (date, id) so it's read straight off
+    ix_messages_ticket_id_date. The page itself is returned in chronological order, with the
+    cursor for the next (older) page or None when the start of the conversation was reached.
+    """
+    query = Message.query.filter(Message.ticket_id == ticket_id)
+    
+    if cursor:
+        date, message_id = decode_cursor(cursor)
+        query = query.filter(db.tuple_(Message.date, Message.id) < (date, message_id))
+    
+    messages = query.order_by(Message.date.desc(), Message.id.desc()).limit(limit + 1).all()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    
+    next_cursor = encode_cursor(messages[-1].date, messages[-1].id) if has_more else None
+    return [message.to_dict() for message in reversed(messages)], next_cursor
+
+
+# Change feed
+# Tokens are the newest change the previous response could read, so a replica that lags doesn't
+# hand out a token past changes it hasn't replayed yet. Changes are re-sent for a short overlap,
+# because a transaction can commit slightly after the timestamp it wrote.
+
+CHANGE_FEED_OVERLAP = timedelta(seconds=10)
+MAX_CHANGES = 1000
+# Token when there's nothing to read yet, so every later change is sent
+CHANGE_FEED_START = datetime(1970, 1, 1)
+
+
+def encode_change_token(timestamp):
+    return base64.urlsafe_b64encode(timestamp.isoformat().encode()).decode()
+
+
+def decode_change_token(token):
+    try:
+        return datetime.fromisoformat(base64.urlsafe_b64decode(token.encode()).decode())
+    except (ValueError, TypeError):
+        raise ValueError('Invalid updatedSince token')
+
+
+def current_change_token():
+    """Token for the newest ticket change or deletion visible to this session; read before the data it covers"""
+    newest = db.session.query(
+        db.select(db.func.max(Ticket.changed_at)).scalar_subquery(),
+        db.select(db.func.max(TicketTombstone.deleted_at)).scalar_subquery()
+    ).one()
+    return encode_change_token(max((stamp for stamp in newest if stamp is not None), default=CHANGE_FEED_START))
+
+
+def get_ticket_changes(args, since):
+    """
+    Tickets changed since the given time.
+    Returns (summaries of changed tickets matching the filters, IDs to drop from the view, resync)
+    where the IDs are deleted tickets plus changed tickets that no longer match the filters.
+    resync is True when there are too many changes and the client should reload the list instead.
+    """
+    since = since - CHANGE_FEED_OVERLAP
+    changed_ids = [
+        ticket_id for (ticket_id,) in db.session.query(Ticket.ticket_id)
+            .filter(Ticket.changed_at >= since)
+            .limit(MAX_CHANGES + 1)
+    ]
+    if len(changed_ids) > MAX_CHANGES:
+        return [], [], True
+    
+    tickets = []
+    if changed_ids:
+        rows = ticket_summary_query(args).filter(Ticket.ticket_id.in_(changed_ids)) \
+            .order_by(Ticket.last_updated_date.desc(), Ticket.ticket_id.desc()) \
+            .all()
+        tickets = summary_rows_to_dicts(rows)
+    
+    matched = {ticket['ticketID'] for ticket in tickets}
+    deleted = [
+        ticket_id for (ticket_id,) in db.session.query(TicketTombstone.ticket_id)
+            .filter(TicketTombstone.deleted_at >= since)
+    ]
+    return tickets, [ticket_id for ticket_id in changed_ids if ticket_id not in matched] + deleted, False
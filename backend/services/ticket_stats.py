@@ -0,0 +1,97 @@
+"""
+Ticket counts by status, priority, marketplace, assigned agent and tag (GET /api/tickets/stats).
+
+Unfiltered counts on PostgreSQL are read from the ticket_stats rollup, which the statement-level
+triggers in models.py keep current, so the common view reads a few dozen rows however many tickets
+there are. Filtered counts, and all counts on other databases, are computed live: one GROUP BY per
+dimension over the filtered tickets, in a single round trip.
+"""
+from extensions import db
+from models import Ticket, TicketStat, ticket_tags
+from services import reference_cache
+from services.events import is_postgres
+from services.ticket_queries import apply_ticket_filters, has_ticket_filters
+
+# Dimension name in ticket_stats -> key in the response
+DIMENSION_KEYS = {
+    'status': 'ticketStatus',
+    'priority': 'priority',
+    'marketplace': 'marketplace',
+    'agent': 'assignedTo',
+    'tag': 'tags',
+}
+
+
+def live_counts(args=None):
+    """[(dimension, value, count), ...] computed from the (filtered) tickets themselves"""
+    filtered = apply_ticket_filters(
+        db.session.query(
+            Ticket.ticket_id,
+            Ticket.ticket_status,
+            Ticket.priority,
+            Ticket.marketplace,
+            db.func.coalesce(Ticket.assigned_to, '').label('assigned_to')
+        ),
+        args or {}
+    ).cte('filtered')
+    
+    def count_by(dimension, column):
+        return db.select(db.literal(dimension).label('dimension'), column.label('value'), db.func.count()) \
+            .select_from(filtered) \
+            .group_by(column)
+    
+    tag_counts = db.select(db.literal('tag').label('dimension'), ticket_tags.c.tag_id.label('value'), db.func.count()) \
+        .select_from(filtered.join(ticket_tags, ticket_tags.c.ticket_id == filtered.c.ticket_id)) \
+        .group_by(ticket_tags.c.tag_id)
+    
+    return db.session.execute(db.union_all(
+        count_by('status', filtered.c.ticket_status),
+        count_by('priority', filtered.c.priority),
+        count_by('marketplace', filtered.c.marketplace),
+        count_by('agent', filtered.c.assigned_to),
+        tag_counts
+    )).all()
+
+
+def rollup_counts():
+    return db.session.query(TicketStat.dimension, TicketStat.value, TicketStat.ticket_count) \
+        .filter(TicketStat.ticket_count > 0) \
+        .all()
+
+
+def get_ticket_stats(args):
+    """
+    {'total', 'ticketStatus', 'priority', 'marketplace', 'assignedTo', 'tags', 'source'}, each dimension
+    a {value: count} map. assignedTo is keyed by agent name ('' for unassigned) and tags by tag ID.
+    """
+    if is_postgres() and not has_ticket_filters(args):
+        rows, source = rollup_counts(), 'rollup'
+    else:
+        rows, source = live_counts(args), 'live'
+    
+    agent_names = {agent['ID']: agent['name'] for agent in reference_cache.agents()}
+    stats = {key: {} for key in DIMENSION_KEYS.values()}
+    for dimension, value, count in rows:
+        if dimension == 'agent':
+            value = agent_names.get(value, value)
+        stats[DIMENSION_KEYS[dimension]][value] = count
+    
+    stats['total'] = sum(stats['ticketStatus'].values())
+    stats['source'] = source
+    return stats
+
+
+def rebuild_ticket_stats():
+    """Recompute the rollup from scratch, e.g. after restoring data; returns the number of rows written"""
+    if is_postgres():
+        # Hold off writers so no trigger updates the rollup while it's being rebuilt
+        db.session.execute(db.text('LOCK TABLE tickets, ticket_tags IN SHARE MODE'))
+    db.session.execute(db.delete(TicketStat))
+    rows = [
+        {'dimension': dimension, 'value': value, 'ticket_count': count}
+        for dimension, value, count in live_counts()
+    ]
+    if rows:
+        db.session.execute(db.insert(TicketStat), rows)
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,42 @@
+"""
+Background worker, run separately from the web server:
+
+    python worker.py
+
+Polls the marketplaces and sends queued replies. Any number of workers (and web processes
+started with `python app.py`) can run at once: only the holder of the scheduler lease polls,
+and outbox rows are claimed so each reply is sent by one dispatcher.
+"""
+import signal
+import threading
+from app import create_app
+from services.ticket_fetcher import start_scheduler, stop_scheduler
+from services.outbox import start_dispatcher
+from services import metrics
+
+
+def main():
+    app = create_app()
+    if app.config['WORKER_METRICS_PORT']:
+        metrics.start_http_server(app.config['WORKER_METRICS_PORT'])
+    stopping = threading.Event()
+    
+    def handle_signal(signum, frame):
+        stopping.set()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    start_scheduler(app)
+    dispatcher = start_dispatcher(app)
+    
+    stopping.wait()
+    
+    # Hand the lease over right away instead of making the next leader wait for it to expire
+    stop_scheduler(app)
+    if dispatcher:
+        dispatcher.stop()
+
+
+if __name__ == '__main__':
+    main()
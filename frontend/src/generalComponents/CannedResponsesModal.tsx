@@ -1,15 +1,16 @@
 import { Modal } from './Modal';
 import { Button } from './Button';
-import type { CannedResponse } from '../types';
+import type { CannedResponse, SuggestedResponse } from '../types';
 
 interface CannedResponsesModalProps {
     onClose: () => void;
     cannedResponses: CannedResponse[];
+    suggestedResponses?: SuggestedResponse[];
     onSelectResponse: (response: string) => void;
 }
 
 export default function CannedResponsesModal(props: CannedResponsesModalProps) {
-    const { onClose, cannedResponses, onSelectResponse } = props;
+    const { onClose, cannedResponses, suggestedResponses = [], onSelectResponse } = props;
 
     const handleSelect = (response: string) => {
         onSelectResponse(response);
@@ -24,6 +25,21 @@ export default function CannedResponsesModal(props: CannedResponsesModalProps) {
             </div>
 
             <div className="h-[400px] overflow-y-auto space-y-3">
+                {suggestedResponses.length > 0 && (
+                    <>
+                        <h3 className="text-xs font-semibold text-gray-300 uppercase">Suggested for this ticket</h3>
+                        {suggestedResponses.map((response) => (
+                            <div
+                                key={`suggested-${response.ID}`}
+                                className="p-4 bg-gray-700 border-l-4 border-blue-500 rounded-lg hover:bg-gray-600 transition-colors cursor-pointer"
+                                onClick={() => handleSelect(response.response)}
+                            >
+                                <p className="text-gray-200 whitespace-pre-wrap">{response.response}</p>
+                            </div>
+                        ))}
+                        <h3 className="text-xs font-semibold text-gray-300 uppercase pt-2">All responses</h3>
+                    </>
+                )}
                 {cannedResponses.length === 0 ? (
                     <p className="text-gray-400 text-center py-8">No canned responses available</p>
                 ) : (
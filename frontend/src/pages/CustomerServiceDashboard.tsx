@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 
 // Import services
 import realTicketService from '../services/CustomerServiceDashboardService';
@@ -37,17 +37,25 @@ function CustomerServiceManagerPage() {
     // Modal visibility 
     const [showTicketModal, setShowTicketModal] = useState<boolean>(false);
     const [selectedTicketForModal, setSelectedTicketForModal] = useState<Ticket | null>(null);
+    // Cursor for the next (older) page of the open ticket's conversation
+    const [messagesCursor, setMessagesCursor] = useState<string | null>(null);
 
     const [showManagementModal, setShowManagementModal] = useState<boolean>(false);
 
     // Filter states
     const [filters, setFilters] = useState<TicketFilters>();
+    // The filters the ticket list was last loaded for, and a counter that lets a newer load cancel an older one
+    const loadedFilters = useRef<TicketFilters | undefined | null>(null);
+    const ticketLoad = useRef(0);
 
     // Loading in data
 
     const loadTickets = async () => {
+        const load = ++ticketLoad.current;
+        loadedFilters.current = filters;
         try {
             const ticketsData = await ticketService.getTickets(filters);
+            if (load !== ticketLoad.current) return;
             setTickets(ticketsData);
         } catch (err) {
             console.error('Error loading tickets:', err);
@@ -100,6 +108,36 @@ function CustomerServiceManagerPage() {
         }
     }
 
+    // Tags, agents, canned responses, the FAQ text and the first page of tickets in one request on load;
+    // the remaining pages of tickets follow one request each
+    const loadBootstrap = async () => {
+        const load = ++ticketLoad.current;
+        loadedFilters.current = filters;
+        try {
+            const bootstrapData = await ticketService.getBootstrap(filters);
+            setTags(bootstrapData.tags || []);
+            setAgents(bootstrapData.agents || []);
+            setCannedResponses(bootstrapData.cannedResponses || []);
+            setAutoFAQresponse(bootstrapData.faqAutoResponse || '');
+
+            if (load !== ticketLoad.current) return;
+            let loadedTickets = bootstrapData.tickets;
+            setTickets(loadedTickets);
+            let cursor = bootstrapData.nextCursor;
+            while (cursor) {
+                const page = await ticketService.getTicketPage(filters, cursor);
+                if (load !== ticketLoad.current) return;
+                loadedTickets = [...loadedTickets, ...page.tickets];
+                setTickets(loadedTickets);
+                cursor = page.nextCursor;
+            }
+        } catch (err) {
+            console.error('Error loading dashboard data:', err);
+            alert('Failed to load dashboard data: ' + (err as Error).message);
+            throw err;
+        }
+    }
+
     // Ticket operations (adding tickets are handled by backend, we only need to handle updating)
 
     const updateTicket = async (ticketId: string, updates: any) => {
@@ -108,9 +146,9 @@ function CustomerServiceManagerPage() {
 
             loadTickets();
 
-            // Update ticket modal
+            // Update ticket modal, keeping the pages of the conversation already loaded
             if (selectedTicketForModal && selectedTicketForModal.ticketID === ticketId) {
-                setSelectedTicketForModal(updatedTicket);
+                setSelectedTicketForModal({ ...updatedTicket, messages: selectedTicketForModal.messages });
             }
         } catch (err) {
             console.error('Error updating ticket:', err);
@@ -121,10 +159,14 @@ function CustomerServiceManagerPage() {
 
     const replyToTicket = async (ticketId: string, message: string) => {
         try {
-            const updatedTicket = await ticketService.replyToTicket(ticketId, message);
+            const result = await ticketService.replyToTicket(ticketId, message);
             loadTickets();
             if (selectedTicketForModal && selectedTicketForModal.ticketID === ticketId) {
-                setSelectedTicketForModal(updatedTicket);
+                setSelectedTicketForModal({
+                    ...selectedTicketForModal,
+                    ...result.ticket,
+                    messages: [...selectedTicketForModal.messages, result.message],
+                });
             }
         } catch (err) {
             console.error('Error replying to ticket:', err);
@@ -133,6 +175,47 @@ function CustomerServiceManagerPage() {
         }
     };
 
+    // Conversation paging (long threads are loaded a page at a time, newest first)
+
+    const loadTicketMessages = async (ticket: Ticket) => {
+        try {
+            const page = await ticketService.getTicketMessages(ticket.ticketID);
+            setSelectedTicketForModal({ ...ticket, messages: page.messages });
+            setMessagesCursor(page.nextCursor);
+        } catch (err) {
+            console.error('Error loading messages:', err);
+            alert('Failed to load messages: ' + (err as Error).message);
+            throw err;
+        }
+    };
+
+    const loadEarlierMessages = async () => {
+        if (!selectedTicketForModal || !messagesCursor) return;
+        try {
+            const page = await ticketService.getTicketMessages(selectedTicketForModal.ticketID, messagesCursor);
+            setSelectedTicketForModal({
+                ...selectedTicketForModal,
+                messages: [...page.messages, ...selectedTicketForModal.messages],
+            });
+            setMessagesCursor(page.nextCursor);
+        } catch (err) {
+            console.error('Error loading earlier messages:', err);
+            alert('Failed to load earlier messages: ' + (err as Error).message);
+            throw err;
+        }
+    };
+
+    // Canned responses suggested for the open ticket; the full list still works without them
+    const loadSuggestedResponses = async () => {
+        if (!selectedTicketForModal) return [];
+        try {
+            return await ticketService.getSuggestedResponses(selectedTicketForModal.ticketID);
+        } catch (err) {
+            console.error('Error loading suggested responses:', err);
+            return [];
+        }
+    };
+
     // Tag operations
 
     const createTag = async (tagData: Tag) => {
@@ -256,15 +339,14 @@ function CustomerServiceManagerPage() {
     // Initialization
 
     useEffect(() => {
-        loadTags();
-        loadAgents();
-        loadCannedResponses();
-        loadFAQAutoResponse();
+        loadBootstrap();
     }, [isTestMode]); // Reload when switching between test/live mode
 
     useEffect(() => {
+        // The bootstrap data already carries the tickets for the initial filters
+        if (filters === loadedFilters.current) return;
         loadTickets();
-    }, [filters, isTestMode]); // Reload when filters change or mode switches
+    }, [filters]); // Reload when filters change
 
 
     // Modal handelrs
@@ -272,7 +354,9 @@ function CustomerServiceManagerPage() {
     const handleOpenTicketModal = (ticket: Ticket) => {
         if (!ticket) return; // Only allow opening modal with existing tickets
         setSelectedTicketForModal(ticket);
+        setMessagesCursor(null);
         setShowTicketModal(true);
+        loadTicketMessages(ticket);
     };
 
 
@@ -338,6 +422,9 @@ function CustomerServiceManagerPage() {
                     allCannedResponses={cannedResponses}
                     updateTicket={updateTicket}
                     reply={replyToTicket}
+                    hasEarlierMessages={!!messagesCursor}
+                    loadEarlierMessages={loadEarlierMessages}
+                    loadSuggestedResponses={loadSuggestedResponses}
                 />
             )}
 
@@ -1,10 +1,12 @@
-import type { Ticket, TicketFilters, Tag, Agent, FAQAutoResponse, CannedResponse } from '../types';
+import type { Ticket, TicketFilters, Tag, Agent, FAQAutoResponse, CannedResponse, SuggestedResponse, BootstrapData, TicketPage, BulkTicketUpdate, BulkTicketUpdateResult, TicketStats, MessagePage, ReplyResult } from '../types';
 
 const API_BASE_URL = import.meta.env.API_URL || 'http://localhost:5000/api';
 
 // General request function to use throughout the service
 async function request<T>(endpoint: string, options: RequestInit = {}): Promise<T> {
     const res = await fetch(`${API_BASE_URL}${endpoint}`, {
+        // Carries the session cookie that keeps reads on the primary right after a write
+        credentials: 'include',
         headers: {
             'Content-Type': 'application/json',
             ...(options.headers || {}),
@@ -20,52 +22,80 @@ async function request<T>(endpoint: string, options: RequestInit = {}): Promise<
     return res.json() as Promise<T>;
 }
 
+// Largest page GET /tickets returns
+const TICKET_PAGE_SIZE = 200;
 
-class TicketService {
+// Clean up empty filters and map to backend parameter names
+function ticketQueryParams(filters: TicketFilters): URLSearchParams {
+    const queryParams = new URLSearchParams();
 
-    // Ticket Operations
+    if (filters.searchQuery && filters.searchQuery.trim()) {
+        queryParams.append('search', filters.searchQuery.trim());
+    }
 
-    async getTickets(filters: TicketFilters = {}): Promise<Ticket[]> {
-        // Clean up empty filters and map to backend parameter names
-        const queryParams = new URLSearchParams();
+    if (filters.ticketStatus) {
+        queryParams.append('ticketStatus', filters.ticketStatus);
+    }
 
-        if (filters.searchQuery && filters.searchQuery.trim()) {
-            queryParams.append('search', filters.searchQuery.trim());
-        }
+    if (filters.priority) {
+        queryParams.append('priority', filters.priority);
+    }
 
-        if (filters.ticketStatus) {
-            queryParams.append('ticketStatus', filters.ticketStatus);
-        }
+    if (filters.assignedTo) {
+        queryParams.append('assignedTo', filters.assignedTo);
+    }
 
-        if (filters.priority) {
-            queryParams.append('priority', filters.priority);
-        }
+    if (filters.tags && filters.tags.length > 0) {
+        queryParams.append('tags', JSON.stringify(filters.tags));
+    }
 
-        if (filters.assignedTo) {
-            queryParams.append('assignedTo', filters.assignedTo);
-        }
+    if (filters.startDate) {
+        queryParams.append('startDate', filters.startDate.toISOString());
+    }
 
-        if (filters.tags && filters.tags.length > 0) {
-            queryParams.append('tags', JSON.stringify(filters.tags));
-        }
+    if (filters.endDate) {
+        queryParams.append('endDate', filters.endDate.toISOString());
+    }
 
-        if (filters.startDate) {
-            queryParams.append('startDate', filters.startDate.toISOString());
-        }
+    return queryParams;
+}
 
-        if (filters.endDate) {
-            queryParams.append('endDate', filters.endDate.toISOString());
-        }
+function withQuery(endpoint: string, queryParams: URLSearchParams): string {
+    const queryString = queryParams.toString();
+    return queryString ? `${endpoint}?${queryString}` : endpoint;
+}
+
+// Stored attachments are served by the API; thumbnails are what a conversation shows inline
+export function attachmentURL(attachmentID: string, thumbnail = false): string {
+    return `${API_BASE_URL}/attachments/${attachmentID}${thumbnail ? '/thumbnail' : ''}`;
+}
 
-        let endpoint = `${API_BASE_URL}/tickets`;
-        const queryString = queryParams.toString();
-        if (queryString) {
-            endpoint += `?${queryString}`;
-        }
 
-        return request<Ticket[]>(endpoint, { method: 'GET' });
+class TicketService {
+
+    // Initial load: all reference data and the first page of tickets in one request
+
+    async getBootstrap(filters: TicketFilters = {}): Promise<BootstrapData> {
+        const data = await request<BootstrapData>(withQuery(`/bootstrap`, ticketQueryParams(filters)), { method: 'GET' });
+        return { ...data, tickets: data.tickets.map(ticket => ({ ...ticket, messages: [] })) };
+    }
+
+    // Ticket Operations
+
+    async getTickets(filters: TicketFilters = {}): Promise<Ticket[]> {
+        return request<Ticket[]>(withQuery(`/tickets`, ticketQueryParams(filters)), { method: 'GET' });
     }
 
+    // The page of ticket summaries after cursor (from the bootstrap data or the previous page)
+    async getTicketPage(filters: TicketFilters = {}, cursor?: string | null): Promise<TicketPage> {
+        const queryParams = ticketQueryParams(filters);
+        queryParams.append('limit', String(TICKET_PAGE_SIZE));
+        if (cursor) {
+            queryParams.append('cursor', cursor);
+        }
+        const page = await request<TicketPage>(withQuery(`/tickets`, queryParams), { method: 'GET' });
+        return { ...page, tickets: page.tickets.map(ticket => ({ ...ticket, messages: [] })) };
+    }
 
     async updateTicket(ticketID: string, field: Partial<Ticket>): Promise<Ticket> {
         return request<Ticket>(`/tickets/${ticketID}`, {
@@ -74,8 +104,35 @@ class TicketService {
         });
     }
 
-    async replyToTicket(ticketId: string, reply: string): Promise<Ticket> {
-        return request<Ticket>(
+    async bulkUpdateTickets(update: BulkTicketUpdate): Promise<BulkTicketUpdateResult> {
+        return request<BulkTicketUpdateResult>(`/tickets/bulk`, {
+            method: 'PATCH',
+            body: JSON.stringify(update),
+        });
+    }
+
+    async getTicketStats(): Promise<TicketStats> {
+        return request<TicketStats>(`/tickets/stats`, { method: 'GET' });
+    }
+
+    async getTicketMessages(ticketId: string, cursor?: string | null): Promise<MessagePage> {
+        const queryParams = new URLSearchParams();
+        if (cursor) {
+            queryParams.append('cursor', cursor);
+        }
+        const queryString = queryParams.toString();
+        return request<MessagePage>(
+            `/tickets/${ticketId}/messages${queryString ? `?${queryString}` : ''}`,
+            { method: 'GET' }
+        );
+    }
+
+    async getSuggestedResponses(ticketId: string): Promise<SuggestedResponse[]> {
+        return request<SuggestedResponse[]>(`/tickets/${ticketId}/suggestedResponses`, { method: 'GET' });
+    }
+
+    async replyToTicket(ticketId: string, reply: string): Promise<ReplyResult> {
+        return request<ReplyResult>(
             `/tickets/${ticketId}/reply`,
             {
                 method: 'PUT',
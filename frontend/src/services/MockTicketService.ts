@@ -1,4 +1,4 @@
-import type { Ticket, TicketFilters, Tag, Agent, FAQAutoResponse, CannedResponse } from '../types';
+import type { Ticket, TicketFilters, Tag, Agent, FAQAutoResponse, CannedResponse, SuggestedResponse, BootstrapData, TicketPage, BulkTicketUpdate, BulkTicketUpdateResult, TicketStats, MessagePage, ReplyResult } from '../types';
 
 // Mock data storage
 let mockTags: Tag[] = [
@@ -365,8 +365,32 @@ function filterTickets(tickets: Ticket[], filters: TicketFilters): Ticket[] {
     });
 }
 
+// Cursor is the index of the first ticket not yet returned
+function pageTickets(tickets: Ticket[], cursor?: string | null, pageSize = 50): TicketPage {
+    const start = cursor ? Number(cursor) : 0;
+    const end = start + pageSize;
+    return {
+        tickets: tickets.slice(start, end).map(ticket => ({ ...ticket, messages: [] })),
+        nextCursor: end < tickets.length ? String(end) : null,
+    };
+}
+
 class MockTicketService {
 
+    // Initial load
+
+    async getBootstrap(filters: TicketFilters = {}): Promise<BootstrapData> {
+        await delay();
+        console.log('Mock Service: Getting bootstrap data', filters);
+        return {
+            ...pageTickets(filterTickets([...mockTickets], filters), null),
+            tags: [...mockTags],
+            agents: [...mockAgents],
+            cannedResponses: [...mockCannedResponses],
+            faqAutoResponse: mockFAQAutoResponse.faqAutoResponse,
+        };
+    }
+
     // Ticket Operations
 
     async getTickets(filters: TicketFilters = {}): Promise<Ticket[]> {
@@ -375,6 +399,12 @@ class MockTicketService {
         return filterTickets([...mockTickets], filters);
     }
 
+    async getTicketPage(filters: TicketFilters = {}, cursor?: string | null): Promise<TicketPage> {
+        await delay();
+        console.log('Mock Service: Getting a page of tickets', filters, cursor);
+        return pageTickets(filterTickets([...mockTickets], filters), cursor);
+    }
+
     async updateTicket(ticketID: string, field: Partial<Ticket>): Promise<Ticket> {
         await delay();
         console.log('Mock Service: Updating ticket', ticketID, field);
@@ -393,7 +423,109 @@ class MockTicketService {
         return mockTickets[ticketIndex];
     }
 
-    async replyToTicket(ticketId: string, reply: string): Promise<Ticket> {
+    async bulkUpdateTickets(update: BulkTicketUpdate): Promise<BulkTicketUpdateResult> {
+        await delay();
+        console.log('Mock Service: Bulk updating tickets', update);
+
+        const result: BulkTicketUpdateResult = { updated: [], failed: [] };
+        for (const ticketID of update.ticketIDs) {
+            const ticket = mockTickets.find(t => t.ticketID === ticketID);
+            if (!ticket) {
+                result.failed.push({ ticketID, error: 'Ticket not found' });
+                continue;
+            }
+
+            if (update.ticketStatus) ticket.ticketStatus = update.ticketStatus;
+            if (update.priority) ticket.priority = update.priority;
+            if (update.assignedTo !== undefined) ticket.assignedTo = update.assignedTo;
+            if (update.addTags || update.removeTags) {
+                const tags = ticket.tags.filter(tag => !(update.removeTags || []).includes(tag.ID));
+                for (const tagID of update.addTags || []) {
+                    const tag = mockTags.find(t => t.ID === tagID);
+                    if (tag && !tags.some(t => t.ID === tagID)) tags.push(tag);
+                }
+                ticket.tags = tags;
+            }
+            ticket.lastUpdatedDate = new Date();
+
+            result.updated.push({ ...ticket });
+        }
+
+        return result;
+    }
+
+    async getTicketStats(): Promise<TicketStats> {
+        await delay();
+        console.log('Mock Service: Getting ticket stats');
+
+        const stats: TicketStats = {
+            total: mockTickets.length,
+            ticketStatus: {},
+            priority: {},
+            marketplace: {},
+            assignedTo: {},
+            tags: {},
+            source: 'live'
+        };
+        const increment = (counts: Record<string, number>, key: string) => {
+            counts[key] = (counts[key] || 0) + 1;
+        };
+        for (const ticket of mockTickets) {
+            increment(stats.ticketStatus, ticket.ticketStatus);
+            increment(stats.priority, ticket.priority);
+            increment(stats.marketplace, ticket.marketplace);
+            increment(stats.assignedTo, ticket.assignedTo || '');
+            ticket.tags.forEach(tag => increment(stats.tags, tag.ID));
+        }
+
+        return stats;
+    }
+
+    async getTicketMessages(ticketId: string, cursor?: string | null): Promise<MessagePage> {
+        await delay();
+        console.log('Mock Service: Getting messages for ticket', ticketId, cursor);
+
+        const ticket = mockTickets.find(t => t.ticketID === ticketId);
+        if (!ticket) {
+            throw new Error(`Ticket ${ticketId} not found`);
+        }
+
+        // Cursor is the index of the oldest message already returned
+        const pageSize = 50;
+        const end = cursor ? Number(cursor) : ticket.messages.length;
+        const start = Math.max(0, end - pageSize);
+        return {
+            messages: ticket.messages.slice(start, end),
+            nextCursor: start > 0 ? String(start) : null,
+        };
+    }
+
+    async getSuggestedResponses(ticketId: string): Promise<SuggestedResponse[]> {
+        await delay();
+        console.log('Mock Service: Getting suggested responses for ticket', ticketId);
+
+        const ticket = mockTickets.find(t => t.ticketID === ticketId);
+        if (!ticket) {
+            throw new Error(`Ticket ${ticketId} not found`);
+        }
+
+        // Share of the latest customer messages' words each response contains, instead of TF-IDF
+        const words = (text: string) => new Set(text.toLowerCase().match(/\w{3,}/g) || []);
+        const customerWords = words(
+            ticket.messages.filter(m => !m.authored).slice(-3).map(m => m.message).join(' ')
+        );
+        return mockCannedResponses
+            .map(response => {
+                const responseWords = [...words(response.response)];
+                const shared = responseWords.filter(word => customerWords.has(word)).length;
+                return { ...response, score: responseWords.length ? shared / responseWords.length : 0 };
+            })
+            .filter(response => response.score > 0)
+            .sort((a, b) => b.score - a.score)
+            .slice(0, 5);
+    }
+
+    async replyToTicket(ticketId: string, reply: string): Promise<ReplyResult> {
         await delay();
         console.log('Mock Service: Replying to ticket', ticketId, reply);
 
@@ -406,13 +538,25 @@ class MockTicketService {
             message: reply,
             authored: true,
             date: new Date().toISOString(),
-            imageAttachments: []
+            imageAttachments: [],
+            deliveryStatus: 'sent' as const
         };
 
-        mockTickets[ticketIndex].messages.push(newMessage);
-        mockTickets[ticketIndex].lastUpdatedDate = new Date();
+        const ticket = mockTickets[ticketIndex];
+        ticket.messages.push(newMessage);
+        ticket.lastUpdatedDate = new Date();
+        if (ticket.ticketStatus === 'New') {
+            ticket.ticketStatus = 'In Progress';
+        }
 
-        return mockTickets[ticketIndex];
+        return {
+            message: newMessage,
+            ticket: {
+                ticketID: ticket.ticketID,
+                ticketStatus: ticket.ticketStatus,
+                lastUpdatedDate: ticket.lastUpdatedDate,
+            },
+        };
     }
 
     // Tag Operations
@@ -1,8 +1,9 @@
 import { useState } from 'react';
-import type { Ticket, Priority, Tag, Agent, CannedResponse } from '../types';
+import type { Ticket, Priority, Tag, Agent, CannedResponse, SuggestedResponse } from '../types';
 import { Modal } from '../generalComponents/Modal';
 import { Button } from '../generalComponents/Button';
 import CannedResponsesModal from '../generalComponents/CannedResponsesModal';
+import { attachmentURL } from '../services/CustomerServiceDashboardService';
 
 interface TicketModalProps {
     ticket: Partial<Ticket>;
@@ -12,13 +13,24 @@ interface TicketModalProps {
     onClose: () => void;
     updateTicket: (ticketID: string, field: Partial<Ticket>) => Promise<void>;
     reply: (ticketID: string, message: string) => Promise<void>;
+    hasEarlierMessages?: boolean;
+    loadEarlierMessages?: () => Promise<void>;
+    loadSuggestedResponses?: () => Promise<SuggestedResponse[]>;
 }
 
 function TicketModal(props: TicketModalProps) {
-    const { ticket, updateTicket, reply, onClose, allTags, allAgents, allCannedResponses } = props;
+    const { ticket, updateTicket, reply, onClose, allTags, allAgents, allCannedResponses, hasEarlierMessages, loadEarlierMessages, loadSuggestedResponses } = props;
 
     const [replyText, setReplyText] = useState('');
     const [showCannedResponses, setShowCannedResponses] = useState(false);
+    const [suggestedResponses, setSuggestedResponses] = useState<SuggestedResponse[]>([]);
+
+    const openCannedResponses = async () => {
+        setShowCannedResponses(true);
+        if (loadSuggestedResponses) {
+            setSuggestedResponses(await loadSuggestedResponses());
+        }
+    };
     const draftKey = `ticket-draft-${ticket.ticketID}`;
 
     const saveDraft = (text: string) => {
@@ -185,6 +197,13 @@ function TicketModal(props: TicketModalProps) {
             <div className="mb-6">
                 <h3 className="text-lg font-semibold text-gray-200 mb-3">Conversation</h3>
                 <div className="max-h-96 overflow-y-auto space-y-3 bg-gray-900 rounded-lg p-4">
+                    {hasEarlierMessages && loadEarlierMessages && (
+                        <div className="text-center">
+                            <Button variant="secondary" onClick={() => loadEarlierMessages()}>
+                                Load earlier messages
+                            </Button>
+                        </div>
+                    )}
                     {ticket.messages && ticket.messages.length > 0 ? (
                         ticket.messages.map((message, index) => (
                             <div
@@ -196,7 +215,14 @@ function TicketModal(props: TicketModalProps) {
                                     <span className="text-xs font-semibold text-gray-300">
                                         {message.authored ? ticket.assignedTo : ticket.customerName}
                                     </span>
-                                    <span className="text-xs text-gray-400">{formatDate(new Date(message.date))}</span>
+                                    <span className="text-xs text-gray-400">
+                                        {formatDate(new Date(message.date))}
+                                        {message.deliveryStatus && message.deliveryStatus !== 'sent' && (
+                                            <span className={`ml-2 ${message.deliveryStatus === 'failed' ? 'text-red-400' : 'text-gray-400'}`}>
+                                                {message.deliveryStatus === 'failed' ? 'Not delivered' : 'Sending…'}
+                                            </span>
+                                        )}
+                                    </span>
                                 </div>
                                 <p className="text-sm text-gray-200 whitespace-pre-wrap">{message.message}</p>
                                 {message.imageAttachments && message.imageAttachments.length > 0 && (
@@ -211,6 +237,31 @@ function TicketModal(props: TicketModalProps) {
                                         ))}
                                     </div>
                                 )}
+                                {message.attachments && message.attachments.length > 0 && (
+                                    <div className="mt-2 flex gap-2 flex-wrap">
+                                        {message.attachments.map((attachment) => (
+                                            <a
+                                                key={attachment.ID}
+                                                href={attachmentURL(attachment.ID)}
+                                                target="_blank"
+                                                rel="noopener noreferrer"
+                                            >
+                                                {attachment.contentType.startsWith('image/') ? (
+                                                    <img
+                                                        src={attachmentURL(attachment.ID, true)}
+                                                        alt="attachment"
+                                                        loading="lazy"
+                                                        className="max-w-xs max-h-40 rounded border border-gray-300"
+                                                    />
+                                                ) : (
+                                                    <span className="text-xs text-blue-200 underline">
+                                                        Attachment ({Math.ceil(attachment.size / 1024)} KB)
+                                                    </span>
+                                                )}
+                                            </a>
+                                        ))}
+                                    </div>
+                                )}
                             </div>
                         ))
                     ) : (
@@ -246,7 +297,7 @@ function TicketModal(props: TicketModalProps) {
                 </Button>
                 <Button
                     variant="secondary"
-                    onClick={() => setShowCannedResponses(true)}
+                    onClick={openCannedResponses}
                 >
                     Canned Responses
                 </Button>
@@ -257,6 +308,7 @@ function TicketModal(props: TicketModalProps) {
                 <CannedResponsesModal
                     onClose={() => setShowCannedResponses(false)}
                     cannedResponses={allCannedResponses}
+                    suggestedResponses={suggestedResponses}
                     onSelectResponse={(response) => {
                         setReplyText(replyText ? replyText + '\n\n' + response : response);
                         saveDraft(replyText ? replyText + '\n\n' + response : response);
@@ -12,9 +12,18 @@ export interface Tag {
     ID: string;
 }
 
+export interface AssignmentRule {
+    marketplace: string | null;
+    tagID: string | null;
+}
+
 export interface Agent {
     name: string;
     ID: string;
+    // Auto-assignment settings (the mock service leaves them out)
+    autoAssign?: boolean;
+    maxOpenTickets?: number | null;
+    assignmentRules?: AssignmentRule[];
 }
 
 export interface FAQAutoResponse {
@@ -27,11 +36,24 @@ export interface CannedResponse {
     ID: string;
 }
 
+// GET /tickets/:id/suggestedResponses: canned responses ranked against the customer's latest messages
+export interface SuggestedResponse extends CannedResponse {
+    score: number;
+}
+
+export interface MessageAttachment {
+    ID: string;  // SHA-256 of the file in the attachment store
+    contentType: string;
+    size: number;
+}
+
 export interface Message {
     message: string;
     authored: boolean;
     date: string;
-    imageAttachments: string[];
+    imageAttachments: string[];  // marketplace links not (yet) in the attachment store
+    attachments?: MessageAttachment[];
+    deliveryStatus?: 'pending' | 'sent' | 'failed' | null;  // replies sent from the dashboard only
 }
 
 export interface Ticket {
@@ -50,6 +72,57 @@ export interface Ticket {
     relatedListingURL?: string;
 }
 
+// GET /tickets/:id/messages: one page of a conversation in chronological order; nextCursor fetches older messages
+export interface MessagePage {
+    messages: Message[];
+    nextCursor: string | null;
+}
+
+// PUT /tickets/:id/reply: the new message and the ticket fields a reply changes
+export interface ReplyResult {
+    message: Message;
+    ticket: Pick<Ticket, 'ticketID' | 'ticketStatus' | 'lastUpdatedDate'>;
+}
+
+// GET /tickets?limit=: ticket summaries (messages left empty) a page at a time; nextCursor fetches the next page
+export interface TicketPage {
+    tickets: Ticket[];
+    nextCursor: string | null;
+}
+
+// GET /bootstrap: the reference data and the first page of ticket summaries for the filters
+export interface BootstrapData extends TicketPage {
+    tags: Tag[];
+    agents: Agent[];
+    cannedResponses: CannedResponse[];
+    faqAutoResponse: string;
+}
+
+// PATCH /tickets/bulk: the same change applied to many tickets
+export interface BulkTicketUpdate {
+    ticketIDs: string[];
+    ticketStatus?: TicketStatus;
+    priority?: Priority;
+    assignedTo?: string;
+    addTags?: string[];  // tag IDs
+    removeTags?: string[];
+}
+
+export interface BulkTicketUpdateResult {
+    updated: (Partial<Ticket> & { ticketID: string })[];  // only the changed fields
+    failed: { ticketID: string; error: string }[];
+}
+
+export interface TicketStats {
+    total: number;
+    ticketStatus: Record<string, number>;
+    priority: Record<string, number>;
+    marketplace: Record<string, number>;
+    assignedTo: Record<string, number>;  // by agent name, '' for unassigned
+    tags: Record<string, number>;  // by tag ID
+    source: 'rollup' | 'live';
+}
+
 export type TicketFilters = {
     searchQuery?: string;
     ticketStatus?: TicketStatus;